@@ -0,0 +1,102 @@
+"""
+Graphs for --texts short texts (tweets, abstracts) through KnowledgeGraphAPI:
+
+    single   one /get_knowledge_graph request per text, all at once (each
+             one its own invocation, as API Gateway would fan them out)
+    batch    /get_knowledge_graph/batch requests of up to KG_BATCH_MAX_ITEMS
+             texts, all at once
+
+Runs offline with KG_LLM_PROVIDER=fake behind the real LLMGraphTransformer;
+--llm-latency-ms defaults to a GPT-4 call on a short text. --request-overhead-ms
+stands in for API Gateway and the Lambda invoke, paid once per request. Each
+mode gets its own texts, so the chunk cache doesn't flatter the batch.
+
+Reports wall time, the slowest request (API Gateway gives up at 29 s) and
+billed invocation seconds, the sum of every request's duration, and the
+texts a batch gave up on at KG_BATCH_TIMEOUT_SECONDS. The fake latency is
+lognormal, so a batch waits for the slowest of its items.
+
+    python benchmarks/bench_batch.py --texts 100 --llm-latency-ms 6000 --request-overhead-ms 30
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_GATEWAY_TIMEOUT = 29
+
+
+def configure(args):
+    """Environment the handlers read at import time."""
+    sys.path.insert(0, os.path.join(ROOT, "main_app"))
+    sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+    sys.path.insert(0, ROOT)
+    os.environ.update({
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "KG_LLM_PROVIDER": "fake",
+        "KG_FAKE_LATENCY_MS": str(args.llm_latency_ms),
+        "CHUNK_CACHE_DIR": "",
+        "METRICS_SAMPLE_RATE": "0",
+    })
+
+
+def texts(mode, count, chars):
+    from benchmarks.standins import synthetic_document
+    return [f"{mode.title()} Report {i}. " + synthetic_document(chars, seed=i) for i in range(count)]
+
+
+def request(app, body, overhead):
+    """One request's duration, as its invocation would be billed, and its failed texts."""
+    start = time.perf_counter()
+    time.sleep(overhead)
+    ret = app.lambda_handler({"body": json.dumps(body)}, None)
+    assert ret["statusCode"] == 200, ret
+    failed = json.loads(ret["body"])["metadata"]["failed"] if "items" in body else 0
+    return time.perf_counter() - start, failed
+
+
+def bodies(mode, items, batch_size):
+    if mode == "single":
+        return [{"text": item["text"]} for item in items]
+    return [{"items": items[i:i + batch_size]} for i in range(0, len(items), batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=100)
+    parser.add_argument("--chars", type=int, default=280)
+    parser.add_argument("--llm-latency-ms", type=float, default=6000)
+    parser.add_argument("--request-overhead-ms", type=float, default=30)
+    args = parser.parse_args()
+    configure(args)
+
+    import app
+
+    print(f"{args.texts} texts of {args.chars} chars, LLM {args.llm_latency_ms:g} ms, "
+          f"{args.request_overhead_ms:g} ms per request, KG_BATCH_MAX_ITEMS {app.BATCH_MAX_ITEMS}, "
+          f"KG_BATCH_MAX_CONCURRENCY {app.BATCH_MAX_CONCURRENCY}")
+    # Load LangChain before timing anything
+    with contextlib.redirect_stdout(io.StringIO()):
+        request(app, {"text": "Warm Up met Cold Start."}, 0)
+    print(f"{'mode':<7} {'requests':>9} {'wall s':>7} {'slowest s':>10} {'billed s':>9} {'billed s/text':>14} {'timed out':>10}")
+    for mode in ("single", "batch"):
+        items = [{"id": str(i), "text": text} for i, text in enumerate(texts(mode, args.texts, args.chars))]
+        requests = bodies(mode, items, app.BATCH_MAX_ITEMS)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(len(requests)) as pool:
+            results = list(pool.map(lambda body: request(app, body, args.request_overhead_ms / 1000), requests))
+        wall = time.perf_counter() - start
+        durations = [duration for duration, _ in results]
+        slowest = max(durations)
+        flag = "  over API Gateway's limit" if slowest > API_GATEWAY_TIMEOUT else ""
+        print(f"{mode:<7} {len(requests):>9} {wall:>7.2f} {slowest:>10.2f} {sum(durations):>9.1f} "
+              f"{sum(durations) / args.texts:>14.2f} {sum(failed for _, failed in results):>10}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Chunking for graph extraction on a document: the original 2000/200
+character splitter versus token_chunking at several shares of the model
+context. For each, the number of chunks (= LLM calls), the tokens of
+chunk text, and the prompt tokens sent, which add LLMGraphTransformer's
+system prompt and output schema to every call.
+
+With --live, each setting is also run through extract_kg_from_text with
+OPENAI_API_KEY and the prompt/completion tokens the API reported are
+shown (this costs money; the chunk cache is bypassed).
+
+Token counts use tiktoken when its encoding is available (set
+TIKTOKEN_CACHE_DIR offline) and a 4-characters-a-token estimate otherwise.
+tests/test-document.pdf is scanned pages without a text layer, so the
+default is the resume, repeated to stand in for a longer document; a .txt
+file can be given instead.
+
+    python benchmarks/bench_chunking.py tests/test-resume.pdf --repeat 10 --fractions 0.0125 0.025 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from langchain_experimental.graph_transformers import llm as graph_llm
+
+import chunk_cache
+import knowledge_graph
+import pdf_text
+import token_chunking
+
+
+def call_overhead(model_name):
+    """Prompt tokens LLMGraphTransformer adds to every chunk it sends."""
+    human = graph_llm.get_default_prompt().messages[-1].prompt.template.replace("{input}", "")
+    schema = json.dumps(graph_llm.create_simple_model().model_json_schema())
+    return sum(token_chunking.count_tokens(part, model_name) for part in (graph_llm.system_prompt, human, schema))
+
+
+def settings(fractions):
+    yield "chars 2000/200", "chars", None
+    for fraction in fractions:
+        yield f"tokens {fraction:g}", "tokens", token_chunking.chunk_budget(knowledge_graph.MODEL_NAME, fraction)
+
+
+def live(text, chunking, chunk_tokens, overlap_tokens):
+    knowledge_graph.CHUNKING = chunking
+    stats = {}
+    start = time.perf_counter()
+    asyncio.run(knowledge_graph.extract_kg_from_text(text, stats=stats, chunk_tokens=chunk_tokens,
+                                                     overlap_tokens=overlap_tokens))
+    return stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("document", nargs="?", default=os.path.join(ROOT, "tests", "test-resume.pdf"))
+    parser.add_argument("--repeat", type=int, default=10, help="Join this many copies of the text")
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.0125, 0.025, 0.05])
+    parser.add_argument("--overlap", type=int, default=token_chunking.OVERLAP_TOKENS)
+    parser.add_argument("--live", action="store_true", help="Also run extraction against OpenAI")
+    args = parser.parse_args()
+
+    model = knowledge_graph.MODEL_NAME
+    if args.document.endswith(".pdf"):
+        text = pdf_text.extract_pdf_text(args.document)
+    else:
+        with open(args.document, encoding="utf-8") as f:
+            text = f.read()
+    if not text.strip():
+        sys.exit(f"{args.document} has no extractable text")
+    text = "\n\n".join([text] * args.repeat)
+    overhead = call_overhead(model)
+    print(f"{len(text)} chars, {token_chunking.count_tokens(text, model)} tokens; "
+          f"{overhead} prompt tokens of instructions and schema per call")
+
+    if args.live:
+        from langchain_openai import ChatOpenAI
+        knowledge_graph.llm = ChatOpenAI(temperature=0, model_name=model)
+        knowledge_graph.llm_transformer = graph_llm.LLMGraphTransformer(llm=knowledge_graph.llm)
+        knowledge_graph.extraction_cache = chunk_cache.ChunkCache([])
+
+    header = f"{'splitter':<16} {'budget':>7} {'chunks':>7} {'text tok':>9} {'prompt tok':>11}"
+    print(header + (f" {'api prompt':>11} {'api compl':>10} {'nodes':>6} {'secs':>6}" if args.live else ""))
+    for label, chunking, budget in settings(args.fractions):
+        knowledge_graph.CHUNKING = chunking
+        chunks = knowledge_graph.split_text(text, budget, args.overlap)
+        text_tokens = sum(token_chunking.count_tokens(chunk, model) for chunk in chunks)
+        row = f"{label:<16} {budget or '-':>7} {len(chunks):>7} {text_tokens:>9} {text_tokens + overhead * len(chunks):>11}"
+        if args.live:
+            stats, elapsed = live(text, chunking, budget, args.overlap)
+            row += (f" {stats.get('prompt_tokens', 0):>11} {stats.get('completion_tokens', 0):>10}"
+                    f" {stats['merge']['nodes_out']:>6} {elapsed:>6.1f}")
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+LLM calls and latency for a burst of identical /get_knowledge_graph
+requests (a viral shared document, a double-submitted form), with and
+without single-flight coalescing.
+
+Each request runs in its own simulated container: a thread with its own
+SingleFlight, sharing a lease table (FakeTable) and a chunk cache tier the
+way containers share ChunkCacheTable. Requests arrive spread evenly over
+--spread seconds.
+
+    python benchmarks/bench_coalescing.py --requests 10 --spread 1 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("CHUNK_CACHE_DIR", "")
+
+import chunk_cache
+import knowledge_graph
+import single_flight
+import token_chunking
+from benchmarks.standins import FakeGraphTransformer, FakeTable, synthetic_document
+
+
+def run_burst(text, transformer, coalesce, requests, spread):
+    shared_tier = chunk_cache.MemoryBackend()
+    knowledge_graph.extraction_flights = None
+    knowledge_graph.get_llm = lambda: (None, transformer)
+    table = FakeTable(key="cache_key", latency=0.005)
+    latencies = []
+    calls_before = transformer.calls
+
+    def container(delay):
+        time.sleep(delay)
+        # Each container has its own in-process tiers in front of the shared one
+        knowledge_graph.extraction_cache = chunk_cache.ChunkCache([shared_tier])
+        flights = single_flight.SingleFlight(single_flight.DynamoDBLease(table, poll_seconds=0.05))
+        start = time.perf_counter()
+
+        async def request():
+            if not coalesce:
+                return await knowledge_graph.build_graph(text)
+            key = knowledge_graph.coalesce_key(text, transformer)
+            graph, _ = await flights.run(key, lambda: knowledge_graph.build_graph(text))
+            return graph
+
+        asyncio.run(request())
+        latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=container, args=(i * spread / max(1, requests - 1),))
+               for i in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return transformer.calls - calls_before, statistics.median(latencies), max(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--spread", type=float, default=1.0, help="Seconds over which the requests arrive")
+    parser.add_argument("--chars", type=int, default=60_000)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    token_chunking.tiktoken = None
+    text = synthetic_document(args.chars)
+    print(f"{'mode':<10} {'LLM calls':>10} {'p50 s':>7} {'max s':>7}")
+    for coalesce in (False, True):
+        # Chunk cache writes land when an extraction finishes, so without
+        # coalescing every request that starts before then pays in full
+        transformer = FakeGraphTransformer(latency=args.llm_latency)
+        calls, p50, slowest = run_burst(text, transformer, coalesce, args.requests, args.spread)
+        print(f"{'coalesced' if coalesce else 'off':<10} {calls:>10} {p50:>7.2f} {slowest:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+KnowledgeGraphAPI cold start: import time of app.py (the init phase) and
+of the LangChain LLM stack that get_llm loads on the first request, each
+in a fresh interpreter with -X importtime. Prints the median wall time
+per phase over --runs and the import time by top-level package.
+
+"eager" imports both in one go, as app.py did before the LLM imports
+were deferred; KG_PREFETCH=true moves the "first request" phase into
+init, overlapped with the Secrets Manager round trip.
+
+    python benchmarks/bench_cold_start.py --runs 5 --top 12
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARK = "--- first request ---"
+
+# Runs in the child: init, a marker on stderr, then the first request's imports
+CHILD = f"""
+import sys, time
+start = time.perf_counter()
+import app
+init = time.perf_counter() - start
+print({MARK!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+app.knowledge_graph.load_llm_classes()
+print(init, time.perf_counter() - start)
+"""
+EAGER = """
+import sys, time
+start = time.perf_counter()
+import app
+app.knowledge_graph.load_llm_classes()
+print(time.perf_counter() - start)
+"""
+
+
+def run(code):
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+               PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "main_app"), os.path.join(ROOT, "common_layer", "python")]),
+               PYTHONWARNINGS="ignore")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                         capture_output=True, text=True, check=True)
+    return [float(v) for v in out.stdout.split()], out.stderr
+
+
+def by_package(stderr):
+    """Import microseconds (each module's own time) per phase and top-level package."""
+    phases = {"init": defaultdict(int), "first request": defaultdict(int)}
+    phase = phases["init"]
+    for line in stderr.splitlines():
+        if line == MARK:
+            phase = phases["first request"]
+            continue
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        phase[name.strip().split(".")[0]] += int(own)
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Packages listed per phase")
+    args = parser.parse_args()
+
+    init, first, eager, stderr = [], [], [], ""
+    for _ in range(args.runs):
+        (i, f), stderr = run(CHILD)
+        init.append(i)
+        first.append(f)
+        eager.append(run(EAGER)[0][0])
+
+    print(f"{'phase':<14} {'median s':>9}")
+    for label, times in (("init", init), ("first request", first), ("eager", eager)):
+        print(f"{label:<14} {statistics.median(times):>9.3f}")
+
+    for label, packages in by_package(stderr).items():
+        total = sum(packages.values())
+        print(f"\n{label}: {total / 1e6:.3f}s of imports (last run)")
+        for name, us in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+            print(f"  {name:<32} {us / 1e3:>8.1f} ms {100 * us / total:>5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Wall-clock scaling of chunk extraction with concurrency, using a fake LLM.
+
+    python benchmarks/bench_concurrency.py --chars 400000 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_app"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common_layer", "python"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import kg_extraction
+from benchmarks.standins import FakeGraphTransformer, synthetic_document
+
+
+def run(chunks, concurrency, batch_size, latency, jitter, rate_limit_rate):
+    transformer = FakeGraphTransformer(latency=latency, jitter=jitter, rate_limit_rate=rate_limit_rate)
+    start = time.perf_counter()
+    results = asyncio.run(kg_extraction.extract_chunks(
+        transformer, chunks, max_concurrency=concurrency, batch_size=batch_size, max_retries=20
+    ))
+    elapsed = time.perf_counter() - start
+    assert len(results) == len(chunks)
+    return elapsed, transformer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=400_000, help="document size (~200 pages at 2000 chars/page)")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="fraction of calls that return 429")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    # Keep retry sleeps short so the benchmark measures fan-out, not backoff
+    kg_extraction.RETRY_BASE_DELAY = args.latency
+
+    text = synthetic_document(args.chars)
+    chunks = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200).split_text(text)
+    print(f"{len(text)} chars -> {len(chunks)} chunks, latency {args.latency}s +{args.jitter}s jitter, "
+          f"{args.rate_limit_rate:.0%} rate-limited, batch size {args.batch_size}")
+    print(f"{'concurrency':>11} {'seconds':>9} {'speedup':>8} {'calls':>6} {'peak in-flight':>15}")
+
+    baseline = None
+    for concurrency in args.concurrency:
+        elapsed, transformer = run(chunks, concurrency, args.batch_size, args.latency, args.jitter, args.rate_limit_rate)
+        baseline = baseline or elapsed
+        print(f"{concurrency:>11} {elapsed:>9.2f} {baseline / elapsed:>7.1f}x {transformer.calls:>6} {transformer.max_in_flight:>15}")
+
+
+if __name__ == "__main__":
+    main()
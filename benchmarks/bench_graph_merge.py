@@ -0,0 +1,73 @@
+"""
+Throughput of the graph merge stage on synthetic chunk graphs.
+
+Each entity is mentioned several times across chunks with spelling
+variants ("Ada Lovelace", "ada lovelace", "The Ada Lovelace.") and each
+relationship is repeated, mimicking the duplicates produced by chunk
+overlap.
+
+    python benchmarks/bench_graph_merge.py --nodes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_app"))
+
+import graph_merge
+
+VARIANTS = [
+    lambda name: name,
+    lambda name: name.lower(),
+    lambda name: f"The {name}.",
+    lambda name: name.upper(),
+]
+
+
+def synthetic_chunks(n_entities, mentions=4, edges_per_entity=3, chunk_nodes=40, seed=0):
+    rng = random.Random(seed)
+    names = [f"Entity Number {i}" for i in range(n_entities)]
+    node_mentions = [
+        {"id": rng.choice(VARIANTS)(name), "type": rng.choice(["Person", "Organization"]), "properties": {}}
+        for name in names for _ in range(mentions)
+    ]
+    rng.shuffle(node_mentions)
+    relationships = []
+    for i, name in enumerate(names):
+        for _ in range(edges_per_entity):
+            target = names[rng.randrange(n_entities)]
+            for _ in range(2):  # every relationship seen twice thanks to chunk overlap
+                relationships.append({
+                    "source": rng.choice(VARIANTS)(name), "source_type": "Person",
+                    "target": rng.choice(VARIANTS)(target), "target_type": "Organization",
+                    "relation": rng.choice(["WORKS_AT", "works at", "KNOWS"]), "properties": {}
+                })
+    rng.shuffle(relationships)
+    n_chunks = max(1, len(node_mentions) // chunk_nodes)
+    return [
+        (node_mentions[i::n_chunks], relationships[i::n_chunks])
+        for i in range(n_chunks)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'entities':>9} {'nodes in':>9} {'rels in':>9} {'nodes out':>10} {'edges out':>10} {'seconds':>8} {'us/item':>8}")
+    for n in args.nodes:
+        chunks = synthetic_chunks(n)
+        start = time.perf_counter()
+        nodes, edges, stats = graph_merge.merge_graphs(chunks)
+        elapsed = time.perf_counter() - start
+        items = stats["nodes_in"] + stats["relationships_in"]
+        assert stats["nodes_out"] == n
+        print(f"{n:>9} {stats['nodes_in']:>9} {stats['relationships_in']:>9} {stats['nodes_out']:>10} "
+              f"{stats['edges_out']:>10} {elapsed:>8.2f} {elapsed / items * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
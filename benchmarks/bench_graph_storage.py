@@ -0,0 +1,98 @@
+"""
+Write and read time of a graph in GraphCacheTable by storage strategy:
+the original graph_data map, graph_store's inline / sharded / S3 layouts,
+and size-based routing of JSON and compact (graph_codec) payloads, for
+serialized graph sizes from 10 KB to 50 MB. DynamoDB and S3
+are local stand-ins with per-request latency and bandwidth; boto3's type
+(de)serialization is real.
+
+    python benchmarks/bench_graph_storage.py --sizes 10e3 100e3 1e6 10e6 50e6
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+
+import graph_store
+from benchmarks.standins import FakeS3, FakeTable
+
+
+def synthetic_graph(n_bytes):
+    """A graph whose compact JSON is about n_bytes."""
+    node = {"id": "Entity 000000", "type": "Organization", "properties": {}}
+    edge = {"source": "Entity 000000", "target": "Entity 000001", "relation": "WORKS_WITH", "count": 2}
+    per_pair = len(json.dumps(node, separators=(",", ":"))) + len(json.dumps(edge, separators=(",", ":"))) + 2
+    n = max(1, n_bytes // per_pair)
+    nodes = [{"id": f"Entity {i:06d}", "type": "Organization", "properties": {}} for i in range(n)]
+    edges = [{"source": f"Entity {i:06d}", "target": f"Entity {(i + 1) % n:06d}", "relation": "WORKS_WITH",
+              "count": 2} for i in range(n)]
+    return {"nodes": nodes, "edges": edges}
+
+
+def run_map(table, graph):
+    item = {"share_id": "bench", "file_id": "f", "graph_data": graph}
+    start = time.perf_counter()
+    table.put_item(Item=item)
+    write = time.perf_counter() - start
+    start = time.perf_counter()
+    stored = table.get_item(Key={"share_id": "bench"})["Item"]
+    graph_store.load_graph_json(table, stored)
+    return write, time.perf_counter() - start
+
+
+def run_store(table, s3, graph, storage, fmt="json"):
+    start = time.perf_counter()
+    used = graph_store.save_graph(table, {"share_id": "bench", "file_id": "f"}, graph,
+                                  s3=s3, bucket="bench", storage=storage, fmt=fmt)
+    write = time.perf_counter() - start
+    start = time.perf_counter()
+    stored = table.get_item(Key={"share_id": "bench"})["Item"]
+    # What a client asking for that format is sent
+    if fmt == "compact":
+        graph_store.load_graph_compact(table, stored, s3)
+    else:
+        graph_store.load_graph_json(table, stored, s3)
+    return write, time.perf_counter() - start, f"{used}, {int(stored['graph_bytes']):,} B"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[10e3, 100e3, 300e3, 1e6, 4e6, 10e6, 50e6])
+    parser.add_argument("--ddb-latency", type=float, default=0.005)
+    parser.add_argument("--ddb-bandwidth", type=float, default=20e6)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--s3-bandwidth", type=float, default=80e6)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'strategy':>8} {'write s':>8} {'read s':>8}  note")
+    for size in args.sizes:
+        graph = synthetic_graph(int(size))
+        actual = len(json.dumps(graph, separators=(",", ":")))
+        for strategy in ("map", "inline", "sharded", "s3", "auto", "compact"):
+            table = FakeTable(name="graphs", latency=args.ddb_latency, bandwidth=args.ddb_bandwidth)
+            s3 = FakeS3(latency=args.s3_latency, bandwidth=args.s3_bandwidth)
+            note = ""
+            try:
+                if strategy == "map":
+                    if actual > 2 * FakeTable.MAX_ITEM_BYTES:
+                        print(f"{actual:>10} {strategy:>8} {'-':>8} {'-':>8}  over the 400 KB item limit")
+                        continue
+                    write, read = run_map(table, graph)
+                else:
+                    fmt = "compact" if strategy == "compact" else "json"
+                    routed = strategy in ("auto", "compact")
+                    write, read, used = run_store(table, s3, graph, None if routed else strategy, fmt)
+                    note = f"-> {used}" if routed else ""
+            except Exception as e:
+                print(f"{actual:>10} {strategy:>8} {'-':>8} {'-':>8}  {type(e).__name__}")
+                continue
+            print(f"{actual:>10} {strategy:>8} {write:>8.3f} {read:>8.3f}  {note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+End-to-end latency, throughput and memory of every handler, offline:
+KG_LLM_PROVIDER=fake (fake_llm.FakeChatModel behind the real
+LLMGraphTransformer) and the S3 / DynamoDB / Lambda stand-ins, each with
+configurable latency.
+
+    health   healthcheck.health_check
+    presign  presigned_url.handler
+    upload   upload_file.lambda_handler, a base64 PDF
+    kg       app.lambda_handler, --chars of text
+    stream   app.lambda_handler with "stream": true
+    process  process_uploaded.handler, an SQS batch of one uploaded PDF
+    share    generate_share_link.handler for a processed file
+    view     view_shared_graph.handler
+    saved    get_saved_graph.handler
+
+Every request uses new text or a new file, so chunk cache hits don't
+flatter the numbers. Memory is the tracemalloc peak of a few extra
+requests run one at a time.
+
+    python benchmarks/bench_handlers.py --requests 50 --concurrency 4 --llm-latency-ms 200 --llm-error-rate 0.05
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "tests", "test-resume.pdf")
+
+
+def configure(args):
+    """Environment the handlers read at import time."""
+    sys.path.insert(0, os.path.join(ROOT, "share_link"))
+    sys.path.insert(0, os.path.join(ROOT, "main_app"))
+    sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+    sys.path.insert(0, ROOT)
+    os.environ.update({
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "BUCKET_NAME": "bench-bucket",
+        "GRAPH_CACHE_TABLE": "bench-graphs",
+        "KG_LLM_PROVIDER": "fake",
+        "KG_FAKE_LATENCY_MS": str(args.llm_latency_ms),
+        "KG_FAKE_LATENCY_DISTRIBUTION": args.llm_latency_distribution,
+        "KG_FAKE_ERROR_RATE": str(args.llm_error_rate),
+        "KG_RETRY_BASE_DELAY": "0.05",
+        "CHUNK_CACHE_DIR": "",
+        "PROGRESS_INTERVAL_SECONDS": "1",
+    })
+
+
+class Services:
+    """The stand-ins, wired into every handler module."""
+
+    def __init__(self, args):
+        from benchmarks.standins import GRAPH_CACHE_INDEXES, FakeDynamoDB, FakeLambda, FakeS3
+        import app
+        import generate_share_link
+        import get_saved_graph
+        import presigned_url
+        import process_uploaded
+        import upload_file
+        import view_shared_graph
+
+        self.s3 = FakeS3(latency=args.s3_latency)
+        self.dynamodb = FakeDynamoDB(indexes={"bench-graphs": GRAPH_CACHE_INDEXES}, latency=args.ddb_latency)
+        self.table = self.dynamodb.Table("bench-graphs")
+        self.lambda_client = FakeLambda({"KnowledgeGraphAPI": app.lambda_handler})
+        for module in (app, process_uploaded, generate_share_link, view_shared_graph):
+            module.s3 = self.s3
+        presigned_url.s3_client = upload_file.s3_client = self.s3
+        process_uploaded.dynamodb = self.dynamodb
+        process_uploaded.lambda_client = self.lambda_client
+        generate_share_link.table = view_shared_graph.table = get_saved_graph.table = self.table
+        self.files = []
+        self.shares = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+
+def scenarios(services, args):
+    """name -> function(i) running request i, returning its status code."""
+    import app
+    import generate_share_link
+    import get_saved_graph
+    import healthcheck
+    import presigned_url
+    import process_uploaded
+    import upload_file
+    import view_shared_graph
+    from benchmarks.standins import synthetic_document
+
+    with open(PDF, "rb") as f:
+        pdf = f.read()
+
+    def text(i):
+        return synthetic_document(args.chars, seed=services.next_id())
+
+    def process(i):
+        file_id = f"bench-{services.next_id()}"
+        key = f"uploads/{file_id}/resume.pdf"
+        services.s3.put_object(Bucket="bench-bucket", Key=key, Body=pdf)
+        record = {"s3": {"bucket": {"name": "bench-bucket"}, "object": {"key": key}}}
+        ret = process_uploaded.handler({"Records": [{
+            "eventSource": "aws:sqs", "messageId": file_id, "body": json.dumps({"Records": [record]})}]}, None)
+        with services._lock:
+            services.files.append(file_id)
+        return 500 if ret.get("batchItemFailures") else ret["statusCode"]
+
+    def share(i):
+        file_id = services.files[i % len(services.files)]
+        graph = json.loads(get_saved_graph.handler({"pathParameters": {"file_id": file_id}}, None)["body"])
+        ret = generate_share_link.handler({
+            "body": json.dumps({"file_id": file_id, "graph_data": graph["graph_data"]}),
+            "requestContext": {"apiId": "bench", "accountId": "0", "stage": "Prod"}}, None)
+        with services._lock:
+            services.shares.append(json.loads(ret["body"])["share_id"])
+        return ret["statusCode"]
+
+    return {
+        "health": lambda i: healthcheck.health_check({}, None)["statusCode"],
+        "presign": lambda i: presigned_url.handler(
+            {"queryStringParameters": {"file_name": f"doc-{i}.pdf", "content_type": "application/pdf"}},
+            None)["statusCode"],
+        "upload": lambda i: upload_file.lambda_handler({"body": json.dumps({
+            "file_content": base64.b64encode(pdf).decode(), "file_name": f"doc-{i}.pdf",
+            "content_type": "application/pdf"})}, None)["statusCode"],
+        "kg": lambda i: app.lambda_handler({"body": json.dumps({"text": text(i)})}, None)["statusCode"],
+        "stream": lambda i: app.lambda_handler({"body": json.dumps({"text": text(i), "stream": True})},
+                                               None)["statusCode"],
+        "process": process,
+        "share": share,
+        "view": lambda i: view_shared_graph.handler(
+            {"pathParameters": {"share_id": services.shares[i % len(services.shares)]}}, None)["statusCode"],
+        "saved": lambda i: get_saved_graph.handler(
+            {"pathParameters": {"file_id": services.files[i % len(services.files)]}}, None)["statusCode"],
+    }
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+def measure(run, args):
+    def timed(i):
+        start = time.perf_counter()
+        status = run(i)
+        return time.perf_counter() - start, status
+
+    timed(0)  # warm up imports and clients
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(timed, range(1, args.requests + 1)))
+    wall = time.perf_counter() - start
+    latencies = sorted(seconds for seconds, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+
+    tracemalloc.start()
+    for i in range(args.memory_requests):
+        run(args.requests + 1 + i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+        "rps": len(results) / wall, "errors": errors, "peak_mb": peak / 2**20
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", nargs="+",
+                        default=["health", "presign", "upload", "kg", "stream", "process", "share", "view", "saved"])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--memory-requests", type=int, default=2)
+    parser.add_argument("--chars", type=int, default=20_000, help="Text per kg/stream request")
+    parser.add_argument("--llm-latency-ms", type=float, default=100)
+    parser.add_argument("--llm-latency-distribution", default="lognormal",
+                        choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of LLM calls answered with a 429")
+    parser.add_argument("--s3-latency", type=float, default=0.01)
+    parser.add_argument("--ddb-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    configure(args)
+    services = Services(args)
+    runs = scenarios(services, args)
+    # share/view/saved need processed files and share links to read
+    if {"share", "view", "saved"} & set(args.handlers) and "process" not in args.handlers:
+        args.handlers.insert(0, "process")
+    if "view" in args.handlers and "share" not in args.handlers:
+        args.handlers.insert(args.handlers.index("view"), "share")
+
+    # The handlers log as they go, so the table comes at the end
+    results = [(name, measure(runs[name], args)) for name in args.handlers]
+    print(f"\n{'handler':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7} {'peak MB':>8}")
+    for name, r in results:
+        print(f"{name:<8} {r['p50'] * 1000:>8.1f} {r['p95'] * 1000:>8.1f} {r['p99'] * 1000:>8.1f} "
+              f"{r['rps']:>8.1f} {r['errors']:>7} {r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
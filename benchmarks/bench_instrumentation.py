@@ -0,0 +1,98 @@
+"""
+Cost of the instrumentation module, and of the payload logging it gates.
+
+1. span() per call: outside a sampled invocation (METRICS_SAMPLE_RATE=0)
+   and inside one.
+2. app.lambda_handler on a large graph (extraction stubbed out): time and
+   log bytes per invocation at LOG_LEVEL=DEBUG (request body, nodes and
+   relationships printed, as every call used to) and at INFO, with and
+   without metrics.
+
+    python benchmarks/bench_instrumentation.py --nodes 5000
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("main_app", os.path.join("common_layer", "python")):
+    sys.path.insert(0, os.path.join(ROOT, path))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import app
+import instrumentation
+import knowledge_graph
+
+
+class CountingSink:
+    """stdout stand-in that counts what would be shipped to CloudWatch Logs."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode("utf-8"))
+
+    def flush(self):
+        pass
+
+
+def span_cost(n):
+    def loop():
+        start = time.perf_counter()
+        for _ in range(n):
+            with instrumentation.span("llm_call"):
+                pass
+        return (time.perf_counter() - start) / n * 1e9
+
+    disabled = loop()
+    enabled = instrumentation.instrument("Bench")(lambda event, context: loop())
+    with contextlib.redirect_stdout(CountingSink()):
+        sampled = enabled({}, None)
+    return disabled, sampled
+
+
+def handler_cost(nodes, text_chars, repeat):
+    graph = {
+        "nodes": [{"id": f"Entity {i}", "type": "Person", "properties": {"source": "chunk"}} for i in range(nodes)],
+        "edges": [{"source": f"Entity {i}", "target": f"Entity {i + 1}", "relation": "KNOWS", "count": 1}
+                  for i in range(nodes - 1)],
+        "metadata": {}
+    }
+
+    async def build_graph(text, **chunking):
+        return graph
+
+    knowledge_graph.build_graph = build_graph
+    event = {"body": json.dumps({"text": "x" * text_chars})}
+    sink = CountingSink()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(repeat):
+            app.lambda_handler(event, None)
+    return (time.perf_counter() - start) / repeat * 1000, sink.bytes / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--text-chars", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--spans", type=int, default=200_000)
+    args = parser.parse_args()
+
+    disabled, sampled = span_cost(args.spans)
+    print(f"span(): {disabled:.0f} ns unsampled, {sampled:.0f} ns sampled")
+
+    print(f"\n{'LOG_LEVEL':<10} {'sample rate':>11} {'ms/call':>9} {'log KB/call':>12}")
+    for level, rate in (("DEBUG", 0.0), ("INFO", 0.0), ("INFO", 1.0)):
+        instrumentation.LOG_LEVEL, instrumentation.METRICS_SAMPLE_RATE = level, rate
+        ms, log_bytes = handler_cost(args.nodes, args.text_chars, args.repeat)
+        print(f"{level:<10} {rate:>11} {ms:>9.2f} {log_bytes / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
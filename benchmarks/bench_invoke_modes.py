@@ -0,0 +1,94 @@
+"""
+Billed duration and cost of turning extracted text into a graph from
+ProcessUploadedFunction: in-process, invoking KnowledgeGraphAPI with an S3
+text reference, and the original inline-payload invoke.
+
+Both functions are billed while a synchronous invoke runs, so the hop
+roughly doubles GB-seconds; inline payloads also fail past 6 MB.
+
+    python benchmarks/bench_invoke_modes.py --chars 200000 2000000 7000000 --latency 0.05
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("BUCKET_NAME", "bench-bucket")
+os.environ.setdefault("KG_FUNCTION_NAME", "KnowledgeGraphAPI")
+os.environ.setdefault("CHUNK_CACHE_MEMORY_ENTRIES", "0")
+os.environ.setdefault("CHUNK_CACHE_DIR", "")
+
+import app
+import chunk_cache
+import knowledge_graph
+import process_uploaded
+from benchmarks.standins import FakeGraphTransformer, FakeLambda, FakeS3, synthetic_document
+
+# x86 on-demand pricing (us-east-1)
+PRICE_PER_GB_SECOND = 0.0000166667
+PRICE_PER_REQUEST = 0.20 / 1_000_000
+
+
+def billed_gb_seconds(seconds, memory_mb):
+    return math.ceil(seconds * 1000) / 1000 * memory_mb / 1024
+
+
+def run(mode, text, lambda_client):
+    lambda_client.invocations.clear()
+    start = time.perf_counter()
+    error = None
+    try:
+        if mode == "inline":
+            # The original hop, without the S3 fallback text_to_graph adds
+            process_uploaded.generate_graph_json(text)
+        else:
+            process_uploaded.text_to_graph("bench-file", text, mode=mode)
+    except Exception as e:
+        error = type(e).__name__
+    return time.perf_counter() - start, list(lambda_client.invocations), error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, nargs="+", default=[200_000, 7_000_000])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--processor-mb", type=int, default=128)
+    parser.add_argument("--kg-mb", type=int, default=128)
+    parser.add_argument("--invoke-latency", type=float, default=0.02,
+                        help="Seconds added per invoke for the hop itself")
+    args = parser.parse_args()
+
+    transformer = FakeGraphTransformer(latency=args.latency)
+    knowledge_graph.get_llm = lambda: (None, transformer)
+    knowledge_graph.extraction_cache = chunk_cache.ChunkCache([])
+    knowledge_graph.kg_extraction.MAX_CONCURRENCY = args.concurrency
+
+    s3 = FakeS3()
+    lambda_client = FakeLambda({os.environ["KG_FUNCTION_NAME"]: app.lambda_handler}, latency=args.invoke_latency)
+    process_uploaded.s3 = s3
+    process_uploaded.lambda_client = lambda_client
+    app.s3 = s3
+    app.BUCKET_NAME = process_uploaded.BUCKET_NAME
+
+    print(f"{'chars':>10} {'mode':>10} {'seconds':>8} {'proc GB-s':>10} {'kg GB-s':>9} {'$/1k docs':>10}  note")
+    for n_chars in args.chars:
+        text = synthetic_document(n_chars)
+        for mode in ("inprocess", "s3ref", "inline"):
+            seconds, invocations, error = run(mode, text, lambda_client)
+            processor = billed_gb_seconds(seconds, args.processor_mb)
+            kg = sum(billed_gb_seconds(i["seconds"], args.kg_mb) for i in invocations)
+            requests = 1 + len(invocations)
+            cost = (processor + kg) * PRICE_PER_GB_SECOND + requests * PRICE_PER_REQUEST
+            note = error or (f"payload {invocations[0]['request_bytes']:,} B" if invocations else "")
+            print(f"{n_chars:>10} {mode:>10} {seconds:>8.2f} {processor:>10.3f} {kg:>9.3f} {cost * 1000:>10.4f}  {note}")
+
+
+if __name__ == "__main__":
+    main()
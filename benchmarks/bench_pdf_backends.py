@@ -0,0 +1,53 @@
+"""
+PDF_BACKEND throughput in pages/second on the repo's test PDFs, for every
+backend installed (pypdfium2 and pdfminer are optional; pypdf2 is always
+there). --pages also times the resume repeated to that many pages.
+
+    pip install pypdfium2 pdfminer.six
+    python benchmarks/bench_pdf_backends.py tests/test-resume.pdf tests/test-document.pdf --pages 50
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, ROOT)
+
+import pdf_text
+from benchmarks.standins import multi_page_pdf
+
+RESUME = os.path.join(ROOT, "tests", "test-resume.pdf")
+
+
+def measure(source, backend, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = list(pdf_text.iter_pdf_pages(source, workers=1, backend=backend))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return len(pages), sum(len(page) for page in pages), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", default=[RESUME])
+    parser.add_argument("--pages", type=int, nargs="*", default=[50])
+    parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs")
+    args = parser.parse_args()
+
+    sources = [(os.path.basename(path), path) for path in args.pdfs]
+    sources += [(f"resume x{pages}", multi_page_pdf(pages, RESUME)) for pages in args.pages]
+    backends = pdf_text.available_backends()
+    print(f"backends: {', '.join(backends)} (auto picks {pdf_text.resolve_backend('auto')})")
+    print(f"{'pdf':<20} {'backend':<10} {'pages':>6} {'chars':>9} {'seconds':>8} {'pages/s':>9}")
+    for name, source in sources:
+        for backend in backends:
+            pages, chars, seconds = measure(source, backend, args.repeat)
+            print(f"{name:<20} {backend:<10} {pages:>6} {chars:>9} {seconds:>8.3f} {pages / seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+PDF text extraction: the old `text += page.extract_text()` loop versus the
+pdf_text page generator (with and without mmap, across worker counts).
+
+    python benchmarks/bench_pdf_extraction.py tests/test-document.pdf --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+
+import PyPDF2
+
+import pdf_text
+
+
+def legacy(path):
+    text = ""
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            text += page.extract_text()
+    return text
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first, chars = fn(start)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    first_text = f"{first:.2f}s" if first is not None else "-"
+    print(f"{label:<28} {elapsed:>8.2f}s {first_text:>12} {chars:>9} {peak / 2**20:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", default=os.path.join(ROOT, "tests", "test-document.pdf"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    size = os.path.getsize(args.pdf)
+    print(f"{args.pdf}: {size / 2**20:.1f} MB, {len(PyPDF2.PdfReader(args.pdf).pages)} pages, {os.cpu_count()} CPUs")
+    print(f"{'method':<28} {'total':>9} {'first page':>12} {'chars':>9} {'peak MiB':>10}")
+    print("(peak MiB is Python allocations in this process only; mmap pages and workers are not counted)")
+
+    measure("legacy concatenation", lambda start: (None, len(legacy(args.pdf))))
+
+    for workers in args.workers:
+        for use_mmap in (False, True):
+            def run(start, workers=workers, use_mmap=use_mmap):
+                first = None
+                chars = 0
+                timings = []
+                for text in pdf_text.iter_pdf_pages(args.pdf, workers=workers, use_mmap=use_mmap, timings=timings):
+                    first = first or time.perf_counter() - start
+                    chars += len(text)
+                run.timings = timings
+                return first, chars
+            measure(f"generator workers={workers} mmap={'on' if use_mmap else 'off'}", run)
+
+    print("\nper-page timing (last run):")
+    for timing in run.timings:
+        print(f"  page {timing['page']:>4}: {timing['seconds']:.3f}s, {timing['chars']} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Cost of a client waiting for one upload through /get_saved_graph: the job
+finishes after --job-seconds, then the page stays open and refreshes every
+--refresh-seconds for --open-seconds. Strategies:
+
+    original  full FileIdIndex query every --interval seconds, then full refreshes
+    status    ?status_only=true polls, one graph fetch, then If-None-Match refreshes
+    longpoll  ?wait=20 with If-None-Match, repeated until the graph arrives and then
+              on every refresh
+
+Time is simulated (sleeps advance a clock), so billed Lambda seconds count
+long-poll waits without the benchmark taking minutes. DynamoDB is the
+FakeTable stand-in with both GraphCacheTable indexes.
+
+    python benchmarks/bench_polling.py --graph-kb 200 --job-seconds 60
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "share_link"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("GRAPH_CACHE_TABLE", "graphs")
+
+import get_saved_graph
+import graph_store
+import response_cache
+from benchmarks.bench_graph_storage import synthetic_graph
+from benchmarks.standins import GRAPH_CACHE_INDEXES, FakeTable
+
+
+class Clock:
+    """Simulated time; the upload completes when it passes `done_at`."""
+
+    def __init__(self, table, graph, done_at):
+        self.now = 0.0
+        self.table, self.graph, self.done_at = table, graph, done_at
+        self.saved = False
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+        if not self.saved and self.now >= self.done_at:
+            graph_store.save_graph(self.table, {"share_id": "s1", "file_id": "f1", "status": "completed",
+                                                "created_at": "now", "view_count": 0}, self.graph)
+            self.saved = True
+
+
+def original(table):
+    """get_saved_graph before the status index: the whole item on every poll."""
+    items = table.query(IndexName="FileIdIndex", KeyConditionExpression="file_id = :f",
+                        ExpressionAttributeValues={":f": "f1"})["Items"]
+    if not items:
+        return {"statusCode": 404, "body": "{}", "headers": {}}
+    body = graph_store.json_with_graph({"status": "completed"}, graph_store.load_graph_json(table, items[0]))
+    return {"statusCode": 200, "body": body, "headers": {}}
+
+
+def run(strategy, args):
+    table = FakeTable(name="graphs", indexes=GRAPH_CACHE_INDEXES)
+    clock = Clock(table, synthetic_graph(args.graph_kb * 1024), args.job_seconds)
+    get_saved_graph.table = table
+    get_saved_graph.time = clock
+    response_cache.cache = response_cache.ResponseCache()
+    totals = {"requests": 0, "lambda s": 0.0, "bytes": 0}
+    state = {"etag": None, "have_graph": False}
+
+    def request(params=None, etag=None):
+        start = clock.now
+        if strategy == "original":
+            ret = original(table)
+        else:
+            headers = {"If-None-Match": etag} if etag else {}
+            ret = get_saved_graph.handler({"pathParameters": {"file_id": "f1"}, "queryStringParameters": params,
+                                           "headers": headers}, None)
+        totals["requests"] += 1
+        totals["lambda s"] += clock.now - start
+        totals["bytes"] += len(ret["body"])
+        return ret
+
+    end = args.job_seconds + args.open_seconds
+    while clock.now < end:
+        if strategy == "original":
+            interval = args.interval if not clock.saved else args.refresh_seconds
+            request()
+        elif strategy == "status":
+            interval = args.interval if not state["have_graph"] else args.refresh_seconds
+            if not state["have_graph"]:
+                status = request({"status_only": "true"})
+                if status["statusCode"] == 200:
+                    state["etag"] = request()["headers"]["ETag"]
+                    state["have_graph"] = True
+            else:
+                request(etag=state["etag"])
+        else:
+            interval = 0 if not state["have_graph"] else args.refresh_seconds
+            ret = request({"wait": "20"}, state["etag"])
+            if ret["statusCode"] == 200:
+                state["etag"] = ret["headers"]["ETag"]
+                state["have_graph"] = True
+        clock.advance(interval)
+    return dict(totals, RCU=table.read_units)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph-kb", type=int, default=200)
+    parser.add_argument("--job-seconds", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=2, help="Client poll interval while processing")
+    parser.add_argument("--refresh-seconds", type=float, default=10)
+    parser.add_argument("--open-seconds", type=float, default=300)
+    args = parser.parse_args()
+
+    print(f"{'strategy':>9} {'requests':>9} {'RCU':>8} {'MB sent':>8} {'lambda s':>9}")
+    for strategy in ("original", "status", "longpoll"):
+        r = run(strategy, args)
+        print(f"{strategy:>9} {r['requests']:>9} {r['RCU']:>8.1f} {r['bytes'] / 1e6:>8.2f} {r['lambda s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Repeat views of one share link through view_shared_graph, by graph size
+(which decides inline / sharded / S3 storage): without the response cache,
+with it, and with clients revalidating via If-None-Match (304s). DynamoDB
+and S3 are local stand-ins with per-request latency and bandwidth.
+
+    python benchmarks/bench_response_cache.py --sizes 50e3 800e3 5e6 --views 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "share_link"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("GRAPH_CACHE_TABLE", "graphs")
+
+import graph_store
+import response_cache
+import view_shared_graph
+from benchmarks.bench_graph_storage import synthetic_graph
+from benchmarks.standins import FakeS3, FakeTable
+
+
+def run(mode, graph, args):
+    table = FakeTable(name="graphs", latency=args.ddb_latency, bandwidth=args.ddb_bandwidth)
+    s3 = FakeS3(latency=args.s3_latency, bandwidth=args.s3_bandwidth)
+    view_shared_graph.table, view_shared_graph.s3 = table, s3
+    response_cache.cache = response_cache.ResponseCache(max_bytes=0 if mode == "none" else 256 * 1024 * 1024)
+    graph_store.save_graph(table, {"share_id": "bench", "file_id": "f", "created_at": "now"}, graph,
+                           s3=s3, bucket="bench")
+    storage = table.get_item(Key={"share_id": "bench"})["Item"]["graph_storage"]
+
+    headers, times, sent = {}, [], 0
+    for _ in range(args.views):
+        start = time.perf_counter()
+        ret = view_shared_graph.handler({"pathParameters": {"share_id": "bench"}, "headers": headers}, None)
+        times.append(time.perf_counter() - start)
+        sent += len(ret["body"])
+        if mode == "304":
+            headers = {"If-None-Match": ret["headers"]["ETag"]}
+    # The first view is always a miss
+    return storage, statistics.median(times[1:]) * 1000, sent / args.views
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[50e3, 800e3, 5e6])
+    parser.add_argument("--views", type=int, default=50)
+    parser.add_argument("--ddb-latency", type=float, default=0.005)
+    parser.add_argument("--ddb-bandwidth", type=float, default=20e6)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--s3-bandwidth", type=float, default=80e6)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'storage':>8} {'cache':>6} {'p50 ms':>8} {'bytes/view':>11}")
+    for size in args.sizes:
+        graph = synthetic_graph(int(size))
+        actual = len(json.dumps(graph, separators=(",", ":")))
+        for mode in ("none", "cache", "304"):
+            storage, p50, sent = run(mode, graph, args)
+            print(f"{actual:>10} {storage:>8} {mode:>6} {p50:>8.2f} {sent:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
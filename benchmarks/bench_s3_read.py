@@ -0,0 +1,82 @@
+"""
+How ProcessUploadedFunction's staged mode gets an upload ready to parse:
+
+    tmp     the old path: head_object, download_file to /tmp, reopen the file
+    spool   one get_object into memory (s3_stream.spool_s3_object), ranged
+            GETs in parallel above --part-mb, spilling to /tmp above --spool-mb
+
+For each size, reports wall time until the parser can start, S3 requests,
+bytes written to /tmp and the tracemalloc peak. FakeS3 charges --latency-ms
+per request and --bandwidth-mbps per connection.
+
+    python benchmarks/bench_s3_read.py --sizes-mb 1 8 50 --latency-ms 20 --bandwidth-mbps 80
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, ROOT)
+
+import s3_stream
+from benchmarks.standins import FakeS3
+
+MB = 1024 * 1024
+
+
+def tmp_path(s3, spool_max_bytes, part_size):
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, "doc.pdf")
+        s3.head_object(Bucket="bench-bucket", Key="doc.pdf")
+        s3.download_file("bench-bucket", "doc.pdf", path)
+        with open(path, "rb") as f:
+            return f.seek(0, os.SEEK_END), os.path.getsize(path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def spool_path(s3, spool_max_bytes, part_size):
+    with s3_stream.spool_s3_object(s3, "bench-bucket", "doc.pdf", part_size=part_size,
+                                   spool_max_bytes=spool_max_bytes) as spool:
+        size = spool.seek(0, os.SEEK_END)
+        return size, size if spool._rolled else 0
+
+
+def measure(path, data, args):
+    s3 = FakeS3(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mbps * MB)
+    s3.objects[("bench-bucket", "doc.pdf")] = {"Body": data, "Metadata": {}, "ContentType": None, "ETag": '"bench"'}
+    tracemalloc.start()
+    start = time.perf_counter()
+    size, written = path(s3, args.spool_mb * MB, args.part_mb * MB)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert size == len(data)
+    return seconds, s3.requests, written, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 8, 50])
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--bandwidth-mbps", type=float, default=80, help="Per connection, in megabytes/second")
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--spool-mb", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'size MB':>8} {'path':<6} {'seconds':>8} {'requests':>9} {'/tmp MB':>8} {'peak MB':>8}")
+    for size_mb in args.sizes_mb:
+        data = os.urandom(int(size_mb * MB))
+        for name, path in (("tmp", tmp_path), ("spool", spool_path)):
+            seconds, requests, written, peak = measure(path, data, args)
+            print(f"{size_mb:>8g} {name:<6} {seconds:>8.3f} {requests:>9} {written / MB:>8.1f} {peak / MB:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Time to first streamed event versus the buffered response, with a fake LLM.
+
+    python benchmarks/bench_streaming.py --chars 200000 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("CHUNK_CACHE_MEMORY_ENTRIES", "0")
+os.environ.setdefault("CHUNK_CACHE_DIR", "")
+
+import knowledge_graph
+from benchmarks.standins import FakeGraphTransformer, synthetic_document
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=200_000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    transformer = FakeGraphTransformer(latency=args.latency, jitter=args.jitter)
+    knowledge_graph.get_llm = lambda: (None, transformer)
+    text = synthetic_document(args.chars)
+
+    start = time.perf_counter()
+    asyncio.run(knowledge_graph.extract_kg_from_text(text, max_concurrency=args.concurrency))
+    buffered = time.perf_counter() - start
+
+    async def stream():
+        first = None
+        events = 0
+        async for _ in knowledge_graph.stream_kg_from_text(text, max_concurrency=args.concurrency):
+            events += 1
+            first = first or time.perf_counter() - start
+        return first, events
+
+    start = time.perf_counter()
+    first_event, events = asyncio.run(stream())
+    streamed = time.perf_counter() - start
+
+    print(f"{args.chars} chars, {events} chunks, concurrency {args.concurrency}, latency {args.latency}s +{args.jitter}s")
+    print(f"buffered: first byte after {buffered:.2f}s")
+    print(f"streamed: first event after {first_event:.2f}s, last after {streamed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
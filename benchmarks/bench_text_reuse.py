@@ -0,0 +1,76 @@
+"""
+CPU time per upload on the upload_file path, when ProcessUploadedFunction
+reuses the text upload_file extracted (extracted.txt labelled with the
+upload's ETag) versus downloading and parsing the PDF again. Graph
+extraction is stubbed out: only upload, download and parsing are timed.
+
+    python benchmarks/bench_text_reuse.py --pages 10 50 200
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("BUCKET_NAME", "bench-bucket")
+os.environ.setdefault("GRAPH_CACHE_TABLE", "bench-graphs")
+os.environ.setdefault("METRICS_SAMPLE_RATE", "0")
+
+import process_uploaded
+import upload_file
+from benchmarks.standins import FakeDynamoDB, FakeS3, multi_page_pdf
+
+PDF = os.path.join(ROOT, "tests", "test-resume.pdf")
+
+
+def cpu(fn):
+    start_cpu, start = time.process_time(), time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    return time.process_time() - start_cpu, time.perf_counter() - start
+
+
+def run(pdf, reuse):
+    s3 = FakeS3()
+    upload_file.s3_client = process_uploaded.s3 = s3
+    process_uploaded.dynamodb = FakeDynamoDB()
+    process_uploaded.PROCESS_MODE = "staged"
+    process_uploaded.text_to_graph = lambda file_id, text, stats=None: {"nodes": [], "edges": []}
+    event = {"body": json.dumps({"file_content": base64.b64encode(pdf).decode(), "file_name": "doc.pdf",
+                                 "content_type": "application/pdf"})}
+    holder = {}
+    upload_cpu, _ = cpu(lambda: holder.update(ret=upload_file.lambda_handler(event, None)))
+    file_id = json.loads(holder["ret"]["body"])["file_id"]
+    if not reuse:
+        s3.objects[("bench-bucket", f"uploads/{file_id}/extracted.txt")]["Metadata"].pop("source_etag")
+    record = {"s3": {"bucket": {"name": "bench-bucket"},
+                     "object": {"key": f"uploads/{file_id}/original/doc.pdf"}}}
+    process_cpu, process_wall = cpu(lambda: process_uploaded.handler({"Records": [record]}, None))
+    return upload_cpu, process_cpu, process_wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'processor':<9} {'upload cpu s':>13} {'process cpu s':>14} {'process wall s':>15} "
+          f"{'total cpu s':>12}")
+    for pages in args.pages:
+        pdf = multi_page_pdf(pages, PDF)
+        for reuse in (False, True):
+            upload_cpu, process_cpu, process_wall = run(pdf, reuse)
+            print(f"{pages:>6} {'reuse' if reuse else 'parse':<9} {upload_cpu:>13.3f} {process_cpu:>14.3f} "
+                  f"{process_wall:>15.3f} {upload_cpu + process_cpu:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+The two ways a file reaches the bucket:
+
+    base64   POST the file base64-encoded in JSON to upload_file.lambda_handler
+    direct   GET /get_presigned_url, then PUT to S3 directly: one presigned
+             PUT below MULTIPART_THRESHOLD_BYTES, parallel parts above it
+
+For each file size, reports the bytes the client sends through API Gateway
+(rejected over its 10 MB limit), the handler's time and tracemalloc peak,
+and the client's upload time over connections of --bandwidth-mbps each
+(FakeS3 charges bandwidth per request, so parallel parts add up).
+
+    python benchmarks/bench_upload_paths.py --sizes-mb 1 8 50 200 --bandwidth-mbps 40
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "main_app"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("BUCKET_NAME", "bench-bucket")
+os.environ.setdefault("METRICS_SAMPLE_RATE", "0")
+
+import presigned_url
+import upload_file
+from benchmarks.standins import FakeS3
+
+API_GATEWAY_LIMIT = 10 * 1024 * 1024
+MB = 1024 * 1024
+
+
+def traced(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def base64_path(data, bandwidth):
+    s3 = FakeS3()
+    upload_file.s3_client = s3
+    body = json.dumps({"file_content": base64.b64encode(data).decode(), "file_name": "doc.txt",
+                       "content_type": "text/plain"})
+    event = {"body": body}
+    ret, seconds, peak = traced(lambda: upload_file.lambda_handler(event, None))
+    assert ret["statusCode"] == 200, ret
+    # One request carries the whole body
+    return len(body), seconds, peak, len(body) / bandwidth
+
+
+def direct_path(data, bandwidth):
+    s3 = FakeS3(bandwidth=bandwidth)
+    presigned_url.s3_client = s3
+    event = {"resource": "/get_presigned_url",
+             "queryStringParameters": {"file_name": "doc.pdf", "file_size": str(len(data))}}
+    ret, seconds, peak = traced(lambda: presigned_url.handler(event, None))
+    session = json.loads(ret["body"])
+    key = f"uploads/{session['file_id']}/doc.pdf"
+
+    start = time.perf_counter()
+    if not session.get("multipart"):
+        s3.put_object(Bucket="bench-bucket", Key=key, Body=data)
+    else:
+        size = session["part_size"]
+
+        def put_part(part):
+            number = part["part_number"]
+            chunk = data[(number - 1) * size:number * size]
+            return {"part_number": number, "etag": s3.upload_part(
+                Bucket="bench-bucket", Key=key, UploadId=session["upload_id"], PartNumber=number, Body=chunk)["ETag"]}
+
+        with ThreadPoolExecutor(max_workers=session["concurrency"]) as executor:
+            parts = list(executor.map(put_part, session["parts"]))
+        presigned_url.handler({"resource": "/complete_multipart_upload", "body": json.dumps({
+            "file_id": session["file_id"], "file_name": "doc.pdf", "upload_id": session["upload_id"],
+            "parts": parts})}, None)
+    upload_seconds = time.perf_counter() - start
+    assert len(s3.objects[("bench-bucket", key)]["Body"]) == len(data)
+    return len(json.dumps(event)), seconds, peak, upload_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 8, 50, 200])
+    parser.add_argument("--bandwidth-mbps", type=float, default=40, help="Per connection, in megabytes/second")
+    args = parser.parse_args()
+    bandwidth = args.bandwidth_mbps * MB
+
+    print(f"{'size MB':>8} {'path':<7} {'via APIGW MB':>13} {'handler ms':>11} {'peak MB':>8} {'upload s':>9}")
+    for size_mb in args.sizes_mb:
+        data = (b"Ada Lovelace wrote the first program for the Analytical Engine. " * int(size_mb * MB / 64 + 1))
+        data = data[:int(size_mb * MB)]
+        for name, path in (("base64", base64_path), ("direct", direct_path)):
+            sent, seconds, peak, upload_seconds = path(data, bandwidth)
+            note = "  (over the 10 MB limit)" if sent > API_GATEWAY_LIMIT else ""
+            print(f"{size_mb:>8g} {name:<7} {sent / MB:>13.2f} {seconds * 1000:>11.1f} {peak / MB:>8.1f} "
+                  f"{upload_seconds:>9.2f}{note}")
+
+
+if __name__ == "__main__":
+    main()
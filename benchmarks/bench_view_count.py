@@ -0,0 +1,127 @@
+"""
+Load test of view counting on one share link: the original get_item +
+update_item, and view_counter's atomic, buffered and sharded modes, against
+the FakeTable DynamoDB stand-in with a per-item write capacity.
+
+Each worker thread stands for one Lambda container (one request at a time,
+its own buffered/sharded counter). Buffered and sharded flush inline every
+--flush-seconds, as they do in the function, and must take fewer DynamoDB
+round trips per view than atomic. Updating the graph item costs write units
+for the whole item, so --graph-kb matters as much as the view rate.
+
+    python benchmarks/bench_view_count.py --views 2000 --containers 50 --graph-kb 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "share_link"))
+sys.path.insert(0, os.path.join(ROOT, "common_layer", "python"))
+sys.path.insert(0, ROOT)
+
+import view_counter
+from benchmarks.standins import FakeTable
+
+SHARE_ID = "viral"
+
+
+def original(table):
+    def record(share_id):
+        item = table.get_item(Key={"share_id": share_id})["Item"]
+        table.update_item(Key={"share_id": share_id}, UpdateExpression="ADD view_count :val",
+                          ExpressionAttributeValues={":val": 1})
+        item["view_count"] = int(item.get("view_count", 0)) + 1
+        return item
+    return record, None
+
+
+def counter_for(mode, table, flush_seconds):
+    if mode == "original":
+        return original(table)
+    if mode == "atomic":
+        return (lambda share_id: view_counter.record_view_atomic(table, share_id)), None
+    if mode == "buffered":
+        counter = view_counter.BufferedCounter(table, flush_seconds=flush_seconds, flush_threshold=10 ** 9)
+        return counter.record_view, counter.flush
+    counter = view_counter.ShardedCounter(table, flush_seconds=flush_seconds, flush_threshold=10 ** 9)
+    return counter.record_view, counter.flush
+
+
+def stored_total(table, shards):
+    total = int(table.get_item(Key={"share_id": SHARE_ID})["Item"].get("view_count", 0))
+    for shard in range(shards):
+        item = table.get_item(Key={"share_id": view_counter.counter_key(SHARE_ID, shard)}).get("Item")
+        total += int(item["view_count"]) if item else 0
+    return total
+
+
+def run(mode, args):
+    table = FakeTable(name="graphs", latency=args.latency, item_write_capacity=args.item_capacity)
+    table.put_item(Item={"share_id": SHARE_ID, "file_id": "f", "created_at": "now", "view_count": 0,
+                         "graph_json": "x" * (args.graph_kb * 1024)})
+    table.write_units = 0
+    remaining = [args.views]
+    lock = threading.Lock()
+    latencies = []
+    flushes = []
+
+    def container():
+        record, flush = counter_for(mode, table, args.flush_seconds)
+        if flush:
+            flushes.append(flush)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            record(SHARE_ID)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=container) for _ in range(args.containers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for flush in flushes:
+        flush()
+    latencies.sort()
+    return {
+        "views/s": args.views / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "WCU/view": table.write_units / args.views,
+        "requests/view": (table.requests - 1) / args.views,
+        "counted": stored_total(table, view_counter.SHARDS),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--views", type=int, default=2000)
+    parser.add_argument("--containers", type=int, default=50)
+    parser.add_argument("--graph-kb", type=int, default=50, help="Size of the graph stored on the item")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per DynamoDB request")
+    parser.add_argument("--item-capacity", type=float, default=1000, help="Write units/second per item")
+    parser.add_argument("--flush-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>9} {'views/s':>8} {'p50 ms':>7} {'p99 ms':>8} {'WCU/view':>9} {'req/view':>9} {'counted':>8}")
+    results = {}
+    for mode in ("original", "atomic", "buffered", "sharded"):
+        r = results[mode] = run(mode, args)
+        print(f"{mode:>9} {r['views/s']:>8.0f} {r['p50 ms']:>7.1f} {r['p99 ms']:>8.1f} {r['WCU/view']:>9.2f} "
+              f"{r['requests/view']:>9.2f} {r['counted']:>8}")
+    # The viral-link modes exist to take load off the hot item
+    for mode in ("buffered", "sharded"):
+        assert results[mode]["requests/view"] < results["atomic"]["requests/view"], mode
+
+
+if __name__ == "__main__":
+    main()
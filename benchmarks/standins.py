@@ -0,0 +1,577 @@
+"""
+Local stand-ins for the services the Lambda functions talk to, so the
+pipeline can be exercised and benchmarked offline.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from botocore.exceptions import ClientError
+from langchain_core.documents import Document
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+ENTITY_PATTERN = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)*\b")
+# GraphCacheTable's GSIs as in template.yaml (INCLUDE attributes, None for ALL)
+GRAPH_CACHE_INDEXES = {"FileIdIndex": None, "FileStatusIndex": (
+    "status", "file_name", "created_at", "view_count", "graph_version", "error_message",
+    "stage", "pages_done", "chunks_done", "chunks_total", "eta_seconds", "updated_at")}
+
+
+class FakeRateLimitError(Exception):
+    """Mimics openai.RateLimitError closely enough for kg_extraction."""
+    status_code = 429
+
+
+class FakeGraphTransformer:
+    """
+    Drop-in replacement for LLMGraphTransformer that sleeps for a
+    configurable latency and returns a deterministic graph built from the
+    capitalised phrases in each document.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aprocess_response(self, document):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+            if self.random.random() < self.rate_limit_rate:
+                raise FakeRateLimitError("Rate limit reached for requests")
+            return graph_document_from_text(document)
+        finally:
+            self.in_flight -= 1
+
+    async def aconvert_to_graph_documents(self, documents, config=None):
+        return await asyncio.gather(*(self.aprocess_response(d) for d in documents))
+
+
+def graph_document_from_text(document):
+    """Link consecutive capitalised phrases in a document with RELATED_TO edges."""
+    if isinstance(document, str):
+        document = Document(page_content=document)
+    names = list(dict.fromkeys(ENTITY_PATTERN.findall(document.page_content)))
+    nodes = [Node(id=name, type="Entity") for name in names]
+    relationships = [
+        Relationship(source=source, target=target, type="RELATED_TO")
+        for source, target in zip(nodes, nodes[1:])
+    ]
+    return GraphDocument(nodes=nodes, relationships=relationships, source=document)
+
+
+def synthetic_document(n_chars, seed=0):
+    """Generate prose-like text with a steady supply of named entities."""
+    rng = random.Random(seed)
+    first = ["Ada", "Alan", "Grace", "Linus", "Barbara", "Edsger", "Donald", "Margaret", "Ken", "Frances"]
+    last = ["Lovelace", "Turing", "Hopper", "Torvalds", "Liskov", "Dijkstra", "Knuth", "Hamilton", "Thompson", "Allen"]
+    names = [f"{f} {l}" for f in first for l in last]
+    words = ["works", "with", "the", "team", "on", "research", "about", "and", "reports", "to"]
+    parts = []
+    size = 0
+    while size < n_chars:
+        sentence = f"{rng.choice(names)} {' '.join(rng.choices(words, k=8))} {rng.choice(names)}. "
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:n_chars]
+
+
+class _FakeS3Exceptions:
+    class NoSuchKey(Exception):
+        pass
+
+
+class _FakeBody(io.RawIOBase):
+    """A response body that, like botocore's, copies only what is read."""
+
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        piece = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(piece)] = piece
+        self._position += len(piece)
+        return len(piece)
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        piece = bytes(self._view[self._position:end])
+        self._position += len(piece)
+        return piece
+
+
+def _client_error(code, operation):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class FakeS3:
+    """
+    In-memory S3 client covering the calls the functions make.
+
+    `latency` is charged per request and `bandwidth` (bytes/second, per
+    request) per byte transferred, so parallel ranged GETs behave like the
+    real thing: more requests in flight, more aggregate throughput.
+    """
+
+    exceptions = _FakeS3Exceptions
+
+    def __init__(self, latency=0.0, bandwidth=None):
+        self.objects = {}
+        self.uploads = {}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _transfer(self, n_bytes):
+        with self._lock:
+            self.requests += 1
+        delay = self.latency + (n_bytes / self.bandwidth if self.bandwidth else 0)
+        if delay:
+            time.sleep(delay)
+
+    def _object(self, Bucket, Key):
+        try:
+            return self.objects[(Bucket, Key)]
+        except KeyError:
+            raise self.exceptions.NoSuchKey(f"s3://{Bucket}/{Key}")
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        self._transfer(len(data))
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self.objects[(Bucket, Key)] = {"Body": data, "Metadata": kwargs.get("Metadata", {}),
+                                       "ContentType": kwargs.get("ContentType"), "ETag": etag}
+        return {"ETag": etag}
+
+    def head_object(self, Bucket, Key):
+        obj = self._object(Bucket, Key)
+        self._transfer(0)
+        return {"ContentLength": len(obj["Body"]), "Metadata": obj["Metadata"], "ETag": obj["ETag"]}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        obj = self._object(Bucket, Key)
+        if IfMatch is not None and IfMatch != obj["ETag"]:
+            raise _client_error("PreconditionFailed", "GetObject")
+        data = memoryview(obj["Body"])
+        response = {"ContentLength": len(data), "Metadata": obj["Metadata"], "ETag": obj["ETag"],
+                    "ContentType": obj.get("ContentType") or "binary/octet-stream"}
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            start, end = int(start), min(int(end), len(data) - 1)
+            if start > end:
+                raise _client_error("InvalidRange", "GetObject")
+            response["ContentRange"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+            response["ContentLength"] = len(data)
+        self._transfer(len(data))
+        response["Body"] = _FakeBody(data)
+        return response
+
+    def download_file(self, Bucket, Key, Filename):
+        data = self._object(Bucket, Key)["Body"]
+        self._transfer(len(data))
+        with open(Filename, "wb") as f:
+            f.write(data)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        # Signed locally by boto3, so no request is charged
+        query = "".join(f"&{name}={Params[name]}" for name in ("UploadId", "PartNumber") if name in Params)
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}{query}"
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._transfer(0)
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "Parts": {},
+                                   "ContentType": kwargs.get("ContentType")}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        """What a client's PUT to a presigned part URL does."""
+        data = bytes(Body)
+        self._transfer(len(data))
+        self.uploads[UploadId]["Parts"][PartNumber] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._transfer(0)
+        upload = self.uploads.pop(UploadId)
+        listed = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        if listed != sorted(upload["Parts"]):
+            raise ValueError("InvalidPart: the listed parts don't match the uploaded ones")
+        body = b"".join(upload["Parts"][number] for number in listed)
+        # Multipart ETags are the MD5 of the part MD5s, with the part count
+        digest = hashlib.md5(b"".join(hashlib.md5(upload["Parts"][n]).digest() for n in listed)).hexdigest()
+        self.objects[(Bucket, Key)] = {"Body": body, "Metadata": {}, "ContentType": upload["ContentType"],
+                                       "ETag": f'"{digest}-{len(listed)}"'}
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._transfer(0)
+        self.uploads.pop(UploadId, None)
+        return {}
+
+
+class _FakeDynamoDBExceptions:
+    class ConditionalCheckFailedException(Exception):
+        pass
+
+    class ValidationException(Exception):
+        pass
+
+
+def _attribute_size(name, value):
+    """Approximate DynamoDB size of one serialized attribute."""
+    (kind, data), = value.items()
+    if kind in ("S", "N"):
+        size = len(data.encode("utf-8"))
+    elif kind == "B":
+        size = len(data)
+    elif kind in ("BOOL", "NULL"):
+        size = 1
+    elif kind == "M":
+        size = 3 + sum(_attribute_size(k, v) for k, v in data.items())
+    elif kind == "L":
+        size = 3 + sum(_attribute_size("", v) for v in data)
+    else:
+        size = sum(len(str(v)) for v in data)
+    return len(name.encode("utf-8")) + size
+
+
+class _FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def put_item(self, Item):
+        self.pending.append(Item)
+        if len(self.pending) == 25:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.table._charge(sum(self.table._size(self.table._serialize(i)) for i in self.pending))
+            for item in self.pending:
+                old = self.table.items.get(item[self.table.key])
+                self.table._write(item[self.table.key], self.table._size(old) if old else 0,
+                                  self.table._size(self.table._serialize(item)))
+                self.table._store(item)
+            self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._flush()
+
+
+class _FakeTableClient:
+    """Low-level client view of a FakeTable (table.meta.client)."""
+
+    MAX_RESPONSE_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, table):
+        self.table = table
+
+    def batch_get_item(self, RequestItems):
+        (name, request), = RequestItems.items()
+        responses, unprocessed, size = [], [], 0
+        for key in request["Keys"]:
+            item = self.table.items.get(key[self.table.key]["S"])
+            if item is None:
+                continue
+            item_size = self.table._size(item)
+            if responses and size + item_size > self.MAX_RESPONSE_BYTES:
+                unprocessed.append(key)
+                continue
+            size += item_size
+            self.table._read(item_size)
+            responses.append(item)
+        self.table._charge(size)
+        result = {"Responses": {name: responses}}
+        if unprocessed:
+            result["UnprocessedKeys"] = {name: {"Keys": unprocessed}}
+        return result
+
+
+class FakeTable:
+    """
+    In-memory DynamoDB table keyed by its hash key. Items are kept in the
+    wire format, so puts and gets pay the same (de)serialization boto3
+    does, floats are rejected and numbers come back as Decimal. Items over
+    400 KB are rejected. `latency` is charged per request and `bandwidth`
+    (bytes/second) per byte, as in FakeS3.
+
+    Writes are metered in write units (1 per KB of the larger of the old
+    and new item), totalled in `write_units`; eventually consistent reads
+    in `read_units` (0.5 per 4 KB, of each item for get_item and
+    batch_get_item and of the total for query). `indexes` maps a GSI name
+    to its INCLUDE attributes (None for ALL); queries on it read and are
+    charged for the projected items only. With `item_write_capacity`
+    (units/second per key; DynamoDB allows 1000), writes to a hot key queue
+    behind each other the way throttled, retried writes do.
+    """
+
+    exceptions = _FakeDynamoDBExceptions
+    MAX_ITEM_BYTES = 400 * 1024
+
+    def __init__(self, key="share_id", name="fake-table", latency=0.0, bandwidth=None, item_write_capacity=None,
+                 indexes=None):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+        self.key = key
+        self.name = name
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.items = {}
+        self.requests = 0
+        self.write_units = 0
+        self.read_units = 0.0
+        self.indexes = indexes or {}
+        self.item_write_capacity = item_write_capacity
+        self._next_write = {}
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+        self._lock = threading.Lock()
+        self.meta = type("meta", (), {"client": _FakeTableClient(self)})()
+
+    def _serialize(self, item):
+        return {k: self._serializer.serialize(v) for k, v in item.items()}
+
+    def _deserialize(self, item):
+        return {k: self._deserializer.deserialize(v) for k, v in item.items()}
+
+    def _size(self, serialized):
+        return sum(_attribute_size(k, v) for k, v in serialized.items())
+
+    def _charge(self, n_bytes):
+        with self._lock:
+            self.requests += 1
+        delay = self.latency + (n_bytes / self.bandwidth if self.bandwidth else 0)
+        if delay:
+            time.sleep(delay)
+
+    def _read(self, n_bytes):
+        with self._lock:
+            self.read_units += max(1, -(-n_bytes // 4096)) / 2
+
+    def _write(self, key, old_size, new_size):
+        units = max(1, -(-max(old_size, new_size) // 1024))
+        with self._lock:
+            self.write_units += units
+            if not self.item_write_capacity:
+                return
+            now = time.monotonic()
+            start = max(now, self._next_write.get(key, now))
+            self._next_write[key] = start + units / self.item_write_capacity
+        if start > now:
+            time.sleep(start - now)
+
+    def _store(self, item):
+        serialized = self._serialize(item)
+        if self._size(serialized) > self.MAX_ITEM_BYTES:
+            raise self.exceptions.ValidationException("Item size has exceeded the maximum allowed size")
+        with self._lock:
+            self.items[item[self.key]] = serialized
+        return serialized
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        size = self._size(self._serialize(Item))
+        self._charge(size)
+        old = self.items.get(Item[self.key])
+        self._write(Item[self.key], self._size(old) if old else 0, size)
+        with self._lock:
+            self._check(self.items.get(Item[self.key]), ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues or {})
+        self._store(Item)
+        return {}
+
+    def _project(self, item, projection, names):
+        if not projection:
+            return item
+        wanted = [(names or {}).get(name.strip(), name.strip()) for name in projection.split(",")]
+        return {k: v for k, v in item.items() if k in wanted}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        item = self.items.get(Key[self.key])
+        self._charge(self._size(item) if item else 0)
+        self._read(self._size(item) if item else 0)
+        if item is None:
+            return {}
+        return {"Item": self._project(self._deserialize(item), ProjectionExpression, ExpressionAttributeNames)}
+
+    def _check(self, current, condition, names, values):
+        # Supports attribute_exists(key), attribute_not_exists(key),
+        # "<name> = :value", "<name> <> :value" and "<name> < :value", joined by OR
+        if not condition:
+            return
+        if not any(self._holds(current, clause.strip(), names, values) for clause in condition.split(" OR ")):
+            raise self.exceptions.ConditionalCheckFailedException("The conditional request failed")
+
+    def _holds(self, current, clause, names, values):
+        if clause.startswith("attribute_not_exists"):
+            return current is None
+        if clause.startswith("attribute_exists"):
+            return current is not None
+        name, operator, placeholder = clause.split()
+        name = (names or {}).get(name, name)
+        if current is None or name not in current:
+            return operator == "<>"
+        value = self._deserializer.deserialize(current[name])
+        if operator == "<>":
+            return value != values[placeholder]
+        return value < values[placeholder] if operator == "<" else value == values[placeholder]
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ConditionExpression=None, ReturnValues="NONE", ExpressionAttributeNames=None, **kwargs):
+        # Supports "SET a = :x, b = :y", "ADD n :v" and _check's conditions
+        values = ExpressionAttributeValues or {}
+        self._charge(0)
+        old = self.items.get(Key[self.key])
+        self._write(Key[self.key], self._size(old) if old else 0, 0)
+        with self._lock:
+            current = self.items.get(Key[self.key])
+            self._check(current, ConditionExpression, ExpressionAttributeNames, values)
+            item = self._deserialize(current) if current else dict(Key)
+            updated = {}
+            for clause in re.split(r"\s+(?=SET\s|ADD\s)", UpdateExpression.strip()):
+                action, _, body = clause.partition(" ")
+                for assignment in re.sub(r"\(([^)]*),\s*", r"(\1|", body).split(","):
+                    if action == "SET":
+                        name, expression = [part.strip() for part in assignment.split("=")]
+                        name = (ExpressionAttributeNames or {}).get(name, name)
+                        fallback = re.fullmatch(r"if_not_exists\((\w+)\|(:\w+)\)", expression)
+                        if fallback:
+                            item[name] = item.get(fallback.group(1), values[fallback.group(2)])
+                        else:
+                            item[name] = values[expression]
+                    else:
+                        name, placeholder = assignment.split()
+                        item[name] = item.get(name, 0) + values[placeholder]
+                    updated[name] = item[name]
+            self.items[Key[self.key]] = self._serialize(item)
+        if ReturnValues == "ALL_NEW":
+            return {"Attributes": item}
+        if ReturnValues == "UPDATED_NEW":
+            return {"Attributes": updated}
+        return {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        # Only "<attribute> = :value" conditions, as the handlers use
+        attribute, placeholder = [part.strip() for part in KeyConditionExpression.split("=")]
+        value = ExpressionAttributeValues[placeholder]
+        matches = [item for item in list(self.items.values())
+                   if attribute in item and self._deserializer.deserialize(item[attribute]) == value]
+        included = self.indexes.get(IndexName)
+        if included is not None:
+            keep = {self.key, attribute, *included}
+            matches = [{k: v for k, v in item.items() if k in keep} for item in matches]
+        # Like DynamoDB, the (index) items are read and charged before ProjectionExpression
+        size = sum(self._size(item) for item in matches)
+        self._charge(size)
+        self._read(size)
+        matches = [self._deserialize(item) for item in matches]
+        matches = [self._project(item, ProjectionExpression, ExpressionAttributeNames) for item in matches]
+        return {"Items": matches, "Count": len(matches)}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self._charge(0)
+        with self._lock:
+            current = self.items.get(Key[self.key])
+            self._check(current, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues or {})
+            self.items.pop(Key[self.key], None)
+        self._write(Key[self.key], self._size(current) if current else 0, 0)
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _FakeBatchWriter(self)
+
+    def all_items(self):
+        """Every stored item, deserialized; for assertions."""
+        return [self._deserialize(item) for item in self.items.values()]
+
+
+class FakeDynamoDB:
+    """
+    Stand-in for boto3.resource('dynamodb') handing out FakeTables by name,
+    with the hash key and GSIs from `keys` and `indexes` (by table name).
+    """
+
+    def __init__(self, keys=None, indexes=None, latency=0.0):
+        self.keys = keys or {}
+        self.indexes = indexes or {}
+        self.latency = latency
+        self.tables = {}
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(self.keys.get(name, "share_id"), name, latency=self.latency,
+                                          indexes=self.indexes.get(name))
+        return self.tables[name]
+
+
+class _FakeLambdaExceptions:
+    class RequestEntityTooLargeException(Exception):
+        pass
+
+
+class FakeLambda:
+    """
+    In-process Lambda client: `invoke` runs a registered handler on the
+    calling thread and records how long it ran, so billed duration can be
+    attributed to the callee as well as the caller waiting on it.
+    """
+
+    exceptions = _FakeLambdaExceptions
+    MAX_PAYLOAD = 6 * 1024 * 1024
+
+    def __init__(self, handlers, latency=0.0):
+        self.handlers = handlers
+        self.latency = latency
+        self.invocations = []
+
+    def invoke(self, FunctionName, Payload, InvocationType="RequestResponse"):
+        payload = Payload.encode("utf-8") if isinstance(Payload, str) else Payload
+        if len(payload) > self.MAX_PAYLOAD:
+            raise self.exceptions.RequestEntityTooLargeException(
+                f"Request must be smaller than {self.MAX_PAYLOAD} bytes for the InvokeFunction operation"
+            )
+        if self.latency:
+            time.sleep(self.latency)
+        start = time.perf_counter()
+        result = self.handlers[FunctionName](json.loads(payload), None)
+        self.invocations.append({"function": FunctionName, "seconds": time.perf_counter() - start,
+                                 "request_bytes": len(payload)})
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+
+def multi_page_pdf(pages, source_pdf):
+    """Build an in-memory PDF by repeating the first page of `source_pdf`."""
+    import PyPDF2
+
+    page = PyPDF2.PdfReader(source_pdf).pages[0]
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,175 @@
+import gzip
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+# Compact graph encoding:
+#
+#     b"KGC1" + compression byte + compressed JSON document
+#
+# The document interns node ids, types and relations into tables, stores
+# edges as a flat int array [source, target, relation, ...] of table
+# indexes, and stores every other field column-wise as [indexes, values]
+# (indexes is null when every row has the field). Repeated ids and keys
+# disappear, and what is left compresses well.
+
+MAGIC = b"KGC1"
+MEDIA_TYPE = "application/vnd.kg-graph"
+NONE, GZIP, ZSTD = 0, 1, 2
+COMPRESSION = {'none': NONE, 'gzip': GZIP, 'zstd': ZSTD}
+# Every reader must be able to decompress what writers produce, so zstd is
+# opt-in: set GRAPH_COMPRESSION=zstd once zstandard is in all layers.
+DEFAULT_COMPRESSION = COMPRESSION[os.environ.get('GRAPH_COMPRESSION', 'gzip')]
+
+def is_compact(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) == MAGIC
+
+def accepts_compact(event):
+    """True if the request's Accept header asks for the compact encoding."""
+    headers = {k.lower(): v for k, v in ((event or {}).get('headers') or {}).items()}
+    return MEDIA_TYPE in (headers.get('accept') or '')
+
+def _column(rows, key, count):
+    indexes, values = [], []
+    for i, row in enumerate(rows):
+        if key in row:
+            indexes.append(i)
+            values.append(row[key])
+    return [None if len(indexes) == count else indexes, values]
+
+def _columns(rows, skip):
+    keys = dict.fromkeys(key for row in rows for key in row if key not in skip)
+    return {key: _column(rows, key, len(rows)) for key in keys}
+
+def _properties(rows):
+    with_properties = [i for i, row in enumerate(rows) if 'properties' in row]
+    properties = [rows[i]['properties'] or {} for i in with_properties]
+    columns = _columns(properties, ())
+    return {
+        'rows': None if len(with_properties) == len(rows) else with_properties,
+        'columns': columns
+    }
+
+def _intern(table, index, value):
+    position = index.get(value)
+    if position is None:
+        position = index[value] = len(table)
+        table.append(value)
+    return position
+
+def to_compact(graph):
+    """
+    The compact document (before compression) for a {"nodes", "edges"}
+    graph. Nodes without a type decode with "type": None; everything else
+    round-trips as is.
+    """
+    nodes = graph.get('nodes') or []
+    edges = graph.get('edges') or []
+    ids, id_index = [], {}
+    types, type_index = [], {}
+    relations, relation_index = [], {}
+
+    node_ids, node_types = [], []
+    for node in nodes:
+        node_ids.append(_intern(ids, id_index, node['id']))
+        node_types.append(_intern(types, type_index, node.get('type')))
+    edge_array = []
+    for edge in edges:
+        edge_array.append(_intern(ids, id_index, edge['source']))
+        edge_array.append(_intern(ids, id_index, edge['target']))
+        edge_array.append(_intern(relations, relation_index, edge.get('relation')))
+
+    document = {
+        'v': 1,
+        'ids': ids,
+        'nodes': node_ids,
+        'types': types,
+        'node_types': node_types,
+        'node_columns': _columns(nodes, ('id', 'type', 'properties')),
+        'node_properties': _properties(nodes),
+        'relations': relations,
+        'edges': edge_array,
+        'edge_columns': _columns(edges, ('source', 'target', 'relation', 'properties')),
+        'edge_properties': _properties(edges)
+    }
+    # Keep the other top-level keys (e.g. "metadata") as they are
+    extra = {k: v for k, v in graph.items() if k not in ('nodes', 'edges')}
+    if extra:
+        document['extra'] = extra
+    return document
+
+def _scatter(rows, columns):
+    for key, (indexes, values) in columns.items():
+        for i, value in zip(range(len(rows)) if indexes is None else indexes, values):
+            rows[i][key] = value
+
+def _restore_properties(rows, properties):
+    indexes = range(len(rows)) if properties['rows'] is None else properties['rows']
+    restored = [{} for _ in indexes]
+    _scatter(restored, properties['columns'])
+    for i, value in zip(indexes, restored):
+        rows[i]['properties'] = value
+
+def from_compact(document):
+    """Inverse of to_compact."""
+    ids = document['ids']
+    types = document['types']
+    nodes = [{'id': ids[i], 'type': types[t]} for i, t in zip(document['nodes'], document['node_types'])]
+    _scatter(nodes, document['node_columns'])
+    _restore_properties(nodes, document['node_properties'])
+
+    relations = document['relations']
+    flat = document['edges']
+    edges = [
+        {'source': ids[flat[i]], 'target': ids[flat[i + 1]], 'relation': relations[flat[i + 2]]}
+        for i in range(0, len(flat), 3)
+    ]
+    _scatter(edges, document['edge_columns'])
+    _restore_properties(edges, document['edge_properties'])
+
+    graph = {'nodes': nodes, 'edges': edges}
+    graph.update(document.get('extra') or {})
+    return graph
+
+def encode(graph, compression=None, level=None, default=None):
+    """
+    Encode a graph as compact bytes, compressed with GRAPH_COMPRESSION
+    (gzip by default) unless `compression` is given. `default` is passed
+    to json.dumps (e.g. for Decimal values read from DynamoDB).
+    """
+    if compression is None:
+        compression = DEFAULT_COMPRESSION
+    raw = json.dumps(to_compact(graph), separators=(',', ':'), ensure_ascii=False, default=default).encode('utf-8')
+    if compression == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        body = zstandard.ZstdCompressor(level=level or 3).compress(raw)
+    elif compression == GZIP:
+        body = gzip.compress(raw, compresslevel=level or 6)
+    elif compression == NONE:
+        body = raw
+    else:
+        raise ValueError(f"Unknown compression: {compression}")
+    return MAGIC + bytes([compression]) + body
+
+def decode(data):
+    """Decode bytes produced by encode back into a {"nodes", "edges"} graph."""
+    data = bytes(data)
+    if not is_compact(data):
+        raise ValueError("Not a compact graph encoding")
+    compression, body = data[4], data[5:]
+    if compression == ZSTD:
+        if zstandard is None:
+            raise ValueError("Graph is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif compression == GZIP:
+        raw = gzip.decompress(body)
+    elif compression == NONE:
+        raw = body
+    else:
+        raise ValueError(f"Unknown compression: {compression}")
+    return from_compact(json.loads(raw))
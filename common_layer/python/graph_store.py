@@ -0,0 +1,176 @@
+import json
+import os
+import uuid
+from decimal import Decimal
+from boto3.dynamodb.types import Binary
+import graph_codec
+import instrumentation
+
+# Graphs up to this size are stored as a JSON string on the item itself;
+# the item limit is 400 KB including the other attributes.
+INLINE_MAX_BYTES = int(os.environ.get('GRAPH_INLINE_MAX_BYTES', str(300 * 1024)))
+# Larger graphs are split into shard items of this size...
+SHARD_BYTES = int(os.environ.get('GRAPH_SHARD_BYTES', str(350 * 1024)))
+# ...up to this total, beyond which the graph goes to S3 behind a pointer item
+SHARDED_MAX_BYTES = int(os.environ.get('GRAPH_SHARDED_MAX_BYTES', str(1024 * 1024)))
+S3_PREFIX = os.environ.get('GRAPH_S3_PREFIX', 'graphs/')
+# "json", or "compact" for graph_codec's interned, compressed encoding
+STORAGE_FORMAT = os.environ.get('GRAPH_STORAGE_FORMAT', 'json')
+# Attributes describing where an item's graph lives; replaced on every save
+GRAPH_ATTRIBUTES = ('graph_data', 'graph_json', 'graph_blob', 'graph_format', 'graph_storage', 'graph_bytes',
+                    'graph_version', 'graph_shards', 'graph_bucket', 'graph_s3_key')
+
+def decimal_default(obj):
+    """JSON serializer for objects not serializable by default json code"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    if isinstance(obj, Binary):
+        obj = obj.value
+    if graph_codec.is_compact(obj):
+        return graph_codec.decode(obj)
+    raise TypeError
+
+def shard_key(share_id, version, index):
+    # Shards carry no file_id, so they never show up in FileIdIndex queries
+    return f"{share_id}#shard#{version}#{index}"
+
+def storage_for_size(size):
+    """'inline', 'sharded' or 's3' for a serialized graph of `size` bytes."""
+    if size <= INLINE_MAX_BYTES:
+        return 'inline'
+    if size <= SHARDED_MAX_BYTES:
+        return 'sharded'
+    return 's3'
+
+def save_graph(table, item, graph, s3=None, bucket=None, storage=None, fmt=None):
+    """
+    Put `item` (a GraphCacheTable item without the graph) together with
+    `graph`, routed by serialized size:
+
+        inline:  graph_json string attribute on the item
+        sharded: graph_shards binary items keyed "{share_id}#shard#{version}#{n}"
+        s3:      s3://{bucket}/graphs/{share_id}/{version}.json
+
+    The graph is JSON, or graph_codec bytes when `fmt` (default
+    GRAPH_STORAGE_FORMAT) is "compact"; compact graphs are smaller, so
+    more of them stay inline.
+
+    Every save gets a new graph_version, and shards and S3 objects are
+    written before the item that points at them, so a reader never sees a
+    pointer to missing data or a mix of old and new shards. Data of
+    replaced versions is left to the table TTL and the bucket lifecycle.
+
+    Returns:
+        str: The storage used.
+    """
+    fmt = fmt or STORAGE_FORMAT
+    with instrumentation.span('serialization'):
+        if fmt == 'compact':
+            payload = graph_codec.encode(graph, default=decimal_default)
+        elif fmt == 'json':
+            payload = json.dumps(graph, default=decimal_default, separators=(',', ':')).encode('utf-8')
+        else:
+            raise ValueError(f"Unknown graph format: {fmt}")
+    storage = storage or storage_for_size(len(payload))
+    item = {k: v for k, v in item.items() if k not in GRAPH_ATTRIBUTES}
+    version = uuid.uuid4().hex[:12]
+    item.update({'graph_storage': storage, 'graph_format': fmt, 'graph_bytes': len(payload),
+                 'graph_version': version})
+    share_id = item['share_id']
+
+    if storage == 'inline' and fmt == 'compact':
+        item['graph_blob'] = payload
+    elif storage == 'inline':
+        item['graph_json'] = payload.decode('utf-8')
+    elif storage == 'sharded':
+        shards = [payload[i:i + SHARD_BYTES] for i in range(0, len(payload), SHARD_BYTES)]
+        with instrumentation.span('dynamodb_write'), table.batch_writer() as batch:
+            for index, shard in enumerate(shards):
+                shard_item = {'share_id': shard_key(share_id, version, index), 'payload': shard}
+                if 'expires_at' in item:
+                    shard_item['expires_at'] = item['expires_at']
+                batch.put_item(Item=shard_item)
+        item['graph_shards'] = len(shards)
+    elif storage == 's3':
+        if s3 is None or not bucket:
+            raise ValueError("S3 storage needs an s3 client and bucket")
+        key = f"{S3_PREFIX}{share_id}/{version}.{'kgc' if fmt == 'compact' else 'json'}"
+        content_type = graph_codec.MEDIA_TYPE if fmt == 'compact' else 'application/json'
+        s3.put_object(Bucket=bucket, Key=key, Body=payload, ContentType=content_type)
+        item.update({'graph_bucket': bucket, 'graph_s3_key': key})
+    else:
+        raise ValueError(f"Unknown graph storage: {storage}")
+
+    with instrumentation.span('dynamodb_write'):
+        table.put_item(Item=item)
+    return storage
+
+def load_graph_payload(table, item, s3=None):
+    """
+    The stored bytes of an item's graph, reassembled from whichever storage
+    it was saved with: JSON, or graph_codec bytes for graph_format
+    "compact". Items written before graph_store carry a graph_data map,
+    which is returned as JSON.
+    """
+    storage = item.get('graph_storage')
+    if storage == 'inline':
+        if 'graph_blob' in item:
+            blob = item['graph_blob']
+            return bytes(blob.value if isinstance(blob, Binary) else blob)
+        return item['graph_json'].encode('utf-8')
+    if storage == 'sharded':
+        return _load_shards(table, item['share_id'], item['graph_version'], int(item['graph_shards']))
+    if storage == 's3':
+        if s3 is None:
+            raise ValueError("Graph is stored in S3 but no s3 client was given")
+        response = s3.get_object(Bucket=item['graph_bucket'], Key=item['graph_s3_key'])
+        return response['Body'].read()
+    return json.dumps(item.get('graph_data'), default=decimal_default).encode('utf-8')
+
+def load_graph_json(table, item, s3=None):
+    """The graph of a GraphCacheTable item as a JSON string, whatever its format."""
+    if item.get('graph_storage') == 'inline' and 'graph_json' in item:
+        return item['graph_json']
+    payload = load_graph_payload(table, item, s3)
+    if graph_codec.is_compact(payload):
+        return json.dumps(graph_codec.decode(payload), ensure_ascii=False)
+    return payload.decode('utf-8')
+
+def load_graph_compact(table, item, s3=None):
+    """The graph of a GraphCacheTable item as graph_codec bytes, whatever its format."""
+    payload = load_graph_payload(table, item, s3)
+    if graph_codec.is_compact(payload):
+        return payload
+    return graph_codec.encode(json.loads(payload))
+
+def load_graph(table, item, s3=None):
+    """The graph of a GraphCacheTable item, parsed."""
+    payload = load_graph_payload(table, item, s3)
+    if graph_codec.is_compact(payload):
+        return graph_codec.decode(payload)
+    return json.loads(payload)
+
+def _load_shards(table, share_id, version, count):
+    client = table.meta.client
+    keys = [shard_key(share_id, version, index) for index in range(count)]
+    shards = {}
+    for i in range(0, len(keys), 100):
+        request = {table.name: {'Keys': [{'share_id': {'S': key}} for key in keys[i:i + 100]]}}
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for shard in response.get('Responses', {}).get(table.name, []):
+                shards[shard['share_id']['S']] = shard['payload']['B']
+            request = response.get('UnprocessedKeys') or None
+    missing = [key for key in keys if key not in shards]
+    if missing:
+        raise ValueError(f"Graph {share_id} is missing {len(missing)} of {count} shards")
+    return b''.join(shards[key] for key in keys)
+
+def json_with_graph(fields, graph_json, name='graph_data'):
+    """
+    Serialize `fields` plus the graph under `name` without parsing the
+    graph JSON again: it is spliced into the output as-is.
+    """
+    head = json.dumps(fields, default=decimal_default)
+    separator = ', ' if fields else ''
+    return f'{head[:-1]}{separator}"{name}": {graph_json}}}'
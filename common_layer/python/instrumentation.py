@@ -0,0 +1,121 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import time
+
+# Per-invocation stage timings, written to the function log as one
+# CloudWatch Embedded Metric Format (EMF) line, which CloudWatch turns into
+# metrics without any PutMetricData calls:
+#
+#     @instrumentation.instrument('KnowledgeGraphAPI')
+#     def lambda_handler(event, context):
+#         with instrumentation.span('chunking'):
+#             ...
+#
+# Spans with the same name add up to one metric, with one value per span
+# (so CloudWatch can report percentiles of per-chunk LLM calls). Only a
+# METRICS_SAMPLE_RATE share of invocations is timed; outside one, span()
+# returns a shared no-op, so disabled instrumentation costs a context
+# variable lookup per span.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1'))
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TextToKG')
+# "DEBUG" also logs request bodies and full graphs (see debug())
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# EMF takes at most 100 values per metric
+MAX_VALUES = 100
+
+_invocation = contextvars.ContextVar('invocation', default=None)
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+class _Span:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        milliseconds = (time.perf_counter() - self.start) * 1000
+        # list.append is atomic, so worker threads of one invocation can share it
+        self.timings.setdefault(self.name, []).append(milliseconds)
+        return False
+
+def span(name):
+    """Time the `with` block as `name` if the current invocation is sampled."""
+    timings = _invocation.get()
+    if timings is None:
+        return _NO_SPAN
+    return _Span(timings, name)
+
+def debug(label, payload):
+    """Log a (possibly large) payload only when LOG_LEVEL is DEBUG."""
+    if LOG_LEVEL == 'DEBUG':
+        print(f"{label}: {payload}")
+
+def emf_record(function, timings, properties=None):
+    """
+    The EMF document for one invocation's timings.
+
+    Args:
+        function (str): Value of the "Function" dimension.
+        timings (dict): Span name -> list of milliseconds.
+        properties (dict, optional): Extra fields to log, not turned into metrics.
+
+    Returns:
+        dict: The document to log as one JSON line.
+    """
+    record = dict(properties or {})
+    record['_aws'] = {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [{
+            'Namespace': METRICS_NAMESPACE,
+            'Dimensions': [['Function']],
+            'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in timings]
+        }]
+    }
+    record['Function'] = function
+    for name, values in timings.items():
+        values = [round(v, 3) for v in values[:MAX_VALUES]]
+        record[name] = values[0] if len(values) == 1 else values
+    return record
+
+def instrument(function):
+    """
+    Decorator for a Lambda handler: samples the invocation, times it as
+    "handler" and logs the EMF line when it returns or raises.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if METRICS_SAMPLE_RATE <= 0 or random.random() >= METRICS_SAMPLE_RATE:
+                return handler(event, context)
+            timings = {}
+            token = _invocation.set(timings)
+            try:
+                with _Span(timings, 'handler'):
+                    return handler(event, context)
+            finally:
+                _invocation.reset(token)
+                properties = {}
+                request_id = getattr(context, 'aws_request_id', None)
+                if request_id:
+                    properties['RequestId'] = request_id
+                print(json.dumps(emf_record(function, timings, properties)))
+        return wrapper
+    return decorator
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit, with the current invocation's spans recorded from the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
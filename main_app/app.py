@@ -1,79 +1,221 @@
 import json
 import os
+import time
 import boto3
 import asyncio
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
+import instrumentation
+import knowledge_graph
+# Re-exported for callers that predate knowledge_graph
+from knowledge_graph import (
+    MODEL_NAME, get_secret, get_llm, extract_kg_from_text_chunk, split_text,
+    extract_kg_from_text, stream_kg_from_text, response_metadata
+)
 
-# Remove dotenv import and load_dotenv() call
+s3 = boto3.client('s3')
+# Bucket that {"text_s3_key": ...} requests may read extracted text from
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
 
-# Initialize the Secrets Manager client
-secretsmanager = boto3.client('secretsmanager')
+# A batch must come back within API Gateway's 29 second limit. Its items
+# share KG_BATCH_MAX_CONCURRENCY LLM calls in flight, so with the defaults a
+# full batch of short texts is one round of calls. Items still running after
+# KG_BATCH_TIMEOUT_SECONDS are returned as timed out.
+BATCH_MAX_ITEMS = int(os.environ.get('KG_BATCH_MAX_ITEMS', '25'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('KG_BATCH_MAX_CONCURRENCY', '25'))
+BATCH_TIMEOUT_SECONDS = float(os.environ.get('KG_BATCH_TIMEOUT_SECONDS', '25'))
 
-def get_secret():
-    """Get the OpenAI API key from Secrets Manager."""
-    secret_name = os.environ.get('SECRET_NAME')
+# API Gateway answers 504 after this long, whatever the function is still doing
+API_GATEWAY_TIMEOUT_SECONDS = 29
+
+# KG_PREFETCH=true: fetch the key and load LangChain during init
+if knowledge_graph.PREFETCH:
+    knowledge_graph.prefetch()
+
+async def write_ndjson(text, write, stats=None, **chunking):
+    """
+    Drive stream_kg_from_text and hand each event to `write` as one NDJSON
+    line, finishing with a "done" (or "error") event.
+
+    `write` is called as soon as a chunk completes, so a streaming-capable
+    front end can flush each line to the client immediately. Behind API
+    Gateway, lambda_handler collects the lines into one response instead.
+
+    Returns:
+        bool: False if the stream ended with an "error" event.
+    """
+    if stats is None:
+        stats = {}
     try:
-        response = secretsmanager.get_secret_value(SecretId=secret_name)
-        secret = json.loads(response['SecretString'])
-        return secret.get('OPENAI_API_KEY')
+        async for event in knowledge_graph.stream_kg_from_text(text, stats=stats, **chunking):
+            write(json.dumps(event) + "\n")
+        write(json.dumps({"type": "done", "metadata": response_metadata(stats)}) + "\n")
+        return True
     except Exception as e:
-        # Handle secret-not-found exceptions
-        print(f"Error retrieving secret: {e}")
-        raise e
-
-# Initialize LLM with the API key from Secrets Manager
-# We'll use a lazy initialization pattern to avoid cold start issues
-llm = None
-llm_transformer = None
-
-def get_llm():
-    global llm, llm_transformer
-    if llm is None:
-        api_key = get_secret()
-        llm = ChatOpenAI(temperature=0, model_name="gpt-4-turbo", openai_api_key=api_key)
-        llm_transformer = LLMGraphTransformer(llm=llm)
-    return llm, llm_transformer
-
-async def extract_kg_from_text_chunk(chunk):
-    _, transformer = get_llm()
-    document = Document(page_content=chunk)
-    graph_document = await transformer.aconvert_to_graph_documents([document])
-    return graph_document[0].nodes, graph_document[0].relationships
-
-async def extract_kg_from_text(text):
+        write(json.dumps({"type": "error", "error": str(e)}) + "\n")
+        return False
+
+def wants_stream(event, body):
+    """Streaming is opt-in via {"stream": true} or Accept: application/x-ndjson."""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return body.get('stream') is True or 'application/x-ndjson' in (headers.get('accept') or '')
+
+def chunking_options(body):
     """
-    Extracts a knowledge graph from the provided text using GPT.
-    
+    Per-request chunking from {"chunk_tokens", "chunk_overlap_tokens"},
+    as keyword arguments for knowledge_graph.build_graph.
+    """
+    options = {}
+    for field, name in (('chunk_tokens', 'chunk_tokens'), ('chunk_overlap_tokens', 'overlap_tokens')):
+        value = body.get(field)
+        if value is None:
+            continue
+        smallest = 1 if field == 'chunk_tokens' else 0
+        if not isinstance(value, int) or isinstance(value, bool) or value < smallest:
+            raise ValueError(f"{field} must be an integer >= {smallest}")
+        options[name] = value
+    return options
+
+def read_text_reference(key):
+    """
+    Load text that a caller staged in S3 instead of sending inline, which
+    lifts the 6 MB invoke payload limit. Only extracted text under
+    uploads/ in this stack's bucket can be referenced.
+    """
+    if not BUCKET_NAME:
+        raise ValueError("BUCKET_NAME is not configured for text_s3_key requests")
+    if not key.startswith('uploads/') or not key.endswith('/' + knowledge_graph.TEXT_OBJECT_NAME):
+        raise ValueError(f"Invalid text_s3_key: {key}")
+    response = s3.get_object(Bucket=BUCKET_NAME, Key=key)
+    return response['Body'].read().decode('utf-8')
+
+def batch_items(body):
+    """
+    The items of a batch request, {"items": [{"id": "...", "text": "..."}, ...]}.
+
+    Raises:
+        ValueError: If the batch as a whole can't be run: not a list, empty,
+            over BATCH_MAX_ITEMS, or with a missing or repeated id. An item
+            without text only fails that item.
+    """
+    items = body.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list of {\"id\", \"text\"} objects")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch may have at most {BATCH_MAX_ITEMS} items, got {len(items)}")
+    ids = set()
+    for item in items:
+        item_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(item_id, str) or not item_id:
+            raise ValueError("Every item needs a string id")
+        if item_id in ids:
+            raise ValueError(f"Duplicate item id: {item_id}")
+        ids.add(item_id)
+    return items
+
+async def build_batch(items, deadline=None, **chunking):
+    """
+    Extract the graphs of a batch's items concurrently on one event loop
+    (see knowledge_graph.build_graphs), at most BATCH_MAX_CONCURRENCY LLM
+    calls at a time.
+
     Args:
-        text (str): The input text from which to extract the knowledge graph.
-        
+        items (list): The batch_items.
+        deadline (float, optional): time.monotonic() after which unfinished
+            items are given up as timed out.
+
     Returns:
-        tuple: A tuple containing two lists - nodes and relationships.
+        dict: {"items": [...], "metadata": {...}} with one result per item,
+        in request order: {"id", "nodes", "edges", "metadata"}, or
+        {"id", "error"} for an item that failed.
     """
-    splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    chunks = splitter.split_text(text)
+    started = time.perf_counter()
+    texts = {item['id']: item.get('text') for item in items}
+    valid = [item_id for item_id, text in texts.items() if isinstance(text, str) and text.strip()]
+    graphs = dict(zip(valid, await knowledge_graph.build_graphs(
+        [texts[item_id] for item_id in valid], max_concurrency=BATCH_MAX_CONCURRENCY, deadline=deadline, **chunking
+    )))
 
-    all_nodes = []
-    all_relationships = []
+    results = []
+    # Repeated texts share one graph, and its usage is only counted once
+    distinct = {}
+    for item in items:
+        graph = graphs.get(item['id'])
+        if graph is None:
+            results.append({"id": item['id'], "error": "No text provided"})
+        elif isinstance(graph, BaseException):
+            print(f"Batch item {item['id']} failed: {graph}")
+            # Some exceptions, e.g. CancelledError, have no message
+            results.append({"id": item['id'], "error": str(graph) or type(graph).__name__})
+        else:
+            results.append({"id": item['id'], **graph})
+            distinct[id(graph)] = graph
+    metadata = [graph['metadata'] for graph in distinct.values()]
+    failed = sum(1 for result in results if 'error' in result)
+    return {
+        "items": results,
+        "metadata": {
+            "items": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "chunks": sum(m['chunks'] for m in metadata),
+            "cache": {name: sum(m['cache'][name] for m in metadata) for name in ('hits', 'misses')},
+            "usage": {name: sum(m['usage'][name] for m in metadata)
+                      for name in ('prompt_tokens', 'completion_tokens')},
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+    }
 
-    # Process each chunk separately
-    for chunk in chunks:
-        nodes, relationships = await extract_kg_from_text_chunk(chunk)
-        all_nodes.extend(nodes)
-        all_relationships.extend(relationships)
+def request_deadline(event, context):
+    """
+    time.monotonic() after which a response is no use: API Gateway's timeout
+    for API requests, the end of the invocation for both kinds (less a
+    second to respond), or None when neither is known.
+    """
+    seconds = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        seconds = context.get_remaining_time_in_millis() / 1000 - 1
+    if 'requestContext' in event:
+        seconds = min(seconds, API_GATEWAY_TIMEOUT_SECONDS) if seconds is not None else API_GATEWAY_TIMEOUT_SECONDS
+    return None if seconds is None else time.monotonic() + seconds
 
-    # Deduplicate nodes and relationships
-    all_nodes = [{"id": n.id, "type": n.id, "properties": n.properties} for i,n in enumerate(all_nodes)]
-    all_relationships = [{"source": r.source.id, "target": r.target.id, "relation": r.type} for r in all_relationships]
+def batch_response(body, deadline=None):
+    """POST /get_knowledge_graph/batch: graphs for many texts in one request."""
+    try:
+        items = batch_items(body)
+        chunking = chunking_options(body)
+    except ValueError as e:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
+                "Access-Control-Allow-Methods": "POST, OPTIONS"
+            },
+            "body": json.dumps({"error": str(e)})
+        }
 
-    return all_nodes, all_relationships
+    batch_deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+    if deadline is not None:
+        batch_deadline = min(batch_deadline, deadline)
+    batch = asyncio.run(build_batch(items, deadline=batch_deadline, **chunking))
+    print(f"Batch of {batch['metadata']['items']} items: {batch['metadata']['failed']} failed "
+          f"in {batch['metadata']['seconds']}s")
+    with instrumentation.span('serialization'):
+        response_body = json.dumps(batch)
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
+            "Access-Control-Allow-Methods": "POST, OPTIONS"
+        },
+        "body": response_body
+    }
 
+@instrumentation.instrument('KnowledgeGraphAPI')
 def lambda_handler(event, context):
     """
     Lambda function handler to process the event and extract knowledge graph.
+    A body with "items" is a batch (see batch_response).
     
     Args:
         event (dict): The event data passed to the Lambda function.
@@ -84,10 +226,27 @@ def lambda_handler(event, context):
     """
     try:
         body = json.loads(event['body'])
+        deadline = request_deadline(event, context)
+        if 'items' in body:
+            return batch_response(body, deadline)
         text = body.get('text', '')
+        if body.get('text_s3_key') and 'requestContext' in event:
+            # Only ProcessUploadedFunction's direct invokes may point at stored
+            # text; through the public API anyone with a file_id could
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
+                    "Access-Control-Allow-Methods": "POST, OPTIONS"
+                },
+                "body": json.dumps({"error": "text_s3_key is not accepted on API requests"})
+            }
+        if not text and body.get('text_s3_key'):
+            text = read_text_reference(body['text_s3_key'])
+
+        instrumentation.debug("Request body", event['body'])
 
-        print(event['body'])
-        
         if not text:
             return {
                 "statusCode": 400,
@@ -99,11 +258,44 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": "No text provided"})
             }
 
-        nodes, relationships = asyncio.run(extract_kg_from_text(text))
+        try:
+            chunking = chunking_options(body)
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
+                    "Access-Control-Allow-Methods": "POST, OPTIONS"
+                },
+                "body": json.dumps({"error": str(e)})
+            }
+
+        if wants_stream(event, body):
+            # API Gateway buffers Lambda responses, so the lines arrive
+            # together; the framing is the same a streaming front end sends
+            lines = []
+            completed = asyncio.run(write_ndjson(text, lines.append, **chunking))
+            return {
+                # The chunks before a failure are still in the body
+                "statusCode": 200 if completed else 500,
+                "headers": {
+                    "Content-Type": "application/x-ndjson",
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
+                    "Access-Control-Allow-Methods": "POST, OPTIONS"
+                },
+                "body": "".join(lines)
+            }
+
+        graph = asyncio.run(knowledge_graph.build_graph(text, deadline=deadline, **chunking))
+        nodes, relationships = graph["nodes"], graph["edges"]
         print(f"Extracted {len(nodes)} nodes and {len(relationships)} relationships.")
-        print(f"Nodes: {nodes}")
-        print(f"Relationships: {relationships}")
+        instrumentation.debug("Nodes", nodes)
+        instrumentation.debug("Relationships", relationships)
 
+        with instrumentation.span('serialization'):
+            response_body = json.dumps(graph)
         return {
             "statusCode": 200,
             "headers": {
@@ -111,10 +303,7 @@ def lambda_handler(event, context):
                 "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
                 "Access-Control-Allow-Methods": "POST, OPTIONS"
             },
-            "body": json.dumps({
-                "nodes": nodes,
-                "edges": relationships
-            })
+            "body": response_body
         }
     except Exception as e:
         return {
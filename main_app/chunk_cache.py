@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import boto3
+
+# Bump when the shape of cached chunk graphs changes so old entries are ignored
+CACHE_VERSION = 1
+CACHE_TTL_DAYS = int(os.environ.get('CHUNK_CACHE_TTL_DAYS', '30'))
+# Budget for the disk tier. Lambda's /tmp is 512 MB by default and is shared
+# with uploads spooled to disk, so the cache must not fill it
+DISK_MAX_BYTES = int(os.environ.get('CHUNK_CACHE_DIR_MAX_BYTES', str(64 * 1024 * 1024)))
+
+def chunk_cache_key(chunk, model_name, transformer_config):
+    """Content address for one chunk's extraction result."""
+    material = json.dumps(
+        [CACHE_VERSION, model_name, transformer_config, chunk],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def transformer_config(transformer):
+    """The LLMGraphTransformer settings that change what a chunk extracts to."""
+    config = {
+        'allowed_nodes': list(getattr(transformer, 'allowed_nodes', []) or []),
+        'allowed_relationships': [list(r) if isinstance(r, tuple) else r
+                                  for r in getattr(transformer, 'allowed_relationships', []) or []],
+        'strict_mode': getattr(transformer, 'strict_mode', True),
+        'function_call': getattr(transformer, '_function_call', True),
+        'class': type(transformer).__name__,
+    }
+    # Set on transformers around a stand-in model (fake_llm), whose results
+    # must never be served for the real one
+    namespace = getattr(transformer, 'cache_namespace', None)
+    if namespace:
+        config['llm'] = namespace
+    return config
+
+class MemoryBackend:
+    """
+    In-process LRU; survives between invocations of a warm container.
+    Locked because ProcessUploadedFunction extracts several records at once.
+    """
+    name = 'memory'
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+        return found
+
+    def put_many(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class DiskBackend:
+    """
+    One JSON file per chunk under a local directory (normally /tmp), at most
+    `max_bytes` in total. Hits refresh a file's mtime; when a write goes over
+    the budget, the least recently used files are deleted until the
+    directory is down to three quarters of it.
+    """
+    name = 'disk'
+
+    def __init__(self, directory='/tmp/kg-chunk-cache', max_bytes=None):
+        self.directory = directory
+        self.max_bytes = DISK_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Left by an earlier instance in this container, if any
+        self.bytes = sum(size for _, size, _ in self._files())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _files(self):
+        """(path, size, mtime) of every cache file."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # pruned by another thread
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    found[key] = json.load(f)
+                os.utime(self._path(key))
+            except (OSError, ValueError):
+                continue
+        return found
+
+    def put_many(self, values):
+        written = 0
+        for key, value in values.items():
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(value, f)
+                written += os.path.getsize(tmp_path)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                # /tmp full or read-only: the cache is best-effort
+                print(f"Warning: Failed to write chunk cache file: {str(e)}")
+        with self._lock:
+            self.bytes += written
+            if self.bytes > self.max_bytes:
+                self._prune()
+
+    def _prune(self):
+        # Sizes are re-read: overwritten keys and other instances make the running total drift
+        files = sorted(self._files(), key=lambda file: file[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self.bytes = total
+
+class DynamoDBBackend:
+    """Shared across containers; items are {cache_key, payload, expires_at}."""
+    name = 'dynamodb'
+    # Stay well under the 400 KB item limit; bigger chunk graphs are not cached here
+    MAX_PAYLOAD_BYTES = 350 * 1024
+
+    def __init__(self, table_name, dynamodb=None):
+        self.table_name = table_name
+        self.dynamodb = dynamodb or boto3.resource('dynamodb')
+        self.table = self.dynamodb.Table(table_name)
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 100):
+            request = {self.table_name: {
+                'Keys': [{'cache_key': key} for key in keys[i:i + 100]],
+                'ProjectionExpression': 'cache_key, payload'
+            }}
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    found[item['cache_key']] = json.loads(item['payload'])
+                request = response.get('UnprocessedKeys') or None
+        return found
+
+    def put_many(self, values):
+        expires_at = int(time.time()) + CACHE_TTL_DAYS * 86400
+        with self.table.batch_writer(overwrite_by_pkeys=['cache_key']) as batch:
+            for key, value in values.items():
+                payload = json.dumps(value)
+                if len(payload.encode('utf-8')) > self.MAX_PAYLOAD_BYTES:
+                    continue
+                batch.put_item(Item={'cache_key': key, 'payload': payload, 'expires_at': expires_at})
+
+class S3Backend:
+    """Shared across containers; one object per chunk under a key prefix."""
+    name = 's3'
+
+    def __init__(self, bucket, prefix='chunk-cache/', s3=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = s3 or boto3.client('s3')
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            try:
+                response = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+                found[key] = json.loads(response['Body'].read())
+            except self.s3.exceptions.NoSuchKey:
+                continue
+        return found
+
+    def put_many(self, values):
+        for key, value in values.items():
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}{key}.json",
+                Body=json.dumps(value).encode('utf-8'),
+                ContentType='application/json'
+            )
+
+class ChunkCache:
+    """
+    Read-through cache over an ordered list of backends (fastest first).
+
+    A hit in a slower tier is copied into the faster tiers. Backend errors
+    are logged and treated as misses so a cache outage never fails an
+    extraction.
+    """
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+
+    def get_many(self, keys):
+        found = {}
+        missing = list(dict.fromkeys(keys))
+        for i, backend in enumerate(self.backends):
+            if not missing:
+                break
+            try:
+                hits = backend.get_many(missing)
+            except Exception as e:
+                print(f"Warning: Chunk cache read failed ({backend.name}): {str(e)}")
+                continue
+            if hits:
+                for faster in self.backends[:i]:
+                    self._put(faster, hits)
+                found.update(hits)
+                missing = [key for key in missing if key not in hits]
+        return found
+
+    def put_many(self, values):
+        if not values:
+            return
+        for backend in self.backends:
+            self._put(backend, values)
+
+    def _put(self, backend, values):
+        try:
+            backend.put_many(values)
+        except Exception as e:
+            print(f"Warning: Chunk cache write failed ({backend.name}): {str(e)}")
+
+def cache_from_environment():
+    """
+    Build the cache tiers from configuration:
+
+        CHUNK_CACHE_MEMORY_ENTRIES  in-process LRU size (0 disables)
+        CHUNK_CACHE_DIR             local directory tier ('' disables),
+                                    up to CHUNK_CACHE_DIR_MAX_BYTES
+        CHUNK_CACHE_TABLE           DynamoDB tier
+        CHUNK_CACHE_BUCKET          S3 tier (prefix CHUNK_CACHE_PREFIX)
+    """
+    backends = []
+    memory_entries = int(os.environ.get('CHUNK_CACHE_MEMORY_ENTRIES', '2048'))
+    if memory_entries > 0:
+        backends.append(MemoryBackend(memory_entries))
+    directory = os.environ.get('CHUNK_CACHE_DIR', '/tmp/kg-chunk-cache')
+    if directory:
+        try:
+            backends.append(DiskBackend(directory))
+        except OSError as e:
+            print(f"Warning: Disk chunk cache disabled: {str(e)}")
+    if os.environ.get('CHUNK_CACHE_TABLE'):
+        backends.append(DynamoDBBackend(os.environ['CHUNK_CACHE_TABLE']))
+    if os.environ.get('CHUNK_CACHE_BUCKET'):
+        backends.append(S3Backend(os.environ['CHUNK_CACHE_BUCKET'], os.environ.get('CHUNK_CACHE_PREFIX', 'chunk-cache/')))
+    return ChunkCache(backends)
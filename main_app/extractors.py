@@ -0,0 +1,219 @@
+import io
+import os
+import re
+import zipfile
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+import pdf_text
+
+# Text extraction for every format an upload can be in, keyed by name.
+# A file's format is found from its first bytes, then its MIME type, then
+# its extension (see detect_format); add one with @register.
+EXTRACTORS = {}
+# Bytes read to sniff a format
+SNIFF_BYTES = 2048
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+# MIME types that say nothing about the format
+GENERIC_MIME_TYPES = {'', 'application/octet-stream', 'binary/octet-stream'}
+
+class UnsupportedFormatError(ValueError):
+    """No extractor handles the file."""
+
+def register(name, mime_types=(), extensions=()):
+    def decorator(extract):
+        EXTRACTORS[name] = {'extract': extract, 'mime_types': set(mime_types), 'extensions': set(extensions)}
+        return extract
+    return decorator
+
+def read_bytes(source):
+    """All of a bytes or seekable binary file source."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    source.seek(0)
+    return source.read()
+
+def head_bytes(source, size=SNIFF_BYTES):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    position = source.tell()
+    try:
+        return source.read(size)
+    finally:
+        source.seek(position)
+
+def as_file(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+
+def is_docx(source):
+    """DOCX files are zip archives with a word/document.xml; other zips aren't ours."""
+    stream = as_file(source)
+    position = stream.tell()
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            return 'word/document.xml' in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+    finally:
+        stream.seek(position)
+
+def sniff_format(source):
+    """The format a file's first bytes give away, or None."""
+    head = head_bytes(source)
+    if b'%PDF-' in head[:1024]:
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return 'docx' if is_docx(source) else None
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if start.startswith((b'<!doctype html', b'<html')) or b'<html' in start[:512]:
+        return 'html'
+    return None
+
+def detect_format(source, content_type=None, file_name=None):
+    """
+    Name of the extractor for a file: sniffed from its first bytes, or else
+    from its MIME type or extension. Undeclared UTF-8 is read as text.
+
+    Raises:
+        UnsupportedFormatError: For anything else (images, zips, ...).
+    """
+    sniffed = sniff_format(source)
+    if sniffed:
+        return sniffed
+    if head_bytes(source).startswith(b'PK\x03\x04'):
+        raise UnsupportedFormatError(f"Unsupported archive: {file_name or 'file'}")
+
+    mime_type = (content_type or '').split(';')[0].strip().lower()
+    extension = os.path.splitext(file_name or '')[1].lower()
+    for name, extractor in EXTRACTORS.items():
+        if mime_type in extractor['mime_types']:
+            return name
+    for name, extractor in EXTRACTORS.items():
+        if extension in extractor['extensions']:
+            return name
+    if mime_type.startswith('text/') or (mime_type in GENERIC_MIME_TYPES and looks_like_text(head_bytes(source))):
+        return 'text'
+    raise UnsupportedFormatError(
+        f"Unsupported file type: {file_name or 'file'} ({content_type or 'no content type'})")
+
+def looks_like_text(head):
+    try:
+        # A multi-byte character may be cut off at the end of the sample
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        return e.start >= len(head) - 3 and b'\x00' not in head
+    return b'\x00' not in head
+
+def extract_text(source, content_type=None, file_name=None, timings=None):
+    """
+    Extract the text of an uploaded file in any registered format.
+
+    Args:
+        source: Bytes or a seekable binary file object.
+        content_type (str, optional): The MIME type the file was uploaded with.
+        file_name (str, optional): Its name, for the extension.
+        timings (list, optional): Page timings, for PDFs (see pdf_text.iter_pdf_pages).
+
+    Returns:
+        str: The text.
+
+    Raises:
+        UnsupportedFormatError: If no extractor handles the file.
+    """
+    name = detect_format(source, content_type, file_name)
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        source.seek(0)
+    return EXTRACTORS[name]['extract'](source, timings=timings)
+
+@register('pdf', mime_types={'application/pdf', 'application/x-pdf'}, extensions={'.pdf'})
+def extract_pdf(source, timings=None):
+    # Pages on separate lines, so words at page breaks don't run together
+    return pdf_text.extract_pdf_text(source, separator='\n', timings=timings)
+
+@register('docx', mime_types={DOCX_MIME}, extensions={'.docx'})
+def extract_docx(source, timings=None):
+    w = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+    paragraphs = []
+    with zipfile.ZipFile(as_file(source)) as archive, archive.open('word/document.xml') as document:
+        parts = []
+        for _, element in ElementTree.iterparse(document):
+            if element.tag == f'{w}t':
+                parts.append(element.text or '')
+            elif element.tag == f'{w}tab':
+                parts.append('\t')
+            elif element.tag in (f'{w}br', f'{w}cr'):
+                parts.append('\n')
+            elif element.tag == f'{w}p':
+                paragraphs.append(''.join(parts))
+                parts = []
+                # Paragraphs are done with once read, so the tree stays small
+                element.clear()
+    return '\n'.join(paragraphs)
+
+class _HTMLText(HTMLParser):
+    SKIP = {'script', 'style', 'noscript', 'template', 'svg'}
+    BLOCKS = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article',
+              'header', 'footer', 'blockquote', 'pre', 'table', 'ul', 'ol', 'title', 'form', 'label', 'button'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag in self.BLOCKS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCKS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+def decode_text(data):
+    """UTF-8 (with or without a BOM) or UTF-16 with a BOM."""
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return data.decode('utf-16')
+    return data.decode('utf-8-sig')
+
+def collapse_whitespace(text):
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+@register('html', mime_types={'text/html', 'application/xhtml+xml'}, extensions={'.html', '.htm', '.xhtml'})
+def extract_html(source, timings=None):
+    parser = _HTMLText()
+    parser.feed(read_bytes(source).decode('utf-8-sig', errors='replace'))
+    parser.close()
+    return collapse_whitespace(''.join(parser.parts))
+
+_MARKDOWN = [
+    (re.compile(r'^[ \t]{0,3}(```|~~~).*$', re.M), ''),                         # code fences (the code is kept)
+    (re.compile(r'^[ \t]{0,3}\[[^\]]+\]:[ \t]*\S+.*$', re.M), ''),              # link reference definitions
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),                             # images: alt text
+    (re.compile(r'\[([^\]]+)\](\([^)]*\)|\[[^\]]*\])'), r'\1'),                 # links: link text
+    (re.compile(r'^[ \t]{0,3}#{1,6}[ \t]*(.*?)[ \t]*#*[ \t]*$', re.M), r'\1'),  # headings
+    (re.compile(r'^[ \t]{0,3}>[ \t]?', re.M), ''),                              # block quotes
+    (re.compile(r'^[ \t]*([-*+]|\d+[.)])[ \t]+', re.M), ''),                    # list markers
+    (re.compile(r'^[ \t]{0,3}([-*_][ \t]*){3,}$', re.M), ''),                   # horizontal rules
+    (re.compile(r'(\*\*|__)(.+?)\1'), r'\2'),                                   # strong
+    (re.compile(r'(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])'), r'\2'),      # emphasis
+    (re.compile(r'`([^`]+)`'), r'\1'),                                          # inline code
+    (re.compile(r'<[^>\n]+>'), ''),                                             # inline HTML
+]
+
+@register('markdown', mime_types={'text/markdown', 'text/x-markdown'}, extensions={'.md', '.markdown'})
+def extract_markdown(source, timings=None):
+    text = decode_text(read_bytes(source))
+    for pattern, replacement in _MARKDOWN:
+        text = pattern.sub(replacement, text)
+    return text
+
+@register('text', mime_types={'text/plain'}, extensions={'.txt', '.text', '.csv', '.log'})
+def extract_plain_text(source, timings=None):
+    return decode_text(read_bytes(source))
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, ClassVar, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+# Offline stand-in for the OpenAI chat model (KG_LLM_PROVIDER=fake), so the
+# pipeline can be load-tested and benchmarked without API credits. It
+# answers LLMGraphTransformer's structured-output calls with a graph of the
+# capitalised phrases in the chunk (the same text always gives the same
+# graph) after a simulated latency, and fails a share of calls with the
+# status code the API would send.
+LATENCY_MS = float(os.environ.get('KG_FAKE_LATENCY_MS', '800'))
+# "constant", "uniform" (0 to 2x) or "lognormal" (median LATENCY_MS, long tail)
+LATENCY_DISTRIBUTION = os.environ.get('KG_FAKE_LATENCY_DISTRIBUTION', 'lognormal')
+LATENCY_SIGMA = float(os.environ.get('KG_FAKE_LATENCY_SIGMA', '0.5'))
+ERROR_RATE = float(os.environ.get('KG_FAKE_ERROR_RATE', '0'))
+ERROR_STATUS = int(os.environ.get('KG_FAKE_ERROR_STATUS', '429'))
+SEED = int(os.environ.get('KG_FAKE_SEED', '0'))
+
+ENTITY_PATTERN = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)*\b")
+INPUT_MARKER = 'input:'
+CHARS_PER_TOKEN = 4
+
+class FakeAPIError(Exception):
+    """An error response, with the `status_code` kg_extraction looks for."""
+
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code} - simulated by KG_LLM_PROVIDER=fake")
+        self.status_code = status_code
+
+def graph_from_text(text):
+    """
+    Nodes for the capitalised phrases of `text`, consecutive ones linked by
+    RELATED_TO, in the argument shape of LLMGraphTransformer's schema.
+    """
+    names = list(dict.fromkeys(ENTITY_PATTERN.findall(text)))
+    return {
+        'nodes': [{'id': name, 'type': 'Entity'} for name in names],
+        'relationships': [
+            {'source_node_id': source, 'source_node_type': 'Entity',
+             'target_node_id': target, 'target_node_type': 'Entity', 'type': 'RELATED_TO'}
+            for source, target in zip(names, names[1:])
+        ]
+    }
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that fills in whichever tool it is bound to with
+    graph_from_text of the last message. Latencies and errors are drawn
+    from one random stream seeded by `seed`, so a run is repeatable.
+    """
+
+    latency_ms: float = 800
+    latency_distribution: str = 'lognormal'
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 429
+    seed: int = 0
+    # Keeps its results apart from the real model's in the chunk cache
+    cache_namespace: ClassVar[str] = 'fake'
+
+    _random: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return 'fake-graph'
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def draw(self):
+        """(seconds to wait, whether the call fails) for the next call."""
+        with self._lock:
+            if self._random is None:
+                self._random = random.Random(self.seed)
+            if self.latency_distribution == 'constant':
+                ms = self.latency_ms
+            elif self.latency_distribution == 'uniform':
+                ms = self._random.uniform(0, 2 * self.latency_ms)
+            else:
+                ms = self.latency_ms * math.exp(self._random.gauss(0, self.latency_sigma))
+            return ms / 1000, self._random.random() < self.error_rate
+
+    def _respond(self, messages, failed, tools=None, **kwargs):
+        if failed:
+            raise FakeAPIError(self.error_status)
+        text = messages[-1].content if isinstance(messages[-1].content, str) else json.dumps(messages[-1].content)
+        # LLMGraphTransformer's prompt ends "...from the following input: {input}"
+        graph = graph_from_text(text.rsplit(INPUT_MARKER, 1)[-1])
+        if tools:
+            message = AIMessage(content='', tool_calls=[
+                {'name': tools[0]['function']['name'], 'args': graph, 'id': 'call_fake'}])
+        else:
+            message = AIMessage(content=json.dumps(graph))
+        prompt_chars = sum(len(str(m.content)) for m in messages) + len(json.dumps(tools or []))
+        input_tokens = prompt_chars // CHARS_PER_TOKEN
+        output_tokens = len(json.dumps(graph)) // CHARS_PER_TOKEN
+        message.usage_metadata = {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                                  'total_tokens': input_tokens + output_tokens}
+        message.response_metadata = {'model_name': self._llm_type}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        seconds, failed = self.draw()
+        time.sleep(seconds)
+        return self._respond(messages, failed, **kwargs)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        seconds, failed = self.draw()
+        await asyncio.sleep(seconds)
+        return self._respond(messages, failed, **kwargs)
+
+def from_environment():
+    """A FakeChatModel configured by the KG_FAKE_* settings."""
+    return FakeChatModel(latency_ms=LATENCY_MS, latency_distribution=LATENCY_DISTRIBUTION,
+                         latency_sigma=LATENCY_SIGMA, error_rate=ERROR_RATE, error_status=ERROR_STATUS,
+                         seed=SEED)
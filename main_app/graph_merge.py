@@ -0,0 +1,163 @@
+import re
+import unicodedata
+
+_POSSESSIVE = re.compile(r"['’]s\b")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_LEADING_ARTICLE = re.compile(r"^(the|a|an) ")
+_RELATION_SEPARATORS = re.compile(r"[\s\-]+")
+
+def normalize_name(name):
+    """
+    Canonical form used to decide whether two entity ids name the same thing.
+
+    "The  Microsoft Corp." and "microsoft corp" both normalize to
+    "microsoft corp"; distinct names are never merged on similarity alone.
+    """
+    name = unicodedata.normalize('NFKC', str(name)).casefold().replace('&', ' and ')
+    name = _PUNCTUATION.sub(' ', _POSSESSIVE.sub('', name))
+    name = _WHITESPACE.sub(' ', name).strip()
+    return _LEADING_ARTICLE.sub('', name) or name
+
+def normalize_relation(relation):
+    return _RELATION_SEPARATORS.sub('_', str(relation).strip()).upper()
+
+class GraphMerger:
+    """
+    Incrementally merges per-chunk graphs into one deduplicated graph.
+
+    Nodes are resolved through a hash index of normalized names and aliases
+    (a node's "aliases" property, plus any caller-supplied alias map), so
+    each add is O(1) amortised and merging a whole document is linear in
+    the number of nodes and relationships. The first spelling seen for an
+    entity is used as its id; its type is the most frequent one reported.
+    Properties are merged with the first value for a key winning, and
+    repeated relationships are collapsed into one edge with a `count`.
+    Aliases only apply to names seen after the alias is learned; nodes
+    are never re-keyed after the fact.
+    """
+
+    def __init__(self, aliases=None):
+        self._index = {}      # normalized name or alias -> canonical key
+        self._nodes = {}      # canonical key -> node dict
+        self._types = {}      # canonical key -> {type: count}
+        self._edges = {}      # (source key, target key, relation) -> edge dict
+        self._normalized = {} # raw id -> normalized name; ids repeat heavily across chunks
+        self._relations = {}  # raw relation -> normalized relation
+        self.nodes_in = 0
+        self.relationships_in = 0
+        for alias, canonical in (aliases or {}).items():
+            self._index[normalize_name(alias)] = normalize_name(canonical)
+
+    def _normalize(self, name):
+        normalized = self._normalized.get(name)
+        if normalized is None:
+            normalized = self._normalized[name] = normalize_name(name)
+        return normalized
+
+    def add_node(self, node):
+        """Merge a node dict ({id, type, properties}); returns (key, is_new)."""
+        return self._add_node(node['id'], node.get('type'), node.get('properties'))
+
+    def _add_node(self, node_id, node_type, properties):
+        key = self._normalize(node_id)
+        key = self._index.get(key, key)
+        existing = self._nodes.get(key)
+        is_new = existing is None
+        if is_new:
+            existing = {'id': node_id, 'type': node_type, 'properties': {}}
+            self._nodes[key] = existing
+            self._types[key] = {}
+            self._index.setdefault(key, key)
+        if node_type:
+            types = self._types[key]
+            types[node_type] = types.get(node_type, 0) + 1
+        if properties:
+            for name, value in properties.items():
+                existing['properties'].setdefault(name, value)
+            aliases = properties.get('aliases') or properties.get('alias') or []
+            for alias in [aliases] if isinstance(aliases, str) else aliases:
+                self._index.setdefault(normalize_name(alias), key)
+        return key, is_new
+
+    def add(self, nodes, relationships):
+        """
+        Merge one chunk's nodes and relationships (dicts as produced by
+        kg_extraction).
+
+        Returns:
+            tuple: (new node keys, touched edge keys) so callers can emit
+            incremental updates.
+        """
+        new_nodes = []
+        touched_edges = []
+        for node in nodes:
+            self.nodes_in += 1
+            key, is_new = self.add_node(node)
+            if is_new:
+                new_nodes.append(key)
+        for rel in relationships:
+            self.relationships_in += 1
+            source_key, is_new = self._add_node(rel['source'], rel.get('source_type'), None)
+            if is_new:
+                new_nodes.append(source_key)
+            target_key, is_new = self._add_node(rel['target'], rel.get('target_type'), None)
+            if is_new:
+                new_nodes.append(target_key)
+            if source_key == target_key and self._normalize(rel['source']) != self._normalize(rel['target']):
+                # Two aliases of one entity linked to each other; not a real self-loop
+                continue
+            relation = self._relations.get(rel['relation'])
+            if relation is None:
+                relation = self._relations[rel['relation']] = normalize_relation(rel['relation'])
+            edge_key = (source_key, target_key, relation)
+            edge = self._edges.get(edge_key)
+            if edge is None:
+                edge = {'relation': rel['relation'], 'count': 0, 'properties': {}}
+                self._edges[edge_key] = edge
+            edge['count'] += 1
+            if rel.get('properties'):
+                for name, value in rel['properties'].items():
+                    edge['properties'].setdefault(name, value)
+            touched_edges.append(edge_key)
+        return new_nodes, touched_edges
+
+    def node(self, key):
+        node = self._nodes[key]
+        types = self._types[key]
+        node_type = max(types, key=types.get) if types else node['type']
+        return {'id': node['id'], 'type': node_type, 'properties': node['properties']}
+
+    def edge(self, edge_key):
+        source_key, target_key, _ = edge_key
+        edge = self._edges[edge_key]
+        result = {
+            'source': self._nodes[source_key]['id'],
+            'target': self._nodes[target_key]['id'],
+            'relation': edge['relation'],
+            'count': edge['count']
+        }
+        if edge['properties']:
+            result['properties'] = edge['properties']
+        return result
+
+    def nodes(self):
+        return [self.node(key) for key in self._nodes]
+
+    def edges(self):
+        return [self.edge(edge_key) for edge_key in self._edges]
+
+    def stats(self):
+        return {
+            'nodes_in': self.nodes_in,
+            'nodes_out': len(self._nodes),
+            'relationships_in': self.relationships_in,
+            'edges_out': len(self._edges)
+        }
+
+def merge_graphs(chunk_graphs, aliases=None):
+    """Merge a list of (nodes, relationships) tuples into (nodes, edges, stats)."""
+    merger = GraphMerger(aliases)
+    for nodes, relationships in chunk_graphs:
+        merger.add(nodes, relationships)
+    return merger.nodes(), merger.edges(), merger.stats()
@@ -1,5 +1,7 @@
 import json
+import instrumentation
 
+@instrumentation.instrument('HealthCheckFunction')
 def health_check(event, context):
     # Handle CORS preflight request
     if event.get('httpMethod') == 'OPTIONS':
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import random
+import chunk_cache
+import instrumentation
+
+# Fan-out settings for chunk extraction. The number of LLM calls in flight
+# at once is KG_MAX_CONCURRENCY * KG_BATCH_SIZE.
+MAX_CONCURRENCY = int(os.environ.get('KG_MAX_CONCURRENCY', '8'))
+BATCH_SIZE = int(os.environ.get('KG_BATCH_SIZE', '1'))
+MAX_RETRIES = int(os.environ.get('KG_MAX_RETRIES', '5'))
+RETRY_BASE_DELAY = float(os.environ.get('KG_RETRY_BASE_DELAY', '1.0'))
+RETRY_MAX_DELAY = float(os.environ.get('KG_RETRY_MAX_DELAY', '30.0'))
+
+def is_rate_limit_error(error):
+    """Return True if the error is an HTTP 429 from the LLM provider."""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code == 429 or type(error).__name__ == 'RateLimitError'
+
+def retry_delay(attempt, error=None):
+    """
+    Seconds to wait before retry number `attempt` (0-based).
+
+    Honours a Retry-After header when the provider sends one, otherwise
+    uses exponential backoff with full jitter so that concurrent workers
+    that were throttled together don't retry in lockstep.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    retry_after = headers.get('retry-after') if hasattr(headers, 'get') else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+async def convert_with_retries(transformer, documents, max_retries=None, config=None):
+    """
+    Call aconvert_to_graph_documents, retrying only on rate-limit errors.
+    `config` (a RunnableConfig, e.g. with usage callbacks) is passed on
+    when given.
+    """
+    if max_retries is None:
+        max_retries = MAX_RETRIES
+    attempt = 0
+    while True:
+        try:
+            with instrumentation.span('llm_call'):
+                if config is not None:
+                    return await transformer.aconvert_to_graph_documents(documents, config)
+                return await transformer.aconvert_to_graph_documents(documents)
+        except Exception as e:
+            if attempt >= max_retries or not is_rate_limit_error(e):
+                raise
+            delay = retry_delay(attempt, e)
+            print(f"Rate limited by LLM provider, retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+def graph_document_to_dict(graph_document):
+    """Plain-dict form of a GraphDocument, as stored in the chunk cache."""
+    return {
+        'nodes': [
+            {'id': n.id, 'type': n.type, 'properties': dict(n.properties or {})}
+            for n in graph_document.nodes
+        ],
+        'relationships': [
+            {
+                'source': r.source.id,
+                'source_type': r.source.type,
+                'target': r.target.id,
+                'target_type': r.target.type,
+                'relation': r.type,
+                'properties': dict(r.properties or {})
+            }
+            for r in graph_document.relationships
+        ]
+    }
+
+async def iter_chunk_graphs(transformer, chunks, max_concurrency=None, batch_size=None, max_retries=None,
+                            cache=None, model_name=None, stats=None, config=None, slots=None):
+    """
+    Extracts graphs from text chunks concurrently, yielding each chunk's
+    graph as soon as it is available.
+
+    Chunks are grouped into batches of `batch_size` documents per
+    aconvert_to_graph_documents call, and at most `max_concurrency`
+    batches run at once. If any batch fails for good, the remaining
+    batches are cancelled and the error is raised.
+
+    `chunks` may be a list or an async iterable, such as a chunker fed by a
+    PDF parser that is still running. A new batch is only pulled from the
+    source when a concurrency slot is free, so the producer gets
+    backpressure instead of an unbounded backlog.
+
+    When a ChunkCache is given, chunks whose (text, model, transformer
+    config) hash is already cached are not sent to the LLM, and fresh
+    results are written back (including those finished before a failure).
+    For a list, the cache is read in one round trip and hits are yielded
+    first; for an async source it is read per batch.
+
+    Args:
+        transformer: An LLMGraphTransformer (or anything with the same
+            aconvert_to_graph_documents coroutine).
+        chunks (list[str] or async iterable of str): The text chunks.
+        cache (ChunkCache, optional): Chunk-level result cache.
+        model_name (str, optional): Part of the cache key.
+        stats (dict, optional): Updated with chunk and cache hit/miss counts,
+            and 'chunks_total' once the number of chunks is known (at the
+            start for a list, when the source is exhausted otherwise).
+        config (RunnableConfig, optional): Passed to every LLM call.
+        slots (asyncio.Semaphore, optional): Shared with other extractions
+            on the same event loop, so they stay within one concurrency
+            limit between them; replaces `max_concurrency`.
+
+    Yields:
+        tuple: (chunk index, nodes, relationships) with dict lists, in
+        completion order.
+    """
+    transformer_config = chunk_cache.transformer_config(transformer) if cache is not None else None
+    if stats is not None:
+        for name in ('chunks', 'cache_hits', 'cache_misses'):
+            stats.setdefault(name, 0)
+
+    def record(is_hit):
+        if stats is not None:
+            stats['chunks'] += 1
+            stats['cache_hits' if is_hit else 'cache_misses'] += 1
+
+    lookup_per_batch = cache is not None
+    if isinstance(chunks, (list, tuple)):
+        if stats is not None:
+            stats['chunks_total'] = len(chunks)
+        pending = list(enumerate(chunks))
+        if cache is not None:
+            keys = [chunk_cache.chunk_cache_key(chunk, model_name, transformer_config) for chunk in chunks]
+            found = await asyncio.to_thread(cache.get_many, keys)
+            pending = [(i, chunk) for i, chunk in pending if keys[i] not in found]
+            lookup_per_batch = False
+            for i in range(len(chunks)):
+                if keys[i] in found:
+                    record(True)
+                    yield i, found[keys[i]]['nodes'], found[keys[i]]['relationships']
+        source = _iterate(pending)
+    else:
+        source = _enumerate(chunks, stats)
+
+    max_concurrency = max(1, max_concurrency or MAX_CONCURRENCY)
+    batch_size = max(1, batch_size or BATCH_SIZE)
+    if slots is None:
+        slots = asyncio.Semaphore(max_concurrency)
+    completed = asyncio.Queue()
+    tasks = set()
+    fresh = {}
+
+    async def run_batch(batch):
+        try:
+            results = []
+            keys = {}
+            if cache is not None:
+                keys = {i: chunk_cache.chunk_cache_key(chunk, model_name, transformer_config) for i, chunk in batch}
+            if lookup_per_batch:
+                hits = await asyncio.to_thread(cache.get_many, list(keys.values()))
+                results = [(i, hits[keys[i]], True) for i, _ in batch if keys[i] in hits]
+                batch = [(i, chunk) for i, chunk in batch if keys[i] not in hits]
+            if batch:
+                # Imported here so that importing app doesn't load langchain_core
+                from langchain_core.documents import Document
+                documents = [Document(page_content=chunk) for _, chunk in batch]
+                graph_documents = await convert_with_retries(transformer, documents, max_retries, config)
+                for (i, _), graph_document in zip(batch, graph_documents):
+                    graph = graph_document_to_dict(graph_document)
+                    if cache is not None:
+                        fresh[keys[i]] = graph
+                    results.append((i, graph, False))
+            completed.put_nowait(('batch', results))
+        except Exception as e:
+            completed.put_nowait(('error', e))
+        finally:
+            slots.release()
+
+    async def feed():
+        scheduled = 0
+        try:
+            batch = []
+            async for item in source:
+                batch.append(item)
+                if len(batch) == batch_size:
+                    await slots.acquire()
+                    tasks.add(asyncio.create_task(run_batch(batch)))
+                    scheduled += 1
+                    batch = []
+            if batch:
+                await slots.acquire()
+                tasks.add(asyncio.create_task(run_batch(batch)))
+                scheduled += 1
+            completed.put_nowait(('done', scheduled))
+        except Exception as e:
+            completed.put_nowait(('error', e))
+
+    feeder = asyncio.create_task(feed())
+    received = 0
+    expected = None
+    try:
+        while expected is None or received < expected:
+            kind, payload = await completed.get()
+            if kind == 'error':
+                raise payload
+            if kind == 'done':
+                expected = payload
+                continue
+            received += 1
+            for i, graph, is_hit in payload:
+                record(is_hit)
+                yield i, graph['nodes'], graph['relationships']
+    finally:
+        feeder.cancel()
+        for task in tasks:
+            task.cancel()
+        if cache is not None and fresh:
+            await asyncio.to_thread(cache.put_many, fresh)
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+async def _enumerate(chunks, stats=None):
+    index = 0
+    async for chunk in chunks:
+        yield index, chunk
+        index += 1
+    if stats is not None:
+        stats['chunks_total'] = index
+
+async def extract_chunks(transformer, chunks, **kwargs):
+    """
+    Extracts graphs from text chunks concurrently; accepts the same
+    options as iter_chunk_graphs.
+
+    Returns:
+        list: One (nodes, relationships) tuple of dict lists per chunk, in
+        chunk order.
+    """
+    results = [None] * len(chunks)
+    async for i, nodes, relationships in iter_chunk_graphs(transformer, chunks, **kwargs):
+        results[i] = (nodes, relationships)
+    return results
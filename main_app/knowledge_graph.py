@@ -0,0 +1,387 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import boto3
+import instrumentation
+import kg_extraction
+import chunk_cache
+import graph_merge
+import single_flight
+import token_chunking
+
+# Text -> knowledge graph extraction, shared by the KnowledgeGraphAPI handler
+# (app.py) and ProcessUploadedFunction, which calls it in-process rather than
+# invoking KnowledgeGraphAPI and paying for both functions while it waits.
+
+# Extracted text handed over by S3 reference, next to the uploaded file
+TEXT_OBJECT_NAME = 'extracted.txt'
+
+# Initialize the Secrets Manager client
+secretsmanager = boto3.client('secretsmanager')
+
+def get_secret():
+    """Get the OpenAI API key from Secrets Manager."""
+    secret_name = os.environ.get('SECRET_NAME')
+    try:
+        with instrumentation.span('secret_fetch'):
+            response = secretsmanager.get_secret_value(SecretId=secret_name)
+        secret = json.loads(response['SecretString'])
+        return secret.get('OPENAI_API_KEY')
+    except Exception as e:
+        # Handle secret-not-found exceptions
+        print(f"Error retrieving secret: {e}")
+        raise e
+
+# Initialize LLM with the API key from Secrets Manager
+# We'll use a lazy initialization pattern to avoid cold start issues
+llm = None
+llm_transformer = None
+MODEL_NAME = "gpt-4-turbo"
+
+# The key is re-read after this long, and at once if OpenAI rejects it,
+# so a rotated secret is picked up without a redeploy
+SECRET_TTL_SECONDS = float(os.environ.get('SECRET_TTL_SECONDS', '3600'))
+# "fake": fake_llm.FakeChatModel stands in for OpenAI (no key, no cost),
+# for load tests and benchmarks; see fake_llm for its KG_FAKE_* settings
+LLM_PROVIDER = os.environ.get('KG_LLM_PROVIDER', 'openai')
+# "true": start loading LangChain and fetching the key while the function
+# initializes (see prefetch), instead of on the first request
+PREFETCH = os.environ.get('KG_PREFETCH', 'false').lower() == 'true'
+
+_llm_lock = threading.Lock()
+_api_key = None
+_secret_fetched_at = None
+
+# "tokens": token_chunking packs whole sentences up to a share of the model
+# context; "chars": the original 2000/200 character splitter
+CHUNKING = os.environ.get('KG_CHUNKING', 'tokens')
+
+# Chunk results are cached by content hash; the in-process tier stays warm
+# across invocations of the same container
+extraction_cache = chunk_cache.cache_from_environment()
+
+# "true": concurrent build_graph calls for the same text in this container
+# share one extraction (see single_flight)
+COALESCE = os.environ.get('KG_COALESCE', 'true').lower() == 'true'
+# "true": across containers as well, through a lease item in
+# CHUNK_CACHE_TABLE. Off by default: every extraction, unique texts
+# included, then pays a conditional write and a release on the request path
+COALESCE_ACROSS_CONTAINERS = os.environ.get('KG_COALESCE_ACROSS_CONTAINERS', 'false').lower() == 'true'
+
+def flights_from_environment():
+    lease = None
+    if COALESCE_ACROSS_CONTAINERS and os.environ.get('CHUNK_CACHE_TABLE'):
+        lease = single_flight.DynamoDBLease(boto3.resource('dynamodb').Table(os.environ['CHUNK_CACHE_TABLE']))
+    return single_flight.SingleFlight(lease)
+
+extraction_flights = flights_from_environment() if COALESCE else None
+
+def load_llm_classes():
+    """
+    Import the LangChain LLM stack, the bulk of this module's import time.
+    It is only needed once text is sent for extraction, so rejected
+    requests and the non-inprocess ProcessUploadedFunction modes don't
+    load it.
+
+    Returns:
+        tuple: (ChatOpenAI, LLMGraphTransformer)
+    """
+    from langchain_experimental.graph_transformers import LLMGraphTransformer
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI, LLMGraphTransformer
+
+def get_llm(refresh=False):
+    """
+    The shared LLM and graph transformer, built on first use. The API key
+    is cached for SECRET_TTL_SECONDS; `refresh` re-reads it now. The
+    clients are only rebuilt when the key has changed.
+    """
+    global llm, llm_transformer, _api_key, _secret_fetched_at
+    with _llm_lock:
+        if LLM_PROVIDER == 'fake':
+            if llm is None:
+                import fake_llm
+                _, LLMGraphTransformer = load_llm_classes()
+                llm = fake_llm.from_environment()
+                llm_transformer = LLMGraphTransformer(llm=llm)
+                llm_transformer.cache_namespace = llm.cache_namespace
+            return llm, llm_transformer
+        expired = _secret_fetched_at is not None and time.monotonic() - _secret_fetched_at > SECRET_TTL_SECONDS
+        if llm is None or refresh or expired:
+            api_key = get_secret()
+            _secret_fetched_at = time.monotonic()
+            if llm is None or api_key != _api_key:
+                ChatOpenAI, LLMGraphTransformer = load_llm_classes()
+                llm = ChatOpenAI(temperature=0, model_name=MODEL_NAME, openai_api_key=api_key)
+                llm_transformer = LLMGraphTransformer(llm=llm)
+                _api_key = api_key
+    return llm, llm_transformer
+
+def prefetch():
+    """
+    Build the LLM in a background thread. Called during the function's
+    init phase, the secret round trip overlaps the remaining imports and
+    the first request finds the client ready (or waits on the lock in
+    get_llm for it). Failures are left for the request to retry.
+    """
+    def run():
+        try:
+            get_llm()
+        except Exception as e:
+            print(f"Warning: LLM prefetch failed: {e}")
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def is_auth_error(error):
+    """Return True if the LLM provider rejected the API key (HTTP 401)."""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code == 401 or type(error).__name__ == 'AuthenticationError'
+
+async def extract_kg_from_text_chunk(chunk):
+    from langchain_core.documents import Document
+    _, transformer = get_llm()
+    document = Document(page_content=chunk)
+    graph_document = await transformer.aconvert_to_graph_documents([document])
+    return graph_document[0].nodes, graph_document[0].relationships
+
+def split_text(text, chunk_tokens=None, overlap_tokens=None):
+    """Chunks of `text` per KG_CHUNKING; the token options only apply to "tokens"."""
+    with instrumentation.span('chunking'):
+        if CHUNKING == 'chars':
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
+            return splitter.split_text(text)
+        return token_chunking.split_text(text, MODEL_NAME, chunk_tokens, overlap_tokens)
+
+def usage_handler(transformer):
+    """
+    A UsageMetadataCallbackHandler for the transformer's LLM calls, or None
+    for stand-ins, which may not take a RunnableConfig.
+    """
+    # Nothing can be an LLMGraphTransformer before its module is loaded
+    graph_transformers = sys.modules.get('langchain_experimental.graph_transformers')
+    if graph_transformers is None or not isinstance(transformer, graph_transformers.LLMGraphTransformer):
+        return None
+    from langchain_core.callbacks import UsageMetadataCallbackHandler
+    return UsageMetadataCallbackHandler()
+
+def usage_config(usage):
+    return {'callbacks': [usage]} if usage is not None else None
+
+def record_usage(stats, usage):
+    """Add the tokens seen by a usage_handler to stats."""
+    if stats is None:
+        return
+    models = usage.usage_metadata.values() if usage is not None else []
+    for name, key in (('prompt_tokens', 'input_tokens'), ('completion_tokens', 'output_tokens')):
+        stats[name] = stats.get(name, 0) + sum(model.get(key, 0) for model in models)
+
+async def extract_kg_from_text(text, max_concurrency=None, batch_size=None, stats=None,
+                               chunk_tokens=None, overlap_tokens=None, slots=None):
+    """
+    Extracts a knowledge graph from the provided text using GPT.
+
+    Chunks are sent to the LLM concurrently (see kg_extraction for the
+    KG_MAX_CONCURRENCY / KG_BATCH_SIZE settings); results are combined in
+    chunk order regardless of completion order. Chunks already in the
+    extraction cache are not sent to the LLM, so re-uploading an edited
+    document only pays for the chunks that changed. The per-chunk graphs
+    are then merged: entities are resolved by normalized name and alias,
+    and repeated relationships become one edge with a `count`. If the
+    provider rejects the API key, the secret is re-read and the chunks
+    are tried once more.
+    
+    Args:
+        text (str): The input text from which to extract the knowledge graph.
+        max_concurrency (int, optional): Overrides KG_MAX_CONCURRENCY.
+        batch_size (int, optional): Overrides KG_BATCH_SIZE.
+        stats (dict, optional): Filled with chunk, cache hit/miss, token
+            usage and merge counts.
+        chunk_tokens (int, optional): Tokens per chunk (see token_chunking).
+        overlap_tokens (int, optional): Tokens repeated between chunks.
+        slots (asyncio.Semaphore, optional): LLM concurrency shared with
+            other extractions (see kg_extraction.iter_chunk_graphs).
+        
+    Returns:
+        tuple: A tuple containing two lists - nodes and relationships.
+    """
+    chunks = split_text(text, chunk_tokens, overlap_tokens)
+
+    async def extract(transformer):
+        usage = usage_handler(transformer)
+        results = await kg_extraction.extract_chunks(
+            transformer, chunks, max_concurrency=max_concurrency, batch_size=batch_size,
+            cache=extraction_cache, model_name=MODEL_NAME, stats=stats, config=usage_config(usage), slots=slots
+        )
+        record_usage(stats, usage)
+        return results
+
+    _, transformer = get_llm()
+    try:
+        results = await extract(transformer)
+    except Exception as e:
+        if not is_auth_error(e):
+            raise
+        # The secret may have been rotated since it was cached
+        print("LLM provider rejected the API key, re-reading the secret")
+        _, transformer = get_llm(refresh=True)
+        if stats is not None:
+            for name in ('chunks', 'cache_hits', 'cache_misses'):
+                stats.pop(name, None)
+        results = await extract(transformer)
+
+    # Deduplicate nodes and relationships
+    with instrumentation.span('dedup'):
+        all_nodes, all_relationships, merge_stats = graph_merge.merge_graphs(results)
+    if stats is not None:
+        stats['merge'] = merge_stats
+
+    return all_nodes, all_relationships
+
+async def stream_kg_from_text(text, max_concurrency=None, batch_size=None, stats=None,
+                              chunk_tokens=None, overlap_tokens=None):
+    """
+    Like extract_kg_from_text, but yields partial results as each chunk
+    completes instead of waiting for the whole document.
+
+    Each event carries only what changed: nodes seen for the first time
+    and the edges the chunk added or re-counted (already deduplicated
+    against earlier chunks). Clients upsert nodes by `id` and edges by
+    (`source`, `target`, `relation`).
+
+    Yields:
+        dict: {"type": "chunk", "chunk", "completed", "total", "nodes", "edges"}
+    """
+    chunks = split_text(text, chunk_tokens, overlap_tokens)
+    _, transformer = get_llm()
+    merger = graph_merge.GraphMerger()
+    usage = usage_handler(transformer)
+    completed = 0
+    events = kg_extraction.iter_chunk_graphs(
+        transformer, chunks, max_concurrency=max_concurrency, batch_size=batch_size,
+        cache=extraction_cache, model_name=MODEL_NAME, stats=stats, config=usage_config(usage)
+    )
+    try:
+        async for index, nodes, relationships in events:
+            completed += 1
+            with instrumentation.span('dedup'):
+                new_nodes, touched_edges = merger.add(nodes, relationships)
+            yield {
+                "type": "chunk",
+                "chunk": index,
+                "completed": completed,
+                "total": len(chunks),
+                "nodes": [merger.node(key) for key in new_nodes],
+                "edges": [merger.edge(key) for key in dict.fromkeys(touched_edges)]
+            }
+    except Exception as e:
+        # Events already went out, so a rotated key is only re-read for the next request
+        if is_auth_error(e):
+            get_llm(refresh=True)
+        raise
+    record_usage(stats, usage)
+    if stats is not None:
+        stats['merge'] = merger.stats()
+
+def response_metadata(stats):
+    metadata = {
+        "chunks": stats.get("chunks", 0),
+        "cache": {
+            "hits": stats.get("cache_hits", 0),
+            "misses": stats.get("cache_misses", 0)
+        },
+        # Cached chunks cost no tokens
+        "usage": {
+            "prompt_tokens": stats.get("prompt_tokens", 0),
+            "completion_tokens": stats.get("completion_tokens", 0)
+        },
+        "merge": stats.get("merge", {})
+    }
+    # Served by another request's extraction of the same text
+    if stats.get("coalesced"):
+        metadata["coalesced"] = True
+    return metadata
+
+def text_object_key(file_id):
+    return f"uploads/{file_id}/{TEXT_OBJECT_NAME}"
+
+def coalesce_key(text, transformer, chunk_tokens=None, overlap_tokens=None):
+    """Hash of everything that decides the graph extracted from `text`."""
+    settings = {'transformer': chunk_cache.transformer_config(transformer), 'chunking': CHUNKING,
+                'chunk_tokens': chunk_tokens, 'overlap_tokens': overlap_tokens}
+    return chunk_cache.chunk_cache_key(text, MODEL_NAME, settings)
+
+async def build_graph(text, stats=None, chunk_tokens=None, overlap_tokens=None, slots=None, deadline=None):
+    """
+    Extract and merge the graph for `text`.
+
+    With KG_COALESCE, a call for text that is already being extracted
+    waits for that extraction instead of starting another. Its metadata
+    then reports every chunk as a cache hit and no token usage, with
+    "coalesced": true. Waiting on another container stops halfway to
+    `deadline` (a time.monotonic() value), and this call extracts itself.
+
+    Returns:
+        dict: {"nodes", "edges", "metadata"}, the KnowledgeGraphAPI response body.
+    """
+    if stats is None:
+        stats = {}
+
+    async def extract():
+        nodes, edges = await extract_kg_from_text(text, stats=stats, chunk_tokens=chunk_tokens,
+                                                  overlap_tokens=overlap_tokens, slots=slots)
+        return {"nodes": nodes, "edges": edges, "metadata": response_metadata(stats)}
+
+    if extraction_flights is None:
+        return await extract()
+    _, transformer = get_llm()
+    key = coalesce_key(text, transformer, chunk_tokens, overlap_tokens)
+    graph, role = await extraction_flights.run(key, extract, deadline=deadline)
+    if role == single_flight.FOLLOWER:
+        # The leader's stats describe its own LLM calls, not this request's
+        chunks = graph["metadata"]["chunks"]
+        stats.update(chunks=chunks, cache_hits=chunks, cache_misses=0, merge=graph["metadata"]["merge"])
+    if role != single_flight.LEADER:
+        stats["coalesced"] = True
+        graph = {**graph, "metadata": response_metadata(stats)}
+    return graph
+
+async def build_graphs(texts, chunk_tokens=None, overlap_tokens=None, max_concurrency=None, deadline=None):
+    """
+    Build the graphs for many texts on one event loop, as a batch request.
+
+    All texts share the LLM client, the extraction cache and one limit of
+    `max_concurrency` (default KG_MAX_CONCURRENCY) LLM calls in flight
+    between them. A text that appears more than once is extracted once.
+
+    Args:
+        deadline (float, optional): time.monotonic() by which every text
+            must be done; the ones still running then are cancelled.
+
+    Returns:
+        list: For each text, in order, its build_graph result or the
+        exception it raised (TimeoutError past the deadline).
+    """
+    slots = asyncio.Semaphore(max(1, max_concurrency or kg_extraction.MAX_CONCURRENCY))
+
+    async def build(text):
+        graph = build_graph(text, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, slots=slots,
+                            deadline=deadline)
+        if deadline is None:
+            return await graph
+        timeout = max(0, deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(graph, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Extraction did not finish within {timeout:.0f}s") from None
+
+    unique = list(dict.fromkeys(texts))
+    results = await asyncio.gather(*(build(text) for text in unique), return_exceptions=True)
+    by_text = dict(zip(unique, results))
+    return [by_text[text] for text in texts]
@@ -0,0 +1,202 @@
+import contextlib
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+from io import BytesIO
+import PyPDF2
+
+try:
+    import pypdfium2
+except ImportError:  # optional; much faster than PyPDF2
+    pypdfium2 = None
+try:
+    from pdfminer.high_level import extract_pages as pdfminer_pages
+    from pdfminer.layout import LTTextContainer
+except ImportError:  # optional; slower than PyPDF2, but follows layout more closely
+    pdfminer_pages = None
+
+# Number of processes used to extract pages. Lambda gets more vCPUs with
+# more memory, so raise this together with MemorySize. Only the pypdf2
+# backend uses them.
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '1'))
+# Memory-map files instead of letting PyPDF2 read them into a bytes copy
+PDF_USE_MMAP = os.environ.get('PDF_USE_MMAP', '1') == '1'
+# "pypdfium2", "pdfminer" or "pypdf2"; "auto" takes pypdfium2 if it is
+# installed, else pypdf2 (see benchmarks/bench_pdf_backends.py)
+PDF_BACKEND = os.environ.get('PDF_BACKEND', 'auto')
+BACKENDS = ('pypdfium2', 'pypdf2', 'pdfminer')
+# PDFium is not thread-safe, even across documents, and ProcessUploadedFunction
+# extracts several records at once: every pdfium call holds this lock
+PDFIUM_LOCK = threading.Lock()
+
+def available_backends():
+    installed = {'pypdfium2': pypdfium2 is not None, 'pypdf2': True, 'pdfminer': pdfminer_pages is not None}
+    return [name for name in BACKENDS if installed[name]]
+
+def resolve_backend(backend=None):
+    """The backend to use for `backend` (or PDF_BACKEND); raises ValueError if it isn't installed."""
+    backend = (backend or PDF_BACKEND).lower()
+    available = available_backends()
+    if backend == 'auto':
+        return available[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF_BACKEND: {backend}")
+    if backend not in available:
+        raise ValueError(f"PDF_BACKEND {backend} is not installed")
+    return backend
+
+@contextlib.contextmanager
+def open_pdf_stream(source, use_mmap=None):
+    """
+    Yield a seekable binary stream for a PDF given as a path, bytes or an
+    already-open file object.
+    """
+    if use_mmap is None:
+        use_mmap = PDF_USE_MMAP
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            if use_mmap and os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield mapped
+            else:
+                yield f
+    else:
+        yield source
+
+def _pypdfium2_pages(source, use_mmap):
+    # pdfium reads paths itself, without a Python file object in between
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    # The lock is released between pages, so other threads' documents
+    # make progress and pages are still yielded as they are read
+    with PDFIUM_LOCK:
+        document = pypdfium2.PdfDocument(bytes(source) if isinstance(source, (bytearray, memoryview)) else source)
+        page_count = len(document)
+    try:
+        for i in range(page_count):
+            with PDFIUM_LOCK:
+                page = document[i]
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range().replace('\r\n', '\n')
+                finally:
+                    textpage.close()
+                    page.close()
+            yield text
+    finally:
+        with PDFIUM_LOCK:
+            document.close()
+
+def _pdfminer_pages(source, use_mmap):
+    # pdfminer wants a real file object, not an mmap
+    with open_pdf_stream(source, use_mmap=False) as stream:
+        for layout in pdfminer_pages(stream):
+            yield ''.join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+
+def _timed(pages, timings):
+    pages = iter(pages)
+    i = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            text = next(pages)
+        except StopIteration:
+            return
+        if timings is not None:
+            timings.append({'page': i, 'seconds': time.perf_counter() - start, 'chars': len(text)})
+        yield text
+        i += 1
+
+def iter_pdf_pages(source, workers=None, use_mmap=None, timings=None, backend=None):
+    """
+    Yields the text of each page of a PDF, in page order, as it is
+    extracted, so callers can start chunking before the last page is
+    parsed.
+
+    With the pypdf2 backend, workers > 1 and a path or bytes source, pages
+    are spread across worker processes. Processes talk over pipes rather
+    than multiprocessing queues because Lambda has no /dev/shm.
+
+    Args:
+        source: Path, bytes or seekable binary file object.
+        workers (int, optional): Overrides PDF_WORKERS.
+        use_mmap (bool, optional): Overrides PDF_USE_MMAP for path sources.
+        timings (list, optional): Appended with {"page", "seconds", "chars"}
+            for every page.
+        backend (str, optional): Overrides PDF_BACKEND.
+    """
+    backend = resolve_backend(backend)
+    if backend == 'pypdfium2':
+        yield from _timed(_pypdfium2_pages(source, use_mmap), timings)
+        return
+    if backend == 'pdfminer':
+        yield from _timed(_pdfminer_pages(source, use_mmap), timings)
+        return
+    if workers is None:
+        workers = PDF_WORKERS
+    with open_pdf_stream(source, use_mmap) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        page_count = len(reader.pages)
+        if workers <= 1 or page_count <= 1 or not isinstance(source, (str, os.PathLike, bytes, bytearray)):
+            for i, page in enumerate(reader.pages):
+                start = time.perf_counter()
+                text = page.extract_text() or ''
+                if timings is not None:
+                    timings.append({'page': i, 'seconds': time.perf_counter() - start, 'chars': len(text)})
+                yield text
+            return
+
+    yield from _iter_pages_in_processes(source, min(workers, page_count), page_count, use_mmap, timings)
+
+def _page_worker(source, use_mmap, worker_index, workers, connection):
+    try:
+        with open_pdf_stream(source, use_mmap) as stream:
+            reader = PyPDF2.PdfReader(stream)
+            for i in range(worker_index, len(reader.pages), workers):
+                start = time.perf_counter()
+                text = reader.pages[i].extract_text() or ''
+                connection.send((i, text, time.perf_counter() - start))
+    except Exception as e:
+        connection.send((None, f"{type(e).__name__}: {e}", 0))
+    finally:
+        connection.close()
+
+def _iter_pages_in_processes(source, workers, page_count, use_mmap, timings):
+    # Page i goes to worker i % workers, so reading results in page order
+    # keeps every worker busy while the pipes apply backpressure.
+    context = multiprocessing.get_context('fork')
+    connections = []
+    processes = []
+    try:
+        for worker_index in range(workers):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_page_worker, args=(source, use_mmap, worker_index, workers, sender), daemon=True
+            )
+            process.start()
+            sender.close()
+            connections.append(receiver)
+            processes.append(process)
+
+        for i in range(page_count):
+            index, text, seconds = connections[i % workers].recv()
+            if index is None:
+                raise Exception(f"Failed to extract page {i}: {text}")
+            if timings is not None:
+                timings.append({'page': index, 'seconds': seconds, 'chars': len(text)})
+            yield text
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for connection in connections:
+            connection.close()
+
+def extract_pdf_text(source, separator='', **kwargs):
+    """Join all page texts; see iter_pdf_pages for the options."""
+    return separator.join(iter_pdf_pages(source, **kwargs))
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+import graph_merge
+import instrumentation
+import kg_extraction
+import pdf_text
+import s3_stream
+import token_chunking
+
+# Pages parsed ahead of the chunker before the parser thread blocks
+PAGE_QUEUE_SIZE = int(os.environ.get('PIPELINE_PAGE_QUEUE_SIZE', '8'))
+S3_RANGE_WORKERS = int(os.environ.get('PIPELINE_S3_RANGE_WORKERS', '4'))
+# Text is split once this many chunks' worth has arrived
+CHUNKS_PER_SPLIT = 4
+
+_DONE = object()
+
+async def iter_pages(stream, stats=None):
+    """
+    Run the (CPU-bound) page parser on a thread and hand pages to the event
+    loop through a bounded queue.
+    """
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+    cancelled = threading.Event()
+
+    def put(item):
+        if not cancelled.is_set():
+            asyncio.run_coroutine_threadsafe(pages.put(item), loop).result()
+
+    def parse():
+        timings = stats.setdefault('page_timings', []) if stats is not None else None
+        try:
+            pages_parsed = pdf_text.iter_pdf_pages(stream, timings=timings)
+            try:
+                while True:
+                    # One span per page, leaving out time blocked on a full queue
+                    with instrumentation.span('pdf_parse'):
+                        text = next(pages_parsed, _DONE)
+                    if text is _DONE or cancelled.is_set():
+                        break
+                    put(text)
+            finally:
+                pages_parsed.close()
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    # With a copy of the context, so the spans land in this invocation's metrics
+    parser = loop.run_in_executor(None, contextvars.copy_context().run, parse)
+    try:
+        while True:
+            item = await pages.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        # Unblock a parser waiting on a full queue
+        while not pages.empty():
+            pages.get_nowait()
+        await parser
+
+async def iter_chunks(pages, split, buffer_chars):
+    """
+    Split a stream of page texts into overlapping chunks without waiting
+    for the whole document.
+
+    Text is buffered until it holds `buffer_chars` (a few chunks' worth);
+    every chunk `split` makes of it but the last is emitted, and splitting
+    resumes from the last one, which starts with its overlap with the
+    chunk before, so neighbours still overlap.
+
+    Args:
+        pages: Async iterable of page texts.
+        split: Text -> list of chunks, e.g. knowledge_graph.split_text.
+        buffer_chars (int): Characters to buffer before splitting.
+    """
+    buffer = ""
+    async for page in pages:
+        # Pages on separate lines, as the staged mode extracts them
+        buffer = f"{buffer}\n{page}" if buffer else page
+        if len(buffer) < buffer_chars:
+            continue
+        chunks = split(buffer)
+        for chunk in chunks[:-1]:
+            yield chunk
+        buffer = chunks[-1] if chunks else ""
+    if buffer.strip():
+        for chunk in split(buffer):
+            yield chunk
+
+async def extract_graph_pipelined(s3, bucket, key, transformer, cache=None, model_name=None,
+                                  max_concurrency=None, stats=None, split=None, config=None, stream=None):
+    """
+    Build a knowledge graph from a PDF in S3 with the download, page
+    extraction and LLM extraction stages overlapping:
+
+        S3 ranged GETs -> page parser thread -> chunker -> concurrent LLM calls
+
+    Each hand-off is bounded (range workers, page queue, LLM concurrency
+    slots), so memory stays flat and end-to-end latency approaches the
+    slowest stage rather than the sum of all three.
+
+    Args:
+        split (optional): Text -> list of chunks; defaults to token_chunking
+            for `model_name`.
+        config (dict, optional): RunnableConfig for the LLM calls, e.g. a
+            usage callback (see knowledge_graph.usage_config).
+        stream (optional): The object already opened with
+            s3_stream.open_s3_object; it is closed here either way.
+
+    Returns:
+        dict: {"nodes": [...], "edges": [...]}
+    """
+    if stats is None:
+        stats = {}
+    if split is None:
+        split = functools.partial(token_chunking.split_text, model_name=model_name)
+    buffer_chars = CHUNKS_PER_SPLIT * token_chunking.chunk_budget(model_name) * token_chunking.CHARS_PER_TOKEN
+    started = time.perf_counter()
+    if stream is None:
+        stream = await asyncio.to_thread(
+            s3_stream.open_s3_object, s3, bucket, key, max_workers=S3_RANGE_WORKERS
+        )
+    merger = graph_merge.GraphMerger()
+    try:
+        if stream.raw.size == 0:
+            # Rather than PDFium's "Data format error"
+            raise ValueError(f"{key.rsplit('/', 1)[-1]} is empty")
+        chunks = iter_chunks(iter_pages(stream, stats), split, buffer_chars)
+        async for _, nodes, relationships in kg_extraction.iter_chunk_graphs(
+            transformer, chunks, max_concurrency=max_concurrency,
+            cache=cache, model_name=model_name, stats=stats, config=config
+        ):
+            stats.setdefault('first_chunk_seconds', time.perf_counter() - started)
+            merger.add(nodes, relationships)
+    finally:
+        stream.close()
+    stats['merge'] = merger.stats()
+    stats['seconds'] = time.perf_counter() - started
+    return {"nodes": merger.nodes(), "edges": merger.edges()}
@@ -1,51 +1,177 @@
 import os
 import boto3
 import json
+import instrumentation
+import math
 import uuid
 from datetime import datetime, timedelta
 
 s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ['BUCKET_NAME']
 
-def handler(event, context):
+# Files of at least this size (the ?file_size= query parameter) get a
+# multipart upload session instead of a single presigned PUT: the client
+# uploads the parts to S3 in parallel, then calls /complete_multipart_upload
+# (or /abort_multipart_upload). Nothing but the S3 URLs passes through
+# API Gateway, so its 10 MB limit doesn't apply.
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD_BYTES', str(16 * 1024 * 1024)))
+# S3 needs parts of at least 5 MB (except the last); bigger parts mean
+# fewer URLs to sign and requests to make
+MIN_PART_SIZE = int(os.environ.get('MULTIPART_MIN_PART_BYTES', str(8 * 1024 * 1024)))
+# Part URLs returned per session, which bounds the response size; parts
+# grow past MIN_PART_SIZE to fit the file in this many
+MAX_PARTS = int(os.environ.get('MULTIPART_MAX_PARTS', '1000'))
+# Parts a client should upload at once; enough to fill most uplinks
+UPLOAD_CONCURRENCY = int(os.environ.get('MULTIPART_CONCURRENCY', '4'))
+URL_EXPIRES_SECONDS = int(os.environ.get('PRESIGNED_URL_EXPIRES_SECONDS', '3600'))
+# S3's limits
+MAX_PART_SIZE = 5 * 1024 ** 3
+MAX_OBJECT_SIZE = 5 * 1024 ** 4
+
+def response(status_code, body, methods="GET, OPTIONS"):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
+            "Access-Control-Allow-Methods": methods
+        },
+        "body": json.dumps(body)
+    }
+
+def upload_key(file_id, file_name):
+    return f"uploads/{file_id}/{file_name}"
+
+def part_plan(file_size):
+    """
+    Part size and count for a multipart upload of `file_size` bytes: the
+    smallest whole number of MB at or above MIN_PART_SIZE that needs no
+    more than MAX_PARTS parts.
+
+    Returns:
+        tuple: (part_size, part_count)
+    """
+    mb = 1024 * 1024
+    part_size = max(MIN_PART_SIZE, math.ceil(file_size / MAX_PARTS / mb) * mb)
+    if part_size > MAX_PART_SIZE or file_size > MAX_OBJECT_SIZE:
+        raise ValueError(f"file_size {file_size} is larger than S3 allows")
+    return part_size, max(1, math.ceil(file_size / part_size))
+
+def create_multipart_upload(file_id, file_name, content_type, file_size):
+    """Start a multipart upload and presign a PUT URL for each of its parts."""
+    key = upload_key(file_id, file_name)
+    part_size, part_count = part_plan(file_size)
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=BUCKET_NAME, Key=key, ContentType=content_type)['UploadId']
+    parts = [
+        {
+            "part_number": number,
+            "url": s3_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': BUCKET_NAME, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=URL_EXPIRES_SECONDS
+            )
+        }
+        for number in range(1, part_count + 1)
+    ]
+    return {
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "part_count": part_count,
+        "concurrency": min(UPLOAD_CONCURRENCY, part_count),
+        "expires_at": (datetime.utcnow() + timedelta(seconds=URL_EXPIRES_SECONDS)).isoformat() + "Z",
+        "parts": parts
+    }
+
+def multipart_request(event):
+    """The key and upload id named by a complete/abort request body."""
+    body = json.loads(event.get('body') or '{}')
+    file_id, file_name, upload_id = body.get('file_id'), body.get('file_name'), body.get('upload_id')
+    if not file_id or not file_name or not upload_id:
+        raise ValueError("file_id, file_name and upload_id are required")
+    return body, upload_key(file_id, file_name), upload_id
+
+def complete_upload(event):
+    """
+    Finish a multipart upload from the {part_number, etag} list the client
+    collected from S3's part responses. The resulting ObjectCreated event
+    starts processing, as a single PUT would.
+    """
+    try:
+        body, key, upload_id = multipart_request(event)
+        parts = sorted(body.get('parts') or [], key=lambda part: part.get('part_number', 0))
+        if not parts or not all(part.get('part_number') and part.get('etag') for part in parts):
+            raise ValueError("parts must list the part_number and etag of every uploaded part")
+    except ValueError as e:
+        return response(400, {"error": str(e)}, "POST, OPTIONS")
+    s3_client.complete_multipart_upload(
+        Bucket=BUCKET_NAME, Key=key, UploadId=upload_id,
+        MultipartUpload={'Parts': [{'PartNumber': int(part['part_number']), 'ETag': part['etag']}
+                                   for part in parts]}
+    )
+    return response(200, {"file_id": body['file_id'], "file_name": body['file_name'], "status": "uploaded"},
+                    "POST, OPTIONS")
+
+def abort_upload(event):
+    """Discard a multipart upload and the parts stored so far."""
+    try:
+        body, key, upload_id = multipart_request(event)
+    except ValueError as e:
+        return response(400, {"error": str(e)}, "POST, OPTIONS")
+    s3_client.abort_multipart_upload(Bucket=BUCKET_NAME, Key=key, UploadId=upload_id)
+    return response(200, {"file_id": body['file_id'], "status": "aborted"}, "POST, OPTIONS")
+
+def presign_upload(event):
     query_params = event.get('queryStringParameters') or {}
     file_name = query_params.get('file_name', f'file-{uuid.uuid4()}.txt')
     content_type = query_params.get('content_type', 'application/octet-stream')
     file_id = str(uuid.uuid4())
 
+    file_size = query_params.get('file_size')
+    try:
+        file_size = int(file_size) if file_size is not None else None
+        if file_size is not None and file_size < 0:
+            raise ValueError
+    except ValueError:
+        return response(400, {"error": "file_size must be a non-negative integer"})
+
+    if file_size is not None and file_size >= MULTIPART_THRESHOLD:
+        try:
+            session = create_multipart_upload(file_id, file_name, content_type, file_size)
+        except ValueError as e:
+            return response(400, {"error": str(e)})
+        return response(200, {"file_name": file_name, "file_id": file_id, "multipart": True, **session})
+
     # Generate a presigned URL for uploading
+    presigned_url = s3_client.generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': BUCKET_NAME,
+            'Key': upload_key(file_id, file_name),
+            'ContentType': content_type
+        },
+        ExpiresIn=URL_EXPIRES_SECONDS
+    )
+    return response(200, {
+        "presigned_url": presigned_url,
+        "file_name": file_name,
+        "file_id": file_id,
+    })
+
+@instrumentation.instrument('PresignedURLFunction')
+def handler(event, context):
+    """
+    GET /get_presigned_url, POST /complete_multipart_upload and
+    POST /abort_multipart_upload, told apart by the API Gateway resource.
+    """
+    resource = event.get('resource') or event.get('path') or ''
     try:
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': BUCKET_NAME, 
-                'Key': f"uploads/{file_id}/{file_name}",
-                'ContentType': content_type
-            },
-            ExpiresIn=3600
-        )
-        
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
-                "Access-Control-Allow-Methods": "GET, OPTIONS"
-            },
-            "body": json.dumps({
-                "presigned_url": presigned_url,
-                "file_name": file_name,
-                "file_id": file_id,
-            })
-        }
+        if resource.endswith('/complete_multipart_upload'):
+            return complete_upload(event)
+        if resource.endswith('/abort_multipart_upload'):
+            return abort_upload(event)
+        return presign_upload(event)
     except Exception as e:
         print(f"Error: {e}")
-        return {
-            "statusCode": 500,
-                "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type, X-Api-Key",
-                "Access-Control-Allow-Methods": "GET, OPTIONS"
-            },
-            "body": {"error": str(e)}
-        }
\ No newline at end of file
+        return response(500, {"error": str(e)},
+                        "POST, OPTIONS" if resource.endswith('_multipart_upload') else "GET, OPTIONS")
@@ -1,38 +1,120 @@
 import json
 import boto3
 import os
-import PyPDF2
+import extractors
+import graph_store
+import instrumentation
+import progress
+import s3_stream
 import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import unquote_plus
 
 s3 = boto3.client('s3')
 lambda_client = boto3.client('lambda')
 dynamodb = boto3.resource('dynamodb')
 BUCKET_NAME = os.environ['BUCKET_NAME']
+# "staged": download, extract all text, then invoke KnowledgeGraphAPI.
+# "pipelined": stream PDFs from S3 and run LLM extraction in-process
+# while later pages are still being parsed (other files are staged).
+PROCESS_MODE = os.environ.get('PROCESS_MODE', 'staged')
+# How the staged mode turns extracted text into a graph:
+# "inprocess": call the knowledge_graph library in this function.
+# "s3ref": write the text to uploads/{file_id}/extracted.txt and invoke
+# KnowledgeGraphAPI with a reference to it.
+# "inline": invoke KnowledgeGraphAPI with the text in the payload (switches
+# to "s3ref" when the payload would exceed the invoke limit).
+KG_INVOKE_MODE = os.environ.get('KG_INVOKE_MODE', 'inprocess')
+# Records processed at once. Each record runs its own LLM fan-out, so up to
+# PROCESS_MAX_WORKERS * KG_MAX_CONCURRENCY calls can be in flight.
+PROCESS_MAX_WORKERS = int(os.environ.get('PROCESS_MAX_WORKERS', '4'))
+# The staged mode reads uploads into memory, spilling to /tmp only above
+# PROCESS_SPOOL_MAX_BYTES. Objects bigger than PROCESS_S3_PART_BYTES are
+# fetched as that many bytes per ranged GET, PROCESS_S3_RANGE_WORKERS at once.
+# Unset, the limit is derived from the function's memory (see spool_max_bytes).
+SPOOL_MAX_BYTES = int(os.environ.get('PROCESS_SPOOL_MAX_BYTES') or 0) or None
+# Memory kept back from upload buffers for the runtime, LangChain and PyPDF2
+# (about 125 MB resident) and the text and graphs being built
+RESERVED_MEMORY_MB = 256
+S3_PART_BYTES = int(os.environ.get('PROCESS_S3_PART_BYTES', str(8 * 1024 * 1024)))
+S3_RANGE_WORKERS = int(os.environ.get('PROCESS_S3_RANGE_WORKERS', '4'))
+# Synchronous invoke payloads are capped at 6 MB
+MAX_INVOKE_PAYLOAD = 6 * 1024 * 1024
+# Text upload_file extracted next to the upload (knowledge_graph.TEXT_OBJECT_NAME,
+# which isn't imported here so the invoke modes don't load LangChain)
+EXTRACTED_TEXT_NAME = 'extracted.txt'
 
-def extract_text_from_pdf(file_path):
-    text = ""
-    with open(file_path, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text()
+def extract_text_from_file(source, file_name, content_type=None, stats=None):
+    """Extract the text of an upload in any format extractors handles."""
+    # Page timings land in stats as they are measured, for progress records
+    timings = stats.setdefault('page_timings', []) if stats is not None else []
+    with instrumentation.span('pdf_parse'):
+        text = extractors.extract_text(source, content_type, file_name, timings=timings)
+    if timings:
+        slowest = max(timings, key=lambda t: t['seconds'])
+        print(f"Extracted {len(timings)} pages in {sum(t['seconds'] for t in timings):.2f}s "
+              f"(slowest: page {slowest['page']} at {slowest['seconds']:.2f}s)")
     return text
 
-def generate_graph_json(text):
+def spool_max_bytes():
+    """
+    Bytes of an upload each record may hold in memory: PROCESS_SPOOL_MAX_BYTES,
+    or else half the memory left after RESERVED_MEMORY_MB, split across the
+    PROCESS_MAX_WORKERS records processed at once, up to 32 MB. At Lambda's
+    128 MB default that is nothing, and every upload goes to /tmp.
+    """
+    if SPOOL_MAX_BYTES is not None:
+        return SPOOL_MAX_BYTES
+    memory_mb = int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '128'))
+    available = max(0, memory_mb - RESERVED_MEMORY_MB) * 1024 * 1024 // 2
+    return min(32 * 1024 * 1024, available // max(1, PROCESS_MAX_WORKERS))
+
+def normalize_etag(etag):
+    return (etag or '').strip('"')
+
+def read_extracted_text(bucket, file_id, source_etag):
+    """
+    The text already extracted from this exact upload, or None.
+
+    upload_file writes it to uploads/{file_id}/extracted.txt with the
+    upload's ETag in its source_etag metadata. Text without that metadata,
+    or extracted from another version of the upload, is ignored. The
+    metadata is checked before the body is read, and the body is read
+    straight from the response, never through /tmp.
+    """
+    if not source_etag:
+        return None
+    key = f"uploads/{file_id}/{EXTRACTED_TEXT_NAME}"
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        print(f"Warning: Failed to read extracted text s3://{bucket}/{key}: {str(e)}")
+        return None
+    if normalize_etag(response.get('Metadata', {}).get('source_etag')) != normalize_etag(source_etag):
+        response['Body'].close()
+        print(f"Extracted text s3://{bucket}/{key} is stale or unlabelled, parsing the upload")
+        return None
+    return response['Body'].read().decode('utf-8')
+
+def generate_graph_json(text=None, text_s3_key=None):
+    """Invoke KnowledgeGraphAPI with the text inline or as an S3 reference."""
     try:
         # Get the actual function name from environment or construct it
         kg_function_name = os.environ.get('KG_FUNCTION_NAME', 'text-to-kg-KnowledgeGraphAPI-xyz')
         
         # Prepare the payload
-        payload = {
-            "body": json.dumps({"text": text})
-        }
+        body = {"text_s3_key": text_s3_key} if text_s3_key else {"text": text}
+        payload = json.dumps({"body": json.dumps(body)})
         
         # Invoke the knowledge graph function
         response = lambda_client.invoke(
             FunctionName=kg_function_name,
             InvocationType='RequestResponse',  # Synchronous
-            Payload=json.dumps(payload)
+            Payload=payload
         )
         
         # Parse the response
@@ -47,117 +129,312 @@ def generate_graph_json(text):
         print(f"Error calling knowledge graph function: {str(e)}")
         raise e
 
-def handler(event, context):
+def store_extracted_text(file_id, text):
+    """Write extracted text next to the upload; returns its key."""
+    import knowledge_graph
+    key = knowledge_graph.text_object_key(file_id)
+    # source_etag marks it as ours for process_record; it names no upload,
+    # so read_extracted_text never reuses it
+    s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=text.encode('utf-8'), ContentType='text/plain; charset=utf-8',
+                  Metadata={'source_etag': ''})
+    return key
+
+def build_graph_in_process(text, stats=None):
+    # Imported here so the invoke modes don't pay for loading LangChain
+    import knowledge_graph
+    return asyncio.run(knowledge_graph.build_graph(text, stats=stats))
+
+def text_to_graph(file_id, text, mode=None, stats=None):
+    """
+    Turn extracted text into the graph JSON using KG_INVOKE_MODE (or
+    `mode`). Only the in-process mode fills `stats` with chunk counts.
+    """
+    mode = mode or KG_INVOKE_MODE
+    if mode == 'inprocess':
+        return build_graph_in_process(text, stats)
+    if mode == 'inline':
+        # json.dumps escapes non-ASCII, so characters == payload bytes
+        payload_size = len(json.dumps({"body": json.dumps({"text": text})}))
+        if payload_size <= MAX_INVOKE_PAYLOAD:
+            return generate_graph_json(text)
+        print(f"Invoke payload would be {payload_size} bytes, passing the text by S3 reference")
+    elif mode != 's3ref':
+        raise ValueError(f"Unknown KG_INVOKE_MODE: {mode}")
+    return generate_graph_json(text_s3_key=store_extracted_text(file_id, text))
+
+def save_error(file_id, file_name, error, share_id=None):
+    """Store a processing error in DynamoDB for the polling endpoint."""
+    table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
+    table.put_item(
+        Item={
+            'share_id': share_id or str(uuid.uuid4()),
+            'file_id': file_id,
+            'file_name': file_name,
+            'status': 'error',
+            'error_message': str(error),
+            'created_at': datetime.now().isoformat(),
+            'expires_at': int((datetime.now() + timedelta(days=7)).timestamp()),  # Shorter expiration for errors
+            'view_count': 0
+        }
+    )
+
+def process_pdf_pipelined(bucket, key, stats=None, stream=None):
+    """
+    Generate the graph for a PDF in S3 with overlapping download, parse and
+    LLM stages. `stream` is the object already opened with
+    s3_stream.open_s3_object, if the caller opened it.
+    """
+    # Imported here so the invoke modes don't pay for loading LangChain
+    import knowledge_graph
+    import pipeline
+
+    _, transformer = knowledge_graph.get_llm()
+    if stats is None:
+        stats = {}
+    # The same chunking and token accounting as the staged mode's build_graph
+    usage = knowledge_graph.usage_handler(transformer)
+    graph_json = asyncio.run(pipeline.extract_graph_pipelined(
+        s3, bucket, key, transformer, cache=knowledge_graph.extraction_cache,
+        model_name=knowledge_graph.MODEL_NAME, stats=stats, split=knowledge_graph.split_text,
+        config=knowledge_graph.usage_config(usage), stream=stream
+    ))
+    knowledge_graph.record_usage(stats, usage)
+    graph_json["metadata"] = knowledge_graph.response_metadata(stats)
+    print(f"Pipelined extraction: {len(stats.get('page_timings', []))} pages, {stats.get('chunks', 0)} chunks, "
+          f"first chunk after {stats.get('first_chunk_seconds', 0):.2f}s, total {stats['seconds']:.2f}s, "
+          f"{stats['prompt_tokens']} prompt and {stats['completion_tokens']} completion tokens")
+    return graph_json
+
+def is_extracted_text(bucket, key):
+    """
+    Whether an uploads/{file_id}/extracted.txt object was written by
+    upload_file or store_extracted_text (they set source_etag metadata),
+    rather than uploaded by a user under that name.
+    """
     try:
-        for record in event['Records']:
-            bucket = record['s3']['bucket']['name']
-            key = record['s3']['object']['key']
-            
-            print(f"Processing S3 event - Bucket: {bucket}, Key: {key}")
-
-            # Skip non-PDF files
-            if not key.endswith('.pdf'):
-                print(f"Skipping non-PDF file: {key}")
-                continue
-
-            # Parse the key to extract file_id and file_name
-            # Expected format: uploads/{file_id}/{original_filename}
-            key_parts = key.split('/')
-            if len(key_parts) < 3:
-                print(f"Invalid key format: {key}. Expected: uploads/file_id/filename")
-                continue
-                
-            file_id = key_parts[1]
-            file_name = key_parts[-1]  # Get the original filename
-            
-            # Create a unique download path using file_id to avoid conflicts
-            download_path = f"/tmp/{file_id}_{file_name}"
-            
-            print(f"Extracted - File ID: {file_id}, File Name: {file_name}")
-            print(f"Download path: {download_path}")
+        response = s3.head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        # Gone already: leave it to the download to report
+        if isinstance(e, s3.exceptions.NoSuchKey) or getattr(e, 'response', {}).get('Error', {}).get('Code') == '404':
+            return False
+        raise
+    return 'source_etag' in response.get('Metadata', {})
+
+class RetryableError(Exception):
+    """A record failed in a way another attempt may fix (S3 or DynamoDB errors)."""
+
+def process_record(record):
+    """
+    Process one S3 notification record. Content errors are saved for the
+    polling endpoint and not raised; RetryableError is raised for failures
+    worth another delivery. The upload is read into a buffer of the
+    record's own (see s3_stream.spool_s3_object), not a /tmp path.
+
+    While the record is processed, its item carries status "processing"
+    and the progress written by progress.ProgressTracker; the graph or the
+    error then replaces it under the same share_id, along with the seconds
+    spent per stage.
+    """
+    bucket = record['s3']['bucket']['name']
+    # Keys in S3 notifications are URL-encoded
+    key = unquote_plus(record['s3']['object']['key'])
+    
+    print(f"Processing S3 event - Bucket: {bucket}, Key: {key}")
+
+    # Parse the key to extract file_id and file_name
+    # Expected format: uploads/{file_id}/{original_filename}
+    key_parts = key.split('/')
+    if len(key_parts) < 3 or key_parts[0] != 'uploads':
+        print(f"Invalid key format: {key}. Expected: uploads/file_id/filename")
+        return
+        
+    file_id = key_parts[1]
+    file_name = key_parts[-1]  # Get the original filename
 
+    # Skip the text extracted from an upload, which is stored next to it. A
+    # user's own upload named extracted.txt has no source_etag and is processed.
+    if len(key_parts) == 3 and file_name == EXTRACTED_TEXT_NAME:
+        try:
+            artifact = is_extracted_text(bucket, key)
+        except Exception as head_error:
+            print(f"ERROR: Failed to read metadata of {key}: {str(head_error)}")
+            raise RetryableError(f"Failed to read s3://{bucket}/{key}") from head_error
+        if artifact:
+            print(f"Skipping extracted text: {key}")
+            return
+    
+    print(f"Extracted - File ID: {file_id}, File Name: {file_name}")
+
+    table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
+    stats = {}
+    try:
+        share_id = progress.share_id_for(table, file_id)
+        tracker = progress.ProgressTracker(table, share_id, file_id, file_name, stats=stats)
+        started = tracker.start()
+    except Exception as db_error:
+        print(f"ERROR: Failed to write progress record: {str(db_error)}")
+        raise RetryableError(f"Failed to start processing file_id {file_id}") from db_error
+    if not started:
+        # A duplicate S3 or SQS delivery of an upload that was already processed
+        print(f"Skipping {key}: already processed")
+        return
+
+    document = None
+    try:
+        # The pipelined mode parses PDFs only; other files take the staged path
+        if PROCESS_MODE == 'pipelined' and file_name.lower().endswith('.pdf'):
+            # Loads LangChain, which this mode needs anyway
+            import pipeline
             try:
-                # Check if the object exists before downloading
-                s3.head_object(Bucket=bucket, Key=key)
-                print(f"Object confirmed to exist: s3://{bucket}/{key}")
-                
-                # Download the file
-                s3.download_file(bucket, key, download_path)
-                print(f"Successfully downloaded file to: {download_path}")
+                # The first ranged GET confirms the object exists
+                document = s3_stream.open_s3_object(s3, bucket, key, max_workers=pipeline.S3_RANGE_WORKERS)
+            except s3.exceptions.NoSuchKey:
+                print(f"ERROR: S3 object not found: s3://{bucket}/{key}")
+                tracker.discard()
+                return
+            except Exception as download_error:
+                print(f"ERROR: Failed to download file: {str(download_error)}")
+                raise RetryableError(f"Failed to download s3://{bucket}/{key}") from download_error
+            try:
+                # Download, parsing and extraction overlap, so they are one stage
+                tracker.stage('pipeline')
+                graph_json = process_pdf_pipelined(bucket, key, stats, stream=document)
+                print(f"Generated knowledge graph with {len(graph_json.get('nodes', []))} nodes and {len(graph_json.get('edges', []))} edges")
+            except Exception as processing_error:
+                # A ranged GET that failed mid-document, whatever the parser made of it
+                if document.raw.error is not None:
+                    print(f"ERROR: Failed to download file: {str(document.raw.error)}")
+                    raise RetryableError(f"Failed to download s3://{bucket}/{key}") from document.raw.error
+                print(f"ERROR: Failed to process file content: {str(processing_error)}")
+                tracker.finish()
+                save_error(file_id, file_name, processing_error, share_id)
+                return
+        else:
+            try:
+                tracker.stage('download')
+                # One GET confirms the object exists and fetches all of a small one
+                first = s3_stream.get_first_part(s3, bucket, key, S3_PART_BYTES)
+                print(f"Object confirmed to exist: s3://{bucket}/{key} ({s3_stream.object_size(first)} bytes)")
+
+                # Text upload_file already extracted from this version replaces the download and parse
+                extracted_text = read_extracted_text(bucket, file_id, first.get('ETag'))
+                if extracted_text is not None:
+                    first['Body'].close()
+                    print(f"Reusing extracted text for {file_id} ({len(extracted_text)} characters)")
+                else:
+                    document = s3_stream.spool_s3_object(
+                        s3, bucket, key, first, part_size=S3_PART_BYTES, max_workers=S3_RANGE_WORKERS,
+                        spool_max_bytes=spool_max_bytes()
+                    )
+                    print(f"Successfully downloaded s3://{bucket}/{key}")
                 
             except s3.exceptions.NoSuchKey:
                 print(f"ERROR: S3 object not found: s3://{bucket}/{key}")
-                continue
+                tracker.discard()
+                return
             except Exception as download_error:
                 print(f"ERROR: Failed to download file: {str(download_error)}")
-                continue
+                raise RetryableError(f"Failed to download s3://{bucket}/{key}") from download_error
 
             try:
-                # Extract text from PDF
-                extracted_text = extract_text_from_pdf(download_path)
+                if extracted_text is None:
+                    # Extract text from the PDF, DOCX, HTML, Markdown or text file
+                    tracker.stage('extract_text')
+                    extracted_text = extract_text_from_file(document, file_name, first.get('ContentType'), stats=stats)
                 print(f"Extracted text length: {len(extracted_text)} characters")
-                print(f"Text preview: {extracted_text[:200]}...")
+                instrumentation.debug("Text preview", f"{extracted_text[:200]}...")
 
                 # Generate knowledge graph
-                graph_json = generate_graph_json(extracted_text)
+                tracker.stage('build_graph')
+                graph_json = text_to_graph(file_id, extracted_text, stats=stats)
                 print(f"Generated knowledge graph with {len(graph_json.get('nodes', []))} nodes and {len(graph_json.get('edges', []))} edges")
                 
             except Exception as processing_error:
                 print(f"ERROR: Failed to process file content: {str(processing_error)}")
                 # Store error in DynamoDB for polling endpoint
-                table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
-                table.put_item(
-                    Item={
-                        'share_id': str(uuid.uuid4()),
-                        'file_id': file_id,
-                        'file_name': file_name,
-                        'status': 'error',
-                        'error_message': str(processing_error),
-                        'created_at': datetime.now().isoformat(),
-                        'expires_at': int((datetime.now() + timedelta(days=7)).timestamp()),  # Shorter expiration for errors
-                        'view_count': 0
-                    }
-                )
-                continue
+                tracker.finish()
+                save_error(file_id, file_name, processing_error, share_id)
+                return
 
-            try:
-                # Save successful result to DynamoDB
-                table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
-                table.put_item(
-                    Item={
-                        'share_id': str(uuid.uuid4()),  # Generate a unique share ID
-                        'file_id': file_id,
-                        'file_name': file_name,
-                        'graph_data': graph_json,
-                        'status': 'completed',
-                        'created_at': datetime.now().isoformat(),
-                        'expires_at': int((datetime.now() + timedelta(days=30)).timestamp()),  # 30 days expiration
-                        'view_count': 0
-                    }
-                )
-                print(f"Successfully saved graph data to DynamoDB for file_id: {file_id}")
-                
-            except Exception as db_error:
-                print(f"ERROR: Failed to save to DynamoDB: {str(db_error)}")
-                continue
+        stage_seconds = tracker.finish()
+        print(f"Stage seconds for {file_id}: {json.dumps({k: float(v) for k, v in stage_seconds.items()})}")
+        try:
+            # Save successful result to DynamoDB, replacing the progress record
+            storage = graph_store.save_graph(
+                table,
+                {
+                    'share_id': share_id,
+                    'file_id': file_id,
+                    'file_name': file_name,
+                    'status': 'completed',
+                    'created_at': datetime.now().isoformat(),
+                    'expires_at': int((datetime.now() + timedelta(days=30)).timestamp()),  # 30 days expiration
+                    'view_count': 0,
+                    'stage_seconds': stage_seconds
+                },
+                graph_json, s3=s3, bucket=BUCKET_NAME
+            )
+            print(f"Successfully saved graph data ({storage}) to DynamoDB for file_id: {file_id}")
             
-            finally:
-                # Clean up temporary file
+        except Exception as db_error:
+            print(f"ERROR: Failed to save to DynamoDB: {str(db_error)}")
+            raise RetryableError(f"Failed to save graph for file_id {file_id}") from db_error
+    
+    finally:
+        tracker.stop()
+        if document is not None:
+            # Frees the buffer, or deletes the /tmp file it spilled to
+            document.close()
+
+def s3_records(record):
+    """S3 notification records in an event record, which is either one itself or an SQS message wrapping them."""
+    if record.get('eventSource') == 'aws:sqs':
+        # s3:TestEvent messages have no Records
+        return json.loads(record['body']).get('Records', [])
+    return [record]
+
+def process_event_record(record):
+    for s3_record in s3_records(record):
+        process_record(s3_record)
+
+@instrumentation.instrument('ProcessUploadedFunction')
+def handler(event, context):
+    """
+    Process the records of an S3 or SQS event concurrently, with up to
+    PROCESS_MAX_WORKERS at a time. A failing record doesn't affect the
+    others; for SQS batches the failed messages are reported in
+    batchItemFailures (requires ReportBatchItemFailures on the event
+    source) so only they are redelivered.
+    """
+    records = event.get('Records', [])
+    message_ids = [record['messageId'] for record in records if record.get('eventSource') == 'aws:sqs']
+    try:
+        failures = []
+        workers = max(1, min(PROCESS_MAX_WORKERS, len(records)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [instrumentation.submit(executor, process_event_record, record) for record in records]
+            for record, future in zip(records, futures):
                 try:
-                    if os.path.exists(download_path):
-                        os.remove(download_path)
-                        print(f"Cleaned up temporary file: {download_path}")
-                except Exception as cleanup_error:
-                    print(f"Warning: Failed to clean up temporary file: {str(cleanup_error)}")
+                    future.result()
+                except Exception as e:
+                    print(f"ERROR: Failed to process record: {str(e)}")
+                    if record.get('eventSource') == 'aws:sqs':
+                        failures.append({'itemIdentifier': record['messageId']})
 
-        return {
+        response = {
             'statusCode': 200,
             'body': json.dumps({'message': 'Processing completed'})
         }
+        if message_ids:
+            response['batchItemFailures'] = failures
+        return response
         
     except Exception as e:
         print(f"ERROR: Unexpected error in handler: {str(e)}")
-        return {
+        response = {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+        if message_ids:
+            response['batchItemFailures'] = [{'itemIdentifier': message_id} for message_id in message_ids]
+        return response
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Progress of a file being processed is kept on its GraphCacheTable item
+# (status "processing") until the final graph or error replaces it under
+# the same share_id. Updates are throttled to one write per interval and
+# skipped when nothing changed, so a long document costs a handful of
+# small writes.
+PROGRESS_INTERVAL_SECONDS = float(os.environ.get('PROGRESS_INTERVAL_SECONDS', '5'))
+# A record left behind by a function that died stays visible this long
+PROGRESS_TTL_HOURS = 24
+
+def is_conditional_check_failure(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ConditionalCheckFailedException' or type(error).__name__ == 'ConditionalCheckFailedException'
+
+def share_id_for(table, file_id):
+    """
+    The share_id of the file's existing item (e.g. the progress record of a
+    redelivered message), or a new one. A completed item is never replaced:
+    see ProgressTracker.start.
+    """
+    items = table.query(
+        IndexName='FileStatusIndex',
+        KeyConditionExpression='file_id = :file_id',
+        ExpressionAttributeValues={':file_id': file_id},
+        ProjectionExpression='share_id'
+    )['Items']
+    return items[0]['share_id'] if items else str(uuid.uuid4())
+
+class ProgressTracker:
+    """
+    Writes a file's progress record and keeps it current while it is
+    processed. Counts are read from `stats`, the dict the extraction code
+    already fills ('page_timings', 'chunks', 'chunks_total'), by a
+    background thread every `interval` seconds; stage changes are written
+    right away.
+
+        progress = ProgressTracker(table, share_id, file_id, file_name)
+        progress.start()
+        try:
+            progress.stage('download')
+            ...
+            stage_seconds = progress.finish()
+        finally:
+            progress.stop()
+    """
+
+    def __init__(self, table, share_id, file_id, file_name, stats=None, interval=None):
+        self.table = table
+        self.share_id = share_id
+        self.file_id = file_id
+        self.file_name = file_name
+        self.stats = {} if stats is None else stats
+        self.interval = PROGRESS_INTERVAL_SECONDS if interval is None else interval
+        self.current = None
+        self.stage_started = None
+        self.stage_seconds = {}
+        self.chunks_started = None
+        self.written = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Write the progress record and start updating it.
+
+        Returns:
+            bool: False, with nothing written, if the item is already a
+            completed graph (a duplicate delivery of a processed upload).
+        """
+        now = datetime.now()
+        try:
+            self.table.put_item(
+                Item={
+                    'share_id': self.share_id,
+                    'file_id': self.file_id,
+                    'file_name': self.file_name,
+                    'status': 'processing',
+                    'stage': 'queued',
+                    'created_at': now.isoformat(),
+                    'updated_at': now.isoformat(),
+                    'expires_at': int((now + timedelta(hours=PROGRESS_TTL_HOURS)).timestamp()),
+                    'view_count': 0
+                },
+                # A finished graph keeps its views and stored payload
+                ConditionExpression='attribute_not_exists(share_id) OR #status <> :completed',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':completed': 'completed'}
+            )
+        except Exception as e:
+            if not is_conditional_check_failure(e):
+                raise
+            print(f"File {self.file_id} already has a completed graph ({self.share_id})")
+            return False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def stage(self, name):
+        """Close the current stage and start `name`, writing the change now."""
+        now = time.monotonic()
+        with self._lock:
+            if self.current is not None:
+                self.stage_seconds[self.current] = round(now - self.stage_started, 3)
+            self.current, self.stage_started = name, now
+        self.write()
+
+    def finish(self):
+        """
+        Close the current stage and stop updating.
+
+        Returns:
+            dict: Seconds spent per stage (as Decimal, ready for an item).
+        """
+        self.stop()
+        with self._lock:
+            if self.current is not None:
+                self.stage_seconds[self.current] = round(time.monotonic() - self.stage_started, 3)
+                self.current = None
+            return {k: Decimal(str(v)) for k, v in self.stage_seconds.items()}
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def discard(self):
+        """Stop and delete the record, unless a final item has replaced it."""
+        self.stop()
+        try:
+            self.table.delete_item(
+                Key={'share_id': self.share_id},
+                ConditionExpression='#status = :processing',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':processing': 'processing'}
+            )
+        except Exception as e:
+            print(f"Warning: Failed to delete progress record {self.share_id}: {str(e)}")
+
+    def snapshot(self):
+        """The progress attributes as of now."""
+        done = self.stats.get('chunks', 0)
+        total = self.stats.get('chunks_total')
+        progress = {
+            'stage': self.current or 'queued',
+            'pages_done': len(self.stats.get('page_timings', [])),
+            'chunks_done': done
+        }
+        if total is not None:
+            progress['chunks_total'] = total
+        if done and self.chunks_started is None:
+            self.chunks_started = (time.monotonic(), done)
+        if total is not None and self.chunks_started is not None:
+            # Chunk throughput since the first chunk came back
+            started_at, started_done = self.chunks_started
+            elapsed = time.monotonic() - started_at
+            if done > started_done and elapsed > 0:
+                rate = (done - started_done) / elapsed
+                progress['eta_seconds'] = int((total - done) / rate)
+        return progress
+
+    def write(self):
+        progress = self.snapshot()
+        with self._lock:
+            if progress == self.written:
+                return
+            self.written = dict(progress)
+            stage_seconds = {k: Decimal(str(v)) for k, v in self.stage_seconds.items()}
+        progress.update(stage_seconds=stage_seconds, updated_at=datetime.now().isoformat())
+        # Every name goes through a placeholder, so none can clash with a reserved word
+        names = {f'#{k}': k for k in progress}
+        values = {f':{k}': v for k, v in progress.items()}
+        names['#status'] = 'status'
+        values[':processing'] = 'processing'
+        try:
+            self.table.update_item(
+                Key={'share_id': self.share_id},
+                UpdateExpression='SET ' + ', '.join(f'#{k} = :{k}' for k in progress),
+                # Never turn a final item back into a progress record
+                ConditionExpression='#status = :processing',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except Exception as e:
+            # Progress is best effort; processing carries on without it
+            print(f"Warning: Failed to write progress for {self.file_id}: {str(e)}")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
@@ -0,0 +1,203 @@
+import io
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+RANGE_BLOCK_SIZE = 1024 * 1024
+_CONTENT_RANGE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable, read-only view of an S3 object backed by parallel ranged GETs.
+
+    The first block (which also tells us the object size) is fetched on
+    construction; the rest are fetched in the background by a small thread
+    pool, last block first because PDF parsers start at the trailer. Reads
+    only wait for the blocks they touch, so a parser can work on the start
+    of a document while the end is still downloading.
+
+    Wrap it in io.BufferedReader for parsers that read a byte at a time.
+    """
+
+    def __init__(self, s3, bucket, key, block_size=None, max_workers=4):
+        super().__init__()
+        block_size = block_size or RANGE_BLOCK_SIZE
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.position = 0
+        self.requests = 0
+        self._blocks = {}
+        self._errors = {}
+        self._ready = threading.Condition()
+
+        try:
+            first = self._get_range(0, block_size - 1)
+        except Exception as e:
+            # S3 refuses every range of an empty object, as in get_first_part
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'InvalidRange':
+                raise
+            self.requests += 1
+            first = s3.get_object(Bucket=bucket, Key=key)
+        content_range = first.get('ContentRange')
+        match = _CONTENT_RANGE.match(content_range or '')
+        data = first['Body'].read()
+        self.size = int(match.group(1)) if match else len(data)
+        self._blocks[0] = data
+        self.block_count = max(1, -(-self.size // block_size))
+
+        remaining = list(range(1, self.block_count))
+        if remaining:
+            remaining.insert(0, remaining.pop())
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        for index in remaining:
+            self._executor.submit(self._fetch, index)
+
+    def _get_range(self, start, end):
+        self.requests += 1
+        return self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+
+    def _fetch(self, index):
+        start = index * self.block_size
+        try:
+            data = self._get_range(start, min(start + self.block_size, self.size) - 1)['Body'].read()
+            with self._ready:
+                self._blocks[index] = data
+                self._ready.notify_all()
+        except Exception as e:
+            with self._ready:
+                self._errors[index] = e
+                self._ready.notify_all()
+
+    def _block(self, index):
+        with self._ready:
+            while index not in self._blocks:
+                if index in self._errors:
+                    raise self._errors[index]
+                self._ready.wait()
+            return self._blocks[index]
+
+    @property
+    def error(self):
+        """The first failed block fetch, if any. Parsers may report it as a damaged file."""
+        with self._ready:
+            return next(iter(self._errors.values()), None)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        self.position = max(0, self.position)
+        return self.position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(view) and self.position < self.size:
+            index, offset = divmod(self.position, self.block_size)
+            block = self._block(index)
+            piece = block[offset:offset + len(view) - written]
+            view[written:written + len(piece)] = piece
+            written += len(piece)
+            self.position += len(piece)
+        return written
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+def open_s3_object(s3, bucket, key, block_size=None, max_workers=4, buffer_size=64 * 1024):
+    """Buffered, seekable file object over an S3 object; see S3RangeReader."""
+    return io.BufferedReader(S3RangeReader(s3, bucket, key, block_size, max_workers), buffer_size)
+
+def get_first_part(s3, bucket, key, part_size):
+    """
+    GET the first `part_size` bytes of an object: all of a small one in one
+    request, plus its size (see object_size) and ETag.
+    """
+    try:
+        return s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{part_size - 1}")
+    except Exception as e:
+        # S3 refuses every range of an empty object
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'InvalidRange':
+            raise
+        return s3.get_object(Bucket=bucket, Key=key)
+
+def object_size(response):
+    """Size of the whole object from a (possibly ranged) get_object response."""
+    match = _CONTENT_RANGE.match(response.get('ContentRange') or '')
+    return int(match.group(1)) if match else response['ContentLength']
+
+def spool_s3_object(s3, bucket, key, first=None, part_size=8 * 1024 * 1024, max_workers=4,
+                    spool_max_bytes=32 * 1024 * 1024, copy_size=64 * 1024):
+    """
+    Copy an S3 object into a seekable SpooledTemporaryFile, positioned at 0.
+
+    An object of up to `part_size` bytes takes the one GET of
+    get_first_part. The rest of a bigger one is fetched with ranged GETs on
+    `max_workers` threads, each pinned to the first part's ETag so an
+    overwrite can't mix versions. The copy stays in memory up to
+    `spool_max_bytes` and is written to /tmp only above it. Bodies are
+    copied `copy_size` bytes at a time, so each thread holds no more than
+    that besides the spool.
+
+    Args:
+        first (dict, optional): get_first_part's response for the same
+            `part_size`, if the caller already made it.
+
+    Returns:
+        tempfile.SpooledTemporaryFile: The caller closes it.
+    """
+    if first is None:
+        first = get_first_part(s3, bucket, key, part_size)
+    size = object_size(first)
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes)
+    lock = threading.Lock()
+
+    def copy(body, offset, length):
+        try:
+            while length > 0:
+                piece = body.read(min(copy_size, length))
+                if not piece:
+                    raise IOError(f"s3://{bucket}/{key} ended {length} bytes early")
+                with lock:
+                    spool.seek(offset)
+                    spool.write(piece)
+                offset += len(piece)
+                length -= len(piece)
+        finally:
+            body.close()
+
+    def fetch(start):
+        end = min(start + part_size, size) - 1
+        part = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=first['ETag'])
+        copy(part['Body'], start, end - start + 1)
+
+    try:
+        if size > spool_max_bytes:
+            # Straight to disk rather than filling memory first
+            spool.rollover()
+        copy(first['Body'], 0, min(size, part_size))
+        if size > part_size:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(fetch, range(part_size, size, part_size)))
+        spool.seek(0)
+        return spool
+    except Exception:
+        spool.close()
+        raise
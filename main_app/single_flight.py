@@ -0,0 +1,195 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+# Single-flight extraction: concurrent requests for the same text (a viral
+# shared document, a double-submitted form) share one LLM run.
+#
+# Within a container, the first request for a key leads and later ones
+# await its future; ProcessUploadedFunction runs records on several threads,
+# each with its own event loop, so the futures are thread-safe ones.
+# Across containers (opt-in, KG_COALESCE_ACROSS_CONTAINERS), the leader
+# holds a lease item in the chunk cache table ("lease#{key}"). Other
+# containers poll it until the leader marks it done, then extract
+# themselves. By then every chunk is in the chunk cache, so they make no
+# LLM calls.
+#
+# The lease outlives the function timeout, so it never expires under a
+# live leader. It is only taken over when it expires or when the leader
+# gives it up after a failure.
+LEASE_SECONDS = int(os.environ.get('KG_COALESCE_LEASE_SECONDS', '960'))
+# Followers stop waiting and extract on their own after this long, or
+# sooner when the caller passes a deadline (see DynamoDBLease.acquire)
+WAIT_SECONDS = float(os.environ.get('KG_COALESCE_WAIT_SECONDS', '600'))
+POLL_SECONDS = float(os.environ.get('KG_COALESCE_POLL_SECONDS', '1'))
+# How long a finished lease stays as a "done" marker for late pollers
+DONE_SECONDS = int(os.environ.get('KG_COALESCE_DONE_SECONDS', '60'))
+
+LEADER, FOLLOWER, WAITED = 'leader', 'follower', 'waited'
+
+def is_conditional_check_failure(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ConditionalCheckFailedException' or type(error).__name__ == 'ConditionalCheckFailedException'
+
+class DynamoDBLease:
+    """
+    Cross-container lease items in the chunk cache table:
+    {cache_key: "lease#...", owner, lease_state: running|done, expires_at}.
+    expires_at doubles as the table's TTL attribute, so stale leases are
+    eventually deleted as well as ignored.
+    """
+
+    def __init__(self, table, lease_seconds=None, wait_seconds=None, poll_seconds=None):
+        self.table = table
+        self.owner = uuid.uuid4().hex
+        self.lease_seconds = LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.wait_seconds = WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self.poll_seconds = POLL_SECONDS if poll_seconds is None else poll_seconds
+
+    def _key(self, key):
+        return {'cache_key': f"lease#{key}"}
+
+    def try_acquire(self, key):
+        """Take the lease if it is free, expired or done; returns whether it was taken."""
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={**self._key(key), 'owner': self.owner, 'lease_state': 'running',
+                      'expires_at': now + self.lease_seconds},
+                ConditionExpression='attribute_not_exists(cache_key) OR expires_at < :now OR lease_state = :done',
+                ExpressionAttributeValues={':now': now, ':done': 'done'}
+            )
+            return True
+        except Exception as e:
+            if is_conditional_check_failure(e):
+                return False
+            raise
+
+    def acquire(self, key, deadline=None, cancelled=None):
+        """
+        Block until this container leads `key` (returns True) or another
+        container's run for it is done or outlasted the wait (False).
+
+        Args:
+            deadline (float, optional): time.monotonic() by which the caller
+                must answer, e.g. API Gateway's 29 s. The wait stops halfway
+                there, leaving the rest to extract without the leader.
+            cancelled (threading.Event, optional): Set when the caller no
+                longer wants the lease; polling stops and returns False, and
+                a lease taken meanwhile is given up again.
+        """
+        started = time.monotonic()
+        wait_seconds = self.wait_seconds
+        if deadline is not None:
+            wait_seconds = max(0, min(wait_seconds, (deadline - started) / 2))
+        give_up = started + wait_seconds
+        cancelled = cancelled or threading.Event()
+        while True:
+            if self.try_acquire(key):
+                if cancelled.is_set():
+                    self.release(key, False)
+                    return False
+                return True
+            while True:
+                if time.monotonic() >= give_up:
+                    print(f"Gave up waiting for the extraction lease on {key[:12]} after {wait_seconds:.1f}s")
+                    return False
+                if cancelled.wait(self.poll_seconds):
+                    return False
+                item = self.table.get_item(Key=self._key(key), ConsistentRead=True).get('Item')
+                if item is not None and item.get('lease_state') == 'done':
+                    return False
+                # Gone (the leader failed) or expired: try to lead
+                if item is None or int(item['expires_at']) < time.time():
+                    break
+
+    def release(self, key, done):
+        """Mark the lease done, or give it up after a failure so a waiter can lead."""
+        try:
+            if done:
+                self.table.update_item(
+                    Key=self._key(key),
+                    UpdateExpression='SET lease_state = :done, expires_at = :expires',
+                    ConditionExpression='owner = :owner',
+                    ExpressionAttributeValues={':done': 'done', ':owner': self.owner,
+                                               ':expires': int(time.time()) + DONE_SECONDS}
+                )
+            else:
+                self.table.delete_item(Key=self._key(key), ConditionExpression='owner = :owner',
+                                       ExpressionAttributeValues={':owner': self.owner})
+        except Exception as e:
+            # Expired and taken over, or a table error: the lease times out either way
+            print(f"Warning: Failed to release extraction lease: {str(e)}")
+
+class SingleFlight:
+    """Runs one coroutine per key at a time and shares its result."""
+
+    def __init__(self, lease=None):
+        self.lease = lease
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    async def run(self, key, work, deadline=None):
+        """
+        Await `work()` for `key`, or the run already in flight for it.
+
+        Args:
+            key (str): What makes two runs interchangeable, e.g. a text hash.
+            work: Coroutine function producing the result.
+            deadline (float, optional): Bounds the wait for another
+                container's run (see DynamoDBLease.acquire).
+
+        Returns:
+            tuple: (result, role). The role is LEADER if this call ran
+            `work` itself, FOLLOWER if it shared another call's run in
+            this container, or WAITED if it ran `work` after another
+            container's run for the key finished.
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            # Shielded: cancelling a follower (e.g. its wait_for deadline)
+            # must not cancel the shared future under the leader
+            return await asyncio.shield(asyncio.wrap_future(future)), FOLLOWER
+        try:
+            role = LEADER
+            holds_lease = False
+            if self.lease is not None:
+                cancelled = threading.Event()
+                try:
+                    holds_lease = await asyncio.to_thread(self.lease.acquire, key, deadline, cancelled)
+                    role = LEADER if holds_lease else WAITED
+                except asyncio.CancelledError:
+                    # The polling thread outlives this task otherwise
+                    cancelled.set()
+                    raise
+                except Exception as e:
+                    # Coalescing is best-effort, like the chunk cache
+                    print(f"Warning: Extraction lease unavailable: {str(e)}")
+            try:
+                result = await work()
+            except BaseException:
+                if holds_lease:
+                    await asyncio.to_thread(self.lease.release, key, False)
+                raise
+            if holds_lease:
+                await asyncio.to_thread(self.lease.release, key, True)
+            future.set_result(result)
+            return result, role
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
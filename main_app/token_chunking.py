@@ -0,0 +1,135 @@
+import math
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts are then estimated
+    tiktoken = None
+
+# Chunks are packed up to this fraction of the model's context window (or
+# KG_CHUNK_TOKENS, if set). LLMGraphTransformer repeats a long system
+# prompt and schema with every call, so fewer, larger chunks cost fewer
+# prompt tokens and calls; very large chunks make the model drop entities,
+# hence a small fraction of a 128k context by default.
+CHUNK_CONTEXT_FRACTION = float(os.environ.get('KG_CHUNK_CONTEXT_FRACTION', '0.025'))
+CHUNK_TOKENS = int(os.environ.get('KG_CHUNK_TOKENS', '0')) or None
+OVERLAP_TOKENS = int(os.environ.get('KG_CHUNK_OVERLAP_TOKENS', '100'))
+CONTEXT_TOKENS = {
+    'gpt-4-turbo': 128000,
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Used when tiktoken or its encoding files are unavailable (tiktoken
+# downloads them on first use unless TIKTOKEN_CACHE_DIR has them)
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=\S)')
+
+_encodings = {}
+
+def _encoding(model_name):
+    if model_name not in _encodings:
+        encoding = None
+        if tiktoken is not None:
+            try:
+                try:
+                    encoding = tiktoken.encoding_for_model(model_name or '')
+                except KeyError:
+                    encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                print(f"Warning: tiktoken encoding unavailable ({type(e).__name__}), estimating tokens from length")
+        _encodings[model_name] = encoding
+    return _encodings[model_name]
+
+def count_tokens(text, model_name=None):
+    """Tokens in `text` for `model_name`, or an estimate without tiktoken."""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def chunk_budget(model_name=None, fraction=None):
+    """Tokens per chunk: KG_CHUNK_TOKENS, or a fraction of the model's context."""
+    if CHUNK_TOKENS:
+        return CHUNK_TOKENS
+    if fraction is None:
+        fraction = CHUNK_CONTEXT_FRACTION
+    return max(1, int(CONTEXT_TOKENS.get(model_name, DEFAULT_CONTEXT_TOKENS) * fraction))
+
+def _split_long(sentence, budget, model_name):
+    # A sentence over budget on its own is cut between words
+    pieces, current, size = [], [], 0
+    for word in sentence.split(' '):
+        tokens = count_tokens(word + ' ', model_name)
+        if current and size + tokens > budget:
+            pieces.append(' '.join(current))
+            current, size = [], 0
+        current.append(word)
+        size += tokens
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+def _units(text, budget, model_name):
+    """(text, tokens, ends_paragraph) for each sentence of `text`."""
+    units = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        sentences = [s.strip() for s in SENTENCE_END.split(paragraph.strip()) if s.strip()]
+        for i, sentence in enumerate(sentences):
+            tokens = count_tokens(sentence, model_name)
+            parts = [(sentence, tokens)] if tokens <= budget else \
+                [(part, count_tokens(part, model_name)) for part in _split_long(sentence, budget, model_name)]
+            for j, (part, part_tokens) in enumerate(parts):
+                units.append((part, part_tokens, i == len(sentences) - 1 and j == len(parts) - 1))
+    return units
+
+def _join(units):
+    text = ''
+    for part, _, ends_paragraph in units:
+        text += part + ('\n\n' if ends_paragraph else ' ')
+    return text.strip()
+
+def split_text(text, model_name=None, chunk_tokens=None, overlap_tokens=None):
+    """
+    Split `text` into chunks of at most `chunk_tokens` tokens (default
+    chunk_budget(model_name)) made of whole sentences. A chunk ends at a
+    paragraph break when one falls in its last quarter. Each chunk
+    starts with the last sentences of the previous one, up to
+    `overlap_tokens` (default KG_CHUNK_OVERLAP_TOKENS), so relations
+    spanning the cut are still seen together.
+
+    Returns:
+        list[str]: The chunks.
+    """
+    budget = chunk_tokens or chunk_budget(model_name)
+    overlap = OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap = min(overlap, budget // 2)
+    units = _units(text, budget, model_name)
+
+    chunks = []
+    start = 0
+    while start < len(units):
+        end, size, last_break = start, 0, None
+        while end < len(units) and size + units[end][1] <= budget:
+            size += units[end][1]
+            if units[end][2]:
+                last_break = (end + 1, size)
+            end += 1
+        end = max(end, start + 1)
+        if end < len(units) and last_break and last_break[1] >= 0.75 * size:
+            end = last_break[0]
+        chunks.append(_join(units[start:end]))
+        if end >= len(units):
+            break
+        # Step back over whole sentences for the overlap, always moving forward
+        back, carried = end, 0
+        while back - 1 > start and carried + units[back - 1][1] <= overlap:
+            back -= 1
+            carried += units[back][1]
+        start = back
+    return chunks
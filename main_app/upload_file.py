@@ -1,37 +1,29 @@
 # upload_file.py
+# Uploads the whole file as base64 inside the JSON body, which inflates it by
+# a third, holds several copies in memory and is capped at API Gateway's
+# 10 MB. Clients should upload straight to S3 with presigned_url instead
+# (multipart for large files); the S3-triggered processor extracts the text.
 import json
 import boto3
 import base64
+import hashlib
 import uuid
 import os
 from datetime import datetime
-import PyPDF2
-from io import BytesIO
+import extractors
+import instrumentation
 
 s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ['BUCKET_NAME']
 
 def extract_text_from_file(file_content, content_type, file_name):
-    """Extract text during upload"""
+    """Extract text during upload, in any format extractors handles"""
     try:
-        if content_type.startswith('text/') or file_name.endswith('.txt'):
-            return file_content.decode('utf-8')
-        
-        elif file_name.endswith('.pdf'):
-            pdf_file = BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
-        
-        else:
-            # Try as text
-            return file_content.decode('utf-8')
-            
+        return extractors.extract_text(file_content, content_type, file_name).strip()
     except Exception as e:
         raise Exception(f"Failed to extract text: {str(e)}")
 
+@instrumentation.instrument('UploadFileFunction')
 def lambda_handler(event, context):
     try:
         body = json.loads(event['body'])
@@ -63,32 +55,36 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": str(e)})
             }
         
-        # Store original file
-        original_key = f"uploads/{file_id}/original/{file_name}"
+        # Store extracted text first, labelled with the ETag S3 will give the
+        # original (the MD5 of a single-part upload), so the processor the
+        # original's upload event starts can reuse it instead of parsing again
+        source_etag = hashlib.md5(file_data).hexdigest()
+        text_key = f"uploads/{file_id}/extracted.txt"
         s3_client.put_object(
             Bucket=BUCKET_NAME,
-            Key=original_key,
-            Body=file_data,
-            ContentType=content_type,
+            Key=text_key,
+            Body=extracted_text.encode('utf-8'),
+            ContentType='text/plain',
             Metadata={
                 'file_id': file_id,
                 'original_filename': file_name,
-                'upload_timestamp': datetime.utcnow().isoformat()
+                'text_length': str(len(extracted_text)),
+                'extraction_timestamp': datetime.utcnow().isoformat(),
+                'source_etag': source_etag
             }
         )
-        
-        # Store extracted text
-        text_key = f"uploads/{file_id}/extracted.txt"
+
+        # Store original file
+        original_key = f"uploads/{file_id}/original/{file_name}"
         s3_client.put_object(
             Bucket=BUCKET_NAME,
-            Key=text_key,
-            Body=extracted_text.encode('utf-8'),
-            ContentType='text/plain',
+            Key=original_key,
+            Body=file_data,
+            ContentType=content_type,
             Metadata={
                 'file_id': file_id,
                 'original_filename': file_name,
-                'text_length': str(len(extracted_text)),
-                'extraction_timestamp': datetime.utcnow().isoformat()
+                'upload_timestamp': datetime.utcnow().isoformat()
             }
         )
         
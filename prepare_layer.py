@@ -1,10 +1,48 @@
 # build_layers_docker.py
+import argparse
+import compileall
+import json
 import os
+import py_compile
 import subprocess
 import shutil
 import sys
 import locale
 
+# Slim builds (--slim): inside the build container, each layer is traced by
+# importing what its functions import, then stripped of tests and docs,
+# of top-level packages the trace never loaded (unless kept), and of the
+# untraced modules of the `prune` packages. Everything left is compiled to
+# bytecode, since /opt is read-only and Lambda would otherwise recompile on
+# every cold start. A layer over its budget (MB unzipped) fails the build.
+LAYERS = {
+    "ml_layer": {
+        "trace": "import prepare_layer; prepare_layer.trace_ml_layer()",
+        # Loaded lazily by code paths the trace doesn't reach
+        "keep": ["tiktoken_ext"],
+        # Large packages of which the functions use a few modules
+        "prune": ["langchain_community", "langchain_classic", "langchain"],
+        "budget_mb": 120
+    },
+    "upload_layer": {
+        "trace": "import prepare_layer; prepare_layer.trace_upload_layer()",
+        "keep": [],
+        "prune": [],
+        "budget_mb": 20
+    }
+}
+# Code the traces import, on top of the layer itself
+TRACE_PATHS = [os.path.dirname(os.path.abspath(__file__)), "main_app", os.path.join("common_layer", "python")]
+# What the OpenAI stand-in in trace_ml_layer answers with
+TRACE_GRAPH = {
+    "nodes": [{"id": "Ada Lovelace", "type": "Person"}, {"id": "Charles Babbage", "type": "Person"}],
+    "relationships": [{"source_node_id": "Ada Lovelace", "source_node_type": "Person",
+                       "target_node_id": "Charles Babbage", "target_node_type": "Person", "type": "MET"}]
+}
+LAYER_PYTHON = (3, 11)
+STRIP_DIRS = {"tests", "test", "docs", "doc", "examples", "benchmarks", "__pycache__"}
+STRIP_SUFFIXES = (".pyi", ".pyx", ".pxd", ".c", ".h")
+
 def run_command(cmd, description):
     """Run a command and handle errors gracefully with proper encoding"""
     print(f"🔄 {description}...")
@@ -92,8 +130,8 @@ def check_docker():
         print("⚠️ Docker found but with encoding issues, continuing...")
         return True
 
-def build_layers_with_docker():
-    """Build both layers using Docker"""
+def build_layers_with_docker(slim=False, budget_mb=None):
+    """Build both layers using Docker, slimmed inside the container with `slim`"""
     
     # Check if Docker is available
     if not check_docker():
@@ -101,6 +139,9 @@ def build_layers_with_docker():
     
     container_name = "temp-layer-container"
     image_name = "lambda-layer-builder"
+    build_args = f"--progress=plain --build-arg SLIM={1 if slim else 0}"
+    if budget_mb is not None:
+        build_args += f" --build-arg LAYER_BUDGET_MB={budget_mb}"
     
     try:
         # Clean up any existing container/image
@@ -110,17 +151,17 @@ def build_layers_with_docker():
         
         # Build the Docker image with progress output
         print("🔨 Building Docker image (this may take a few minutes)...")
-        print("📋 Running: docker build -f Dockerfile.layer -t lambda-layer-builder .")
+        print(f"📋 Running: docker build {build_args} -f Dockerfile.layer -t lambda-layer-builder .")
         
         # Use alternative method for building to avoid encoding issues
         if not run_command_alternative(
-            f"docker build -f Dockerfile.layer -t {image_name} .",
+            f"docker build {build_args} -f Dockerfile.layer -t {image_name} .",
             "Building Docker image"
         ):
             print("❌ Docker build failed. Let's try with verbose output...")
             # Try with no-cache to see detailed output
             return run_command_alternative(
-                f"docker build --no-cache -f Dockerfile.layer -t {image_name} .",
+                f"docker build --no-cache {build_args} -f Dockerfile.layer -t {image_name} .",
                 "Building Docker image (no cache)"
             )
         
@@ -210,6 +251,192 @@ def verify_local_layers():
     else:
         print("❌ Upload layer directory not found")
 
+    for name in LAYERS:
+        layer_path = os.path.join(name, "python")
+        if os.path.exists(layer_path):
+            report_sizes(name, package_sizes(layer_path), top=10)
+
+def tree_size(path):
+    """Bytes under path (or of the file)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            if not os.path.islink(full):
+                total += os.path.getsize(full)
+    return total
+
+def package_sizes(layer_dir):
+    """Bytes per top-level entry (package, module or dist-info) of a layer."""
+    return {entry: tree_size(os.path.join(layer_dir, entry)) for entry in os.listdir(layer_dir)}
+
+def report_sizes(name, before, after=None, top=15):
+    """Print the largest entries of a layer, with their size before slimming if given."""
+    after = before if after is None else after
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"📦 {name}: {total_after / 1e6:.1f} MB" +
+          (f" (was {total_before / 1e6:.1f} MB)" if after is not before else ""))
+    for entry in sorted(before, key=lambda e: -before[e])[:top]:
+        now = after.get(entry, 0)
+        change = f" ← {before[entry] / 1e6:7.2f}" if after is not before else ""
+        print(f"   {entry:<40} {now / 1e6:7.2f} MB{change}")
+
+def trace_ml_layer():
+    """
+    Use the ml_layer the way a request does, with a local stand-in for the
+    OpenAI API, so modules that are only imported once a client is built or
+    a call goes out are traced too.
+    """
+    import asyncio
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    import knowledge_graph
+    import token_chunking
+    from langchain_core.documents import Document
+
+    class OpenAIStandIn(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps({
+                "id": "trace", "object": "chat.completion", "created": 0, "model": request["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                    "role": "assistant", "content": None,
+                    "tool_calls": [{"id": "trace", "type": "function", "function": {
+                        "name": "DynamicGraph", "arguments": json.dumps(TRACE_GRAPH)}}]}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), OpenAIStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        ChatOpenAI, LLMGraphTransformer = knowledge_graph.load_llm_classes()
+        llm = ChatOpenAI(temperature=0, model_name=knowledge_graph.MODEL_NAME, openai_api_key="trace",
+                         base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        transformer = LLMGraphTransformer(llm=llm)
+        usage = knowledge_graph.usage_handler(transformer)
+        documents = [Document(page_content="Ada Lovelace met Charles Babbage.")]
+        asyncio.run(transformer.aconvert_to_graph_documents(documents, knowledge_graph.usage_config(usage)))
+    finally:
+        server.shutdown()
+    token_chunking.count_tokens("Ada Lovelace met Charles Babbage.", knowledge_graph.MODEL_NAME)
+    knowledge_graph.CHUNKING = "chars"
+    knowledge_graph.split_text("Ada Lovelace met Charles Babbage. " * 100)
+
+def trace_upload_layer():
+    """Read a PDF the way ProcessUploadedFunction does, with every installed backend."""
+    from io import BytesIO
+    import PyPDF2
+    import extractors
+    import pdf_text
+
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    pdf = BytesIO()
+    writer.write(pdf)
+    extractors.extract_text(pdf.getvalue(), 'application/pdf', 'trace.pdf')
+    for backend in pdf_text.available_backends():
+        pdf_text.extract_pdf_text(pdf.getvalue(), backend=backend)
+
+def trace_imports(layer_dir, code):
+    """
+    Files the modules imported by `code` were loaded from, relative to
+    layer_dir. Runs in a fresh interpreter with the layer and TRACE_PATHS
+    on the path.
+    """
+    script = code + "\nimport json, sys\nprint(json.dumps([getattr(m, '__file__', None) for m in list(sys.modules.values())]))"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([layer_dir] + [os.path.abspath(p) for p in TRACE_PATHS]))
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    result = subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True)
+    root = os.path.realpath(layer_dir) + os.sep
+    files = set()
+    for path in json.loads(result.stdout.strip().splitlines()[-1]):
+        if path and os.path.realpath(path).startswith(root):
+            files.add(os.path.relpath(os.path.realpath(path), root))
+    return files
+
+def remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+def slim_layer(layer_dir, trace, keep=(), prune=()):
+    """
+    Strip a layer down to what `trace` imports (see LAYERS) and compile it.
+
+    Returns:
+        list: The removed paths, relative to layer_dir.
+    """
+    traced = trace_imports(layer_dir, trace)
+    used = {path.split(os.sep)[0] for path in traced}
+    removed = []
+
+    # Top-level packages and modules the functions never load
+    for entry in sorted(os.listdir(layer_dir)):
+        name = entry[:-len(".libs")] if entry.endswith(".libs") else entry
+        if entry.endswith((".dist-info", ".egg-info")) or name in used or name.split(".")[0] in keep:
+            continue
+        remove(os.path.join(layer_dir, entry))
+        removed.append(entry)
+
+    for root, dirs, files in os.walk(layer_dir):
+        relroot = os.path.relpath(root, layer_dir)
+        if relroot.endswith((".dist-info", ".egg-info")):
+            dirs[:] = []
+            continue
+        for d in [d for d in dirs if d in STRIP_DIRS]:
+            rel = os.path.normpath(os.path.join(relroot, d))
+            # A traced module inside a tests/ directory stays
+            if not any(path.startswith(rel + os.sep) for path in traced):
+                shutil.rmtree(os.path.join(root, d))
+                removed.append(rel)
+                dirs.remove(d)
+        pruned = relroot.split(os.sep)[0] in prune
+        for name in files:
+            rel = os.path.normpath(os.path.join(relroot, name))
+            untraced_module = pruned and name != "__init__.py" and name.endswith((".py", ".so", ".pyd")) \
+                and rel not in traced
+            if name.endswith(STRIP_SUFFIXES) or untraced_module:
+                os.remove(os.path.join(root, name))
+                removed.append(rel)
+
+    # Hash-checked rather than mtime-checked .pyc, so the mtimes the layer
+    # zip round trip leaves don't make Python ignore them
+    compileall.compile_dir(layer_dir, quiet=1, workers=0,
+                           invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    return removed
+
+def slim_layer_dir(name, layer_dir, budget_mb=None):
+    """Slim one layer per LAYERS, print its sizes and check its budget."""
+    spec = LAYERS[name]
+    if sys.version_info[:2] != LAYER_PYTHON:
+        print(f"⚠️ Python {sys.version_info[0]}.{sys.version_info[1]} is not the layer's "
+              f"{LAYER_PYTHON[0]}.{LAYER_PYTHON[1]}; bytecode and trace may not match Lambda")
+    before = package_sizes(layer_dir)
+    removed = slim_layer(layer_dir, spec["trace"], spec["keep"], spec["prune"])
+    after = package_sizes(layer_dir)
+    print(f"✂️ {name}: removed {len(removed)} paths")
+    report_sizes(name, before, after)
+    return check_budget(name, after, spec["budget_mb"] if budget_mb is None else budget_mb)
+
+def check_budget(name, sizes, budget_mb):
+    total_mb = sum(sizes.values()) / 1e6
+    if total_mb > budget_mb:
+        print(f"❌ {name} is {total_mb:.1f} MB, over its {budget_mb} MB budget")
+        return False
+    print(f"✅ {name} is {total_mb:.1f} MB, within its {budget_mb} MB budget")
+    return True
+
 def check_requirements_files():
     """Check if requirements files exist and show their contents"""
     print("📋 Checking requirements files...")
@@ -237,6 +464,18 @@ def check_requirements_files():
     return all_exist
 
 def main():
+    parser = argparse.ArgumentParser(description="Build the ml_layer and upload_layer dependency layers with Docker")
+    parser.add_argument("--slim", action="store_true",
+                        help="Strip each layer to its import trace and precompile it (see LAYERS)")
+    parser.add_argument("--budget-mb", type=float, help="Fail if a slimmed layer is larger (overrides LAYERS)")
+    parser.add_argument("--slim-only", nargs=2, metavar=("LAYER", "DIR"),
+                        help="Slim an installed layer directory in place (run inside the build image)")
+    args = parser.parse_args()
+
+    if args.slim_only:
+        name, layer_dir = args.slim_only
+        return slim_layer_dir(name, layer_dir, args.budget_mb)
+
     print("🚀 Starting Docker-based layer build process...")
     print("="*60)
     
@@ -246,7 +485,7 @@ def main():
         return False
     
     # Build layers
-    if build_layers_with_docker():
+    if build_layers_with_docker(args.slim, args.budget_mb):
         print("\n" + "="*60)
         print("🎉 Layers built successfully with Docker!")
         
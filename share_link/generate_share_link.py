@@ -4,10 +4,16 @@ import boto3
 import uuid
 import os
 from datetime import datetime, timedelta
+import graph_store
+import instrumentation
 
 dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
 table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
+# Where graphs too large for DynamoDB items are stored
+GRAPH_BUCKET = os.environ.get('GRAPH_BUCKET')
 
+@instrumentation.instrument('GenerateShareLinkFunction')
 def handler(event, context):
     try:
         body = json.loads(event['body'])
@@ -25,38 +31,33 @@ def handler(event, context):
                 "body": json.dumps({"error": "Missing file_id or graph_data"})
             }
         
-        # Generate unique share ID
-        share_id = str(uuid.uuid4())
-        
         # Set expiration (e.g., 30 days from now)
         expires_at = int((datetime.now() + timedelta(days=30)).timestamp())
         
         # Store in DynamoDB 
-        # if a graph with the same file_id already exists, update it
-        existing_item = table.get_item(Key={'file_id': file_id})
-        if 'Item' in existing_item:
-            # Update existing item
-            table.update_item(
-                Key={'file_id': file_id},
-                UpdateExpression='SET graph_data = :data, expires_at = :expires, share_id = :share_id',
-                ExpressionAttributeValues={
-                    ':data': graph_data,
-                    ':expires': expires_at,
-                    ':share_id': share_id
-                }
-            )
+        # if a graph with the same file_id already exists, update it in place
+        # so its share link stays valid; the table is keyed by share_id, so
+        # look it up through FileIdIndex
+        existing = table.query(
+            IndexName='FileIdIndex',
+            KeyConditionExpression='file_id = :file_id',
+            ExpressionAttributeValues={':file_id': file_id}
+        )['Items']
+        if existing:
+            # Keep its identity, not a progress record's or error's status
+            item = {k: v for k, v in existing[0].items()
+                    if k in ('share_id', 'file_id', 'file_name', 'created_at', 'view_count')}
+            item['expires_at'] = expires_at
         else:
-            # Create new item
-            table.put_item(
-                Item={
-                    'share_id': share_id,
-                    'file_id': file_id,
-                    'graph_data': graph_data,
-                    'created_at': datetime.now().isoformat(),
-                    'expires_at': expires_at,
-                    'view_count': 0
-                }
-            )
+            item = {
+                'share_id': str(uuid.uuid4()),
+                'file_id': file_id,
+                'created_at': datetime.now().isoformat(),
+                'expires_at': expires_at,
+                'view_count': 0
+            }
+        share_id = item['share_id']
+        graph_store.save_graph(table, item, graph_data, s3=s3, bucket=GRAPH_BUCKET)
         
         # Generate shareable URL
         # Build API Gateway URL dynamically from the event context
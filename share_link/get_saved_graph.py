@@ -2,57 +2,197 @@
 import json
 import boto3
 import os
-from decimal import Decimal
+import time
+import base64
+import graph_codec
+import graph_store
+import instrumentation
+import response_cache
 
 dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
 table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
+# Same key as FileIdIndex but projecting only these attributes, so a poll
+# reads (and pays for) a few hundred bytes instead of the whole item
+STATUS_INDEX = 'FileStatusIndex'
+STATUS_ATTRIBUTES = ('share_id, file_id, #status, file_name, created_at, view_count, graph_version, error_message, '
+                     '#stage, pages_done, chunks_done, chunks_total, eta_seconds, updated_at')
+PROGRESS_ATTRIBUTES = ('stage', 'pages_done', 'chunks_done', 'chunks_total', 'eta_seconds', 'updated_at')
+# Which item of a file to serve when it has several
+STATUS_PRIORITY = {'completed': 0, 'processing': 1, 'error': 2}
+# Long polls (?wait=N) stay well inside API Gateway's 29 second limit
+MAX_WAIT_SECONDS = float(os.environ.get('LONG_POLL_MAX_SECONDS', '20'))
+POLL_INITIAL_SECONDS = 0.25
+POLL_MAX_SECONDS = 2.0
+# Retry-After bounds for files still processing
+MIN_RETRY_SECONDS = 2
+MAX_RETRY_SECONDS = 30
 
-def decimal_default(obj):
-    """JSON serializer for objects not serializable by default json code"""
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    raise TypeError
+def find_status(file_id):
+    """
+    The status attributes of the file's item, or None if there is none yet.
+    A completed item wins over a progress record, which wins over an
+    error; among equals the newest wins.
+    """
+    items = table.query(
+        IndexName=STATUS_INDEX,
+        KeyConditionExpression='file_id = :file_id',
+        ExpressionAttributeValues={':file_id': file_id},
+        ProjectionExpression=STATUS_ATTRIBUTES,
+        ExpressionAttributeNames={'#status': 'status', '#stage': 'stage'}
+    )['Items']
+    items = sorted(items, key=lambda item: item.get('created_at', ''), reverse=True)
+    return min(items, key=lambda item: STATUS_PRIORITY.get(item.get('status', 'completed'), 0), default=None)
 
+def progress_of(item):
+    """The progress fields of a progress record, with numbers as ints."""
+    return {k: int(item[k]) if k not in ('stage', 'updated_at') else item[k]
+            for k in PROGRESS_ATTRIBUTES if k in item}
+
+def retry_after(item):
+    """Seconds a client should wait before polling a file that is still processing."""
+    eta = item.get('eta_seconds') if item else None
+    if eta is None:
+        return 5
+    return max(MIN_RETRY_SECONDS, min(MAX_RETRY_SECONDS, int(eta) // 2))
+
+def response_tag(item, view):
+    """ETag of the response for `item` in `view` ("status", "json" or "compact")."""
+    version = item.get('graph_version') or response_cache.LEGACY_VERSION
+    if view == 'status':
+        if item.get('status') == 'processing':
+            version = '-'.join(str(item.get(k, '')) for k in ('stage', 'pages_done', 'chunks_done'))
+        return response_cache.etag(f"{item.get('status', 'completed')}-{version}", view)
+    return response_cache.etag(version, view)
+
+def wait_seconds(event, context):
+    """The requested long-poll time, capped by MAX_WAIT_SECONDS and the time left."""
+    params = event.get('queryStringParameters') or {}
+    try:
+        wait = min(max(float(params.get('wait') or 0), 0), MAX_WAIT_SECONDS)
+    except ValueError:
+        wait = 0
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        # Keep time to load and send the graph once it appears
+        wait = min(wait, context.get_remaining_time_in_millis() / 1000 - 5)
+    return max(wait, 0)
+
+def poll_status(event, file_id, view, wait):
+    """
+    Query the status index until the file has an item whose response
+    differs from the client's If-None-Match, backing off from
+    POLL_INITIAL_SECONDS to POLL_MAX_SECONDS between queries. Progress
+    changes only end the wait for the status view; the graph views wait
+    for the final item.
+
+    Returns:
+        dict: The status attributes as of the last query (None if there is
+        still no item) once they changed or `wait` seconds have passed.
+    """
+    deadline = time.monotonic() + wait
+    delay = POLL_INITIAL_SECONDS
+    while True:
+        item = find_status(file_id)
+        ready = item is not None and (view == 'status' or item.get('status') != 'processing')
+        if ready and not response_cache.not_modified(event, response_tag(item, view)):
+            return item
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return item
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, POLL_MAX_SECONDS)
+
+@instrumentation.instrument('GetSavedGraphFunction')
 def handler(event, context):
     try:
         file_id = event['pathParameters']['file_id']
-        
-        # Query using the Global Secondary Index (FileIdIndex) instead of get_item
-        response = table.query(
-            IndexName='FileIdIndex',
-            KeyConditionExpression='file_id = :file_id',
-            ExpressionAttributeValues={':file_id': file_id}
-        )
-
-        if not response['Items']:
+        params = event.get('queryStringParameters') or {}
+        if params.get('status_only') in ('1', 'true'):
+            view = 'status'
+        else:
+            view = 'compact' if graph_codec.accepts_compact(event) else 'json'
+
+        item = poll_status(event, file_id, view, wait_seconds(event, context))
+
+        if item is None or (item.get('status') == 'processing' and view != 'status'):
+            body = {"status": "Processing", "message": "Graph not found or being processed. Please try again in a few moments."}
+            if item is not None:
+                body["progress"] = progress_of(item)
             return {
                 "statusCode": 404,
                 "headers": {
+                    "Retry-After": str(retry_after(item)),
+                    "Access-Control-Expose-Headers": "Retry-After",
                     "Access-Control-Allow-Origin": "*"
                 },
-                "body": json.dumps({"status": "Processing", "message": "Graph not found or being processed. Please try again in a few moments."})
+                "body": json.dumps(body)
             }
 
-        item = response['Items'][0]
-        
-        # Convert the response data, handling Decimals
+        if item.get('status') == 'error' and view != 'status':
+            return {
+                "statusCode": 422,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*"
+                },
+                "body": json.dumps({"status": "error", "error": item.get('error_message', 'Processing failed')})
+            }
+
+        version = item.get('graph_version') or response_cache.LEGACY_VERSION
+        tag = response_tag(item, view)
+        cache_headers = {
+            "ETag": tag,
+            "Cache-Control": response_cache.CACHE_CONTROL,
+            "Access-Control-Expose-Headers": "ETag, X-Graph-Metadata",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+            "Access-Control-Allow-Methods": "GET, OPTIONS"
+        }
+        if response_cache.not_modified(event, tag):
+            return {"statusCode": 304, "headers": cache_headers, "body": ""}
+
+        if view == 'status':
+            status = {"status": item.get('status', 'completed'), "file_id": file_id, "graph_version": version}
+            if item.get('error_message'):
+                status["error"] = item['error_message']
+            if item.get('status') == 'processing':
+                status["progress"] = progress_of(item)
+                cache_headers["Retry-After"] = str(retry_after(item))
+                cache_headers["Access-Control-Expose-Headers"] += ", Retry-After"
+            return {"statusCode": 200, "headers": cache_headers, "body": json.dumps(status)}
+
+        def load():
+            stored = table.get_item(Key={'share_id': item['share_id']})['Item']
+            if view == 'compact':
+                return {}, graph_store.load_graph_compact(table, stored, s3)
+            return {}, graph_store.load_graph_json(table, stored, s3)
+
+        # The graph body is cached per graph_version; the fields come from the query
+        _, body = response_cache.cached_graph(('file', file_id, version, view), load)
         response_data = {
             "status": "completed",
-            "graph_data": item['graph_data'],
             "file_id": item['file_id'],
             "file_name": item.get('file_name', 'unknown'),
             "created_at": item['created_at'],
             "view_count": int(item.get('view_count', 0)) + 1  # Convert to int and add 1
         }
         
+        if view == 'compact':
+            # Binary graph_codec body; the other fields travel in a header
+            return {
+                "statusCode": 200,
+                "headers": dict(cache_headers, **{
+                    "Content-Type": graph_codec.MEDIA_TYPE,
+                    "X-Graph-Metadata": json.dumps(response_data, default=graph_store.decimal_default)
+                }),
+                "body": base64.b64encode(body).decode('ascii'),
+                "isBase64Encoded": True
+            }
+
         return {
             "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "GET, OPTIONS"
-            },
-            "body": json.dumps(response_data, default=decimal_default)
+            "headers": cache_headers,
+            # The graph is spliced in as stored rather than parsed and re-serialized
+            "body": graph_store.json_with_graph(response_data, body)
         }
         
     except Exception as e:
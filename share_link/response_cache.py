@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Per-container cache of graph response bodies. Entries are keyed by the
+# item's graph_version, which graph_store.save_graph changes on every save,
+# so a graph rewritten by generate_share_link is never served from any
+# container's cache; the TTL only bounds how long unused entries linger.
+MAX_BYTES = int(os.environ.get('GRAPH_RESPONSE_CACHE_BYTES', str(64 * 1024 * 1024)))
+TTL_SECONDS = float(os.environ.get('GRAPH_RESPONSE_CACHE_TTL', '300'))
+# "no-cache" lets browsers and CDNs keep a copy but revalidate it with
+# If-None-Match, so every view still reaches the handler (and is counted)
+# while the graph itself is only sent when it changed. Set e.g.
+# "public, max-age=60" to let a CDN answer repeat views without Lambda.
+CACHE_CONTROL = os.environ.get('GRAPH_CACHE_CONTROL', 'public, no-cache')
+# Items written before graph_store have no graph_version; they are never
+# rewritten in place, so one constant version is enough
+LEGACY_VERSION = 'legacy'
+
+class ResponseCache:
+    """
+    TTL + LRU cache bounded by the total size of its values. Values larger
+    than a quarter of the budget are not cached, so one huge graph cannot
+    flush everything else.
+    """
+
+    def __init__(self, max_bytes=None, ttl_seconds=None):
+        self.max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl_seconds = TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.entries = OrderedDict()  # key -> (value, size, expires at)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+cache = ResponseCache()
+
+def etag(version, fmt):
+    # Weak: the graph is the same, other fields such as view_count may not be
+    return f'W/"{version}-{fmt}"'
+
+def not_modified(event, tag):
+    """True if the request's If-None-Match header already names `tag`."""
+    headers = {k.lower(): v for k, v in ((event or {}).get('headers') or {}).items()}
+    values = [value.strip() for value in (headers.get('if-none-match') or '').split(',')]
+    return '*' in values or tag.removeprefix('W/') in [value.removeprefix('W/') for value in values]
+
+def cached_graph(key, load):
+    """
+    The cached (fields, body) for `key`, or what `load()` returns, which is
+    cached. body is the graph as JSON text or graph_codec bytes.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        entry = load()
+        cache.put(key, entry, len(entry[1]))
+    return entry
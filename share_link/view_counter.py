@@ -0,0 +1,223 @@
+import os
+import random
+import threading
+import time
+
+# "atomic": one conditional update_item per view that also returns the item.
+# "buffered": views are counted in-process and flushed as one ADD per share
+#   by the first request after VIEW_COUNT_FLUSH_SECONDS (or once
+#   VIEW_COUNT_FLUSH_THRESHOLD views are pending).
+# "sharded": buffered the same way, but flushed to one of VIEW_COUNT_SHARDS
+#   small counter items, so a viral link never rewrites its graph item.
+# Both read the graph item's header at most once per flush interval.
+# Updating an item costs write units for its whole size, graph included,
+# so the last two modes are also much cheaper for large inline graphs.
+VIEW_COUNT_MODE = os.environ.get('VIEW_COUNT_MODE', 'atomic')
+FLUSH_SECONDS = float(os.environ.get('VIEW_COUNT_FLUSH_SECONDS', '10'))
+FLUSH_THRESHOLD = int(os.environ.get('VIEW_COUNT_FLUSH_THRESHOLD', '100'))
+SHARDS = int(os.environ.get('VIEW_COUNT_SHARDS', '10'))
+
+def is_conditional_check_failure(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ConditionalCheckFailedException' or type(error).__name__ == 'ConditionalCheckFailedException'
+
+# What the counters read: enough to count the view and find the cached
+# response; the graph itself is only read on a response cache miss
+HEADER_ATTRIBUTES = 'share_id, view_count, graph_version, expires_at'
+
+def counter_key(share_id, shard):
+    # Like graph shards, counter items have no file_id and stay out of FileIdIndex
+    return f"{share_id}#views#{shard}"
+
+def record_view_atomic(table, share_id):
+    """
+    Count a view and read its graph_version in one round trip. Naming
+    graph_version in the update makes UPDATED_NEW return it without
+    sending the (possibly large) graph back.
+
+    Returns:
+        dict: view_count and graph_version, or None if the item doesn't exist.
+    """
+    try:
+        return table.update_item(
+            Key={'share_id': share_id},
+            UpdateExpression='ADD view_count :one SET graph_version = if_not_exists(graph_version, :legacy)',
+            ConditionExpression='attribute_exists(share_id)',
+            ExpressionAttributeValues={':one': 1, ':legacy': 'legacy'},
+            ReturnValues='UPDATED_NEW'
+        )['Attributes']
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return None
+        raise
+
+class BufferedCounter:
+    """
+    Aggregates views in the container and writes them as one ADD per share
+    per flush. Flushes only happen inline, when a view arrives after
+    `flush_seconds` or once `flush_threshold` views are pending; there is no
+    timer, so a container that stops getting requests keeps its views until
+    the next one. Reported counts include this container's unflushed views
+    but not other containers'; views not yet flushed when a container is
+    recycled are lost, so counts are approximate.
+
+    The item's header (HEADER_ATTRIBUTES) is read at most every
+    `flush_seconds` per share, so a view usually makes no request at all.
+    A graph rewritten or expired meanwhile is noticed that much later.
+    """
+
+    def __init__(self, table, flush_seconds=None, flush_threshold=None):
+        self.table = table
+        self.flush_seconds = FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.flush_threshold = FLUSH_THRESHOLD if flush_threshold is None else flush_threshold
+        self.pending = {}
+        self.headers = {}  # share_id -> [header item, read at]
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def header(self, share_id):
+        """A copy of the item's header attributes, or None if there is no such share."""
+        with self._lock:
+            cached = self.headers.get(share_id)
+            if cached and time.monotonic() - cached[1] < self.flush_seconds:
+                return dict(cached[0])
+        item = self.table.get_item(Key={'share_id': share_id},
+                                   ProjectionExpression=HEADER_ATTRIBUTES).get('Item')
+        with self._lock:
+            if item is None:
+                self.headers.pop(share_id, None)
+                return None
+            self.headers[share_id] = [item, time.monotonic()]
+            return dict(item)
+
+    def record_view(self, share_id):
+        item = self.header(share_id)
+        if item is None:
+            return None
+        with self._lock:
+            pending = self.pending[share_id] = self.pending.get(share_id, 0) + 1
+            due = (sum(self.pending.values()) >= self.flush_threshold
+                   or time.monotonic() - self.last_flush >= self.flush_seconds)
+        item['view_count'] = self.count(share_id, item, pending)
+        if due:
+            self.flush()
+        return item
+
+    def count(self, share_id, item, pending):
+        """The view count to report: the stored count plus this container's pending views."""
+        return int(item.get('view_count', 0)) + pending
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        for share_id, views in pending.items():
+            try:
+                self.write(share_id, views)
+            except Exception as e:
+                if is_conditional_check_failure(e):
+                    continue  # expired or deleted since it was viewed
+                print(f"Warning: Failed to flush {views} views for {share_id}: {str(e)}")
+                with self._lock:
+                    self.pending[share_id] = self.pending.get(share_id, 0) + views
+                continue
+            self.flushed(share_id, views)
+
+    def write(self, share_id, views):
+        self.table.update_item(
+            Key={'share_id': share_id},
+            UpdateExpression='ADD view_count :views',
+            ConditionExpression='attribute_exists(share_id)',
+            ExpressionAttributeValues={':views': views}
+        )
+
+    def flushed(self, share_id, views):
+        # The cached header's count now includes them
+        with self._lock:
+            cached = self.headers.get(share_id)
+            if cached:
+                cached[0]['view_count'] = int(cached[0].get('view_count', 0)) + views
+
+class ShardedCounter(BufferedCounter):
+    """
+    Buffers views like BufferedCounter, but flushes each share's views as
+    one ADD to one of SHARDS small counter items instead of the graph
+    item, which is never rewritten. The total is the graph item's
+    view_count plus the shards, which are summed with one batch_get_item at
+    most every `flush_seconds` per container.
+    """
+
+    def __init__(self, table, shards=None, flush_seconds=None, flush_threshold=None):
+        super().__init__(table, flush_seconds=flush_seconds, flush_threshold=flush_threshold)
+        self.shards = shards or SHARDS
+        self.totals = {}  # share_id -> [shard total, fetched at]
+
+    def count(self, share_id, item, pending):
+        return int(item.get('view_count', 0)) + self.total(share_id) + pending
+
+    def write(self, share_id, views):
+        update = {
+            'Key': {'share_id': counter_key(share_id, random.randrange(self.shards))},
+            'UpdateExpression': 'ADD view_count :views',
+            'ExpressionAttributeValues': {':views': views}
+        }
+        with self._lock:
+            cached = self.headers.get(share_id)
+        if cached and 'expires_at' in cached[0]:
+            update['UpdateExpression'] += ' SET expires_at = :expires'
+            update['ExpressionAttributeValues'][':expires'] = cached[0]['expires_at']
+        self.table.update_item(**update)
+
+    def flushed(self, share_id, views):
+        with self._lock:
+            cached = self.totals.get(share_id)
+            if cached:
+                cached[0] += views
+
+    def total(self, share_id):
+        """Shard total as of the last refresh plus this container's views flushed since."""
+        with self._lock:
+            cached = self.totals.get(share_id)
+            if cached and time.monotonic() - cached[1] < self.flush_seconds:
+                return cached[0]
+        total = self._read_shards(share_id)
+        with self._lock:
+            self.totals[share_id] = [total, time.monotonic()]
+        return total
+
+    def _read_shards(self, share_id):
+        client = self.table.meta.client
+        request = {self.table.name: {
+            'Keys': [{'share_id': {'S': counter_key(share_id, shard)}} for shard in range(self.shards)]
+        }}
+        total = 0
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for shard in response.get('Responses', {}).get(self.table.name, []):
+                total += int(shard.get('view_count', {}).get('N', '0'))
+            request = response.get('UnprocessedKeys') or None
+        return total
+
+_counters = {}
+
+def record_view(table, share_id, mode=None):
+    """
+    Count a view of `share_id` using VIEW_COUNT_MODE (or `mode`).
+
+    Returns:
+        dict: The item's view_count (including this view) and graph_version,
+        without the graph, or None if there is no such share.
+    """
+    mode = mode or VIEW_COUNT_MODE
+    if mode == 'atomic':
+        return record_view_atomic(table, share_id)
+    counter = _counters.get((mode, id(table)))
+    if counter is None:
+        if mode == 'buffered':
+            counter = BufferedCounter(table)
+        elif mode == 'sharded':
+            counter = ShardedCounter(table)
+        else:
+            raise ValueError(f"Unknown VIEW_COUNT_MODE: {mode}")
+        _counters[(mode, id(table))] = counter
+    return counter.record_view(share_id)
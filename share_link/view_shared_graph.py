@@ -2,25 +2,28 @@
 import json
 import boto3
 import os
-from decimal import Decimal
+import base64
+import graph_codec
+import graph_store
+import instrumentation
+import response_cache
+import view_counter
 
 dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
 table = dynamodb.Table(os.environ['GRAPH_CACHE_TABLE'])
 
-def decimal_default(obj):
-    """JSON serializer for objects not serializable by default json code"""
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    raise TypeError
-
+@instrumentation.instrument('ViewSharedGraphFunction')
 def handler(event, context):
     try:
         share_id = event['pathParameters']['share_id']
         
-        # Get from DynamoDB
-        response = table.get_item(Key={'share_id': share_id})
+        # Count the view and read the item's graph_version in one step (see
+        # view_counter); the graph itself comes from the response cache.
+        # Ids with "#" name graph shards and counters, never shares.
+        item = None if '#' in share_id else view_counter.record_view(table, share_id)
         
-        if 'Item' not in response:
+        if item is None:
             return {
                 "statusCode": 404,
                 "headers": {
@@ -29,31 +32,50 @@ def handler(event, context):
                 "body": json.dumps({"error": "Graph not found or expired"})
             }
         
-        item = response['Item']
-        
-        # Increment view count
-        table.update_item(
-            Key={'share_id': share_id},
-            UpdateExpression='ADD view_count :val',
-            ExpressionAttributeValues={':val': 1}
-        )
-        
-        # Convert the response data, handling Decimals
-        response_data = {
-            "graph_data": item['graph_data'],
-            "file_id": item['file_id'],
-            "created_at": item['created_at'],
-            "view_count": int(item.get('view_count', 0)) + 1  # Convert to int and add 1
+        fmt = 'compact' if graph_codec.accepts_compact(event) else 'json'
+        version = item.get('graph_version') or response_cache.LEGACY_VERSION
+        tag = response_cache.etag(version, fmt)
+        cache_headers = {
+            "ETag": tag,
+            "Cache-Control": response_cache.CACHE_CONTROL,
+            "Access-Control-Expose-Headers": "ETag, X-Graph-Metadata",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+            "Access-Control-Allow-Methods": "GET, OPTIONS"
         }
-        
+        if response_cache.not_modified(event, tag):
+            # The view was counted above; the client already has the graph
+            return {"statusCode": 304, "headers": cache_headers, "body": ""}
+
+        def load():
+            stored = table.get_item(Key={'share_id': share_id})['Item']
+            fields = {"file_id": stored['file_id'], "created_at": stored['created_at']}
+            if fmt == 'compact':
+                return fields, graph_store.load_graph_compact(table, stored, s3)
+            return fields, graph_store.load_graph_json(table, stored, s3)
+
+        # The graph body is cached per graph_version; only view_count is per request
+        fields, body = response_cache.cached_graph(
+            ('share', share_id, version, fmt), load)
+        response_data = dict(fields, view_count=int(item.get('view_count', 0)))  # Includes this view
+
+        if fmt == 'compact':
+            # Binary graph_codec body; the other fields travel in a header
+            return {
+                "statusCode": 200,
+                "headers": dict(cache_headers, **{
+                    "Content-Type": graph_codec.MEDIA_TYPE,
+                    "X-Graph-Metadata": json.dumps(response_data, default=graph_store.decimal_default)
+                }),
+                "body": base64.b64encode(body).decode('ascii'),
+                "isBase64Encoded": True
+            }
+
         return {
             "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "GET, OPTIONS"
-            },
-            "body": json.dumps(response_data, default=decimal_default)
+            "headers": cache_headers,
+            # The graph is spliced in as stored rather than parsed and re-serialized
+            "body": graph_store.json_with_graph(response_data, body)
         }
         
     except Exception as e:
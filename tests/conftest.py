@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lambda code is deployed with each CodeUri as the import root, so mirror that here
+# and put the shared layer's python/ directory on the path as Lambda does
+for path in (ROOT, os.path.join(ROOT, "common_layer", "python"),
+             os.path.join(ROOT, "main_app"), os.path.join(ROOT, "share_link")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GRAPH_CACHE_TABLE", "test-graph-cache")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "fake_llm(**settings): FakeGraphTransformer settings for the fake_llm fixture")
+
+
+@pytest.fixture()
+def fake_llm(request, monkeypatch):
+    """
+    Route knowledge_graph's extraction to a FakeGraphTransformer, with an
+    empty in-process chunk cache and no extraction in flight. Settings come
+    from a fake_llm marker on the test or in pytestmark, e.g.
+    @pytest.mark.fake_llm(latency=0.02): cache=False leaves out the chunk
+    cache, and the rest are FakeGraphTransformer arguments.
+    """
+    import chunk_cache
+    import knowledge_graph
+    import single_flight
+    from benchmarks.standins import FakeGraphTransformer
+
+    marker = request.node.get_closest_marker("fake_llm")
+    settings = {"latency": 0, "cache": True, **(marker.kwargs if marker else {})}
+    cache = settings.pop("cache")
+    transformer = FakeGraphTransformer(**settings)
+    monkeypatch.setattr(knowledge_graph, "get_llm", lambda: (None, transformer))
+    monkeypatch.setattr(knowledge_graph, "extraction_cache",
+                        chunk_cache.ChunkCache([chunk_cache.MemoryBackend()] if cache else []))
+    monkeypatch.setattr(knowledge_graph, "extraction_flights", single_flight.SingleFlight())
+    return transformer
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import app
+
+# Slow enough for concurrent items to overlap
+pytestmark = pytest.mark.fake_llm(latency=0.02)
+
+
+def post(body):
+    ret = app.lambda_handler({"body": json.dumps(body)}, None)
+    return ret["statusCode"], json.loads(ret["body"])
+
+
+def test_items_get_their_own_graphs_in_order(fake_llm):
+    status, body = post({"items": [
+        {"id": "a", "text": "Ada Lovelace met Charles Babbage."},
+        {"id": "b", "text": "Grace Hopper joined Harvard University."},
+        {"id": "empty", "text": "  "},
+        {"id": "again", "text": "Ada Lovelace met Charles Babbage."},
+    ]})
+
+    assert status == 200
+    assert [item["id"] for item in body["items"]] == ["a", "b", "empty", "again"]
+    a, b, empty, again = body["items"]
+    assert {node["id"] for node in a["nodes"]} == {"Ada Lovelace", "Charles Babbage"}
+    assert {node["id"] for node in b["nodes"]} == {"Grace Hopper", "Harvard University"}
+    assert empty == {"id": "empty", "error": "No text provided"}
+    # The repeated text was extracted once
+    assert again["nodes"] == a["nodes"] and fake_llm.calls == 2
+    assert body["metadata"]["items"] == 4 and body["metadata"]["failed"] == 1
+    assert body["metadata"]["chunks"] == 2 and body["metadata"]["cache"]["misses"] == 2
+
+
+def test_items_share_one_concurrency_limit(fake_llm, monkeypatch):
+    # Batches have their own limit, not the one for a single text's chunks
+    monkeypatch.setattr(app.knowledge_graph.kg_extraction, "MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(app, "BATCH_MAX_CONCURRENCY", 3)
+    items = [{"id": str(i), "text": f"Person Number{i} met Grace Hopper."} for i in range(12)]
+
+    status, body = post({"items": items})
+
+    assert status == 200 and body["metadata"]["succeeded"] == 12
+    assert fake_llm.max_in_flight == 3
+
+
+def test_a_failing_item_does_not_fail_the_batch(fake_llm, monkeypatch):
+    convert = fake_llm.aconvert_to_graph_documents
+
+    async def flaky(documents, config=None):
+        if "Broken" in documents[0].page_content:
+            raise ValueError("model returned garbage")
+        if "Silent" in documents[0].page_content:
+            raise RuntimeError()
+        return await convert(documents, config)
+
+    monkeypatch.setattr(fake_llm, "aconvert_to_graph_documents", flaky)
+    monkeypatch.setattr(app.knowledge_graph.kg_extraction, "MAX_RETRIES", 0)
+
+    status, body = post({"items": [{"id": "ok", "text": "Ada Lovelace met Charles Babbage."},
+                                   {"id": "bad", "text": "Broken Text here."},
+                                   {"id": "silent", "text": "Silent Failure here."}]})
+
+    assert status == 200
+    assert body["items"][0]["nodes"] and body["items"][1] == {"id": "bad", "error": "model returned garbage"}
+    # An exception without a message is reported by its type
+    assert body["items"][2] == {"id": "silent", "error": "RuntimeError"}
+    assert body["metadata"]["failed"] == 2
+
+
+class Context:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_items_still_running_at_the_deadline_time_out(fake_llm, monkeypatch):
+    convert = fake_llm.aconvert_to_graph_documents
+
+    async def slow(documents, config=None):
+        if "Slow" in documents[0].page_content:
+            await asyncio.sleep(5)
+        return await convert(documents, config)
+
+    monkeypatch.setattr(fake_llm, "aconvert_to_graph_documents", slow)
+    items = [{"id": "fast", "text": "Ada Lovelace met Charles Babbage."}, {"id": "slow", "text": "Slow Text here."}]
+
+    started = time.monotonic()
+    # 1.3 s left in the invocation, less a second to respond
+    ret = app.lambda_handler({"body": json.dumps({"items": items})}, Context(1300))
+    body = json.loads(ret["body"])
+
+    assert ret["statusCode"] == 200 and time.monotonic() - started < 2
+    assert body["items"][0]["nodes"]
+    assert body["items"][1]["id"] == "slow" and "did not finish" in body["items"][1]["error"]
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"items": []}, "non-empty list"),
+    ({"items": "Ada"}, "non-empty list"),
+    ({"items": [{"text": "Ada"}]}, "string id"),
+    ({"items": [{"id": "a", "text": "x"}, {"id": "a", "text": "y"}]}, "Duplicate item id: a"),
+    ({"items": [{"id": str(i), "text": "x"} for i in range(26)]}, "at most 25 items"),
+    ({"items": [{"id": "a", "text": "x"}], "chunk_tokens": 0}, "chunk_tokens"),
+])
+def test_invalid_batches_are_rejected(fake_llm, body, error):
+    status, response = post(body)
+
+    assert status == 400 and error in response["error"]
+    assert fake_llm.calls == 0
+
+
+def test_deadline_is_api_gateways_timeout_for_api_requests():
+    now = time.monotonic()
+
+    assert app.request_deadline({"body": "{}"}, None) is None
+    assert app.request_deadline({"body": "{}"}, Context(600_000)) == pytest.approx(now + 599, abs=1)
+    assert app.request_deadline({"body": "{}", "requestContext": {}}, Context(600_000)) == pytest.approx(now + 29, abs=1)
+    assert app.request_deadline({"body": "{}", "requestContext": {}}, Context(5000)) == pytest.approx(now + 4, abs=1)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import chunk_cache
+import kg_extraction
+from benchmarks.standins import FakeGraphTransformer
+
+
+def test_cache_key_depends_on_text_model_and_config():
+    config = {"allowed_nodes": []}
+    key = chunk_cache.chunk_cache_key("Ada Lovelace", "gpt-4-turbo", config)
+
+    assert key == chunk_cache.chunk_cache_key("Ada Lovelace", "gpt-4-turbo", {"allowed_nodes": []})
+    assert key != chunk_cache.chunk_cache_key("Ada Lovelace.", "gpt-4-turbo", config)
+    assert key != chunk_cache.chunk_cache_key("Ada Lovelace", "gpt-4o", config)
+    assert key != chunk_cache.chunk_cache_key("Ada Lovelace", "gpt-4-turbo", {"allowed_nodes": ["Person"]})
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = chunk_cache.MemoryBackend(max_entries=2)
+    backend.put_many({"a": 1, "b": 2})
+    backend.get_many(["a"])
+    backend.put_many({"c": 3})
+
+    assert backend.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+
+def test_slower_tier_hits_are_promoted(tmp_path):
+    memory = chunk_cache.MemoryBackend()
+    disk = chunk_cache.DiskBackend(str(tmp_path))
+    disk.put_many({"k": {"nodes": [], "relationships": []}})
+    cache = chunk_cache.ChunkCache([memory, disk])
+
+    assert cache.get_many(["k", "missing"]) == {"k": {"nodes": [], "relationships": []}}
+    assert memory.get_many(["k"]) == {"k": {"nodes": [], "relationships": []}}
+
+
+def test_disk_backend_prunes_least_recently_used_files(tmp_path):
+    value = {"nodes": ["x" * 80], "relationships": []}
+    disk = chunk_cache.DiskBackend(str(tmp_path), max_bytes=1000)
+    for i in range(8):
+        disk.put_many({f"k{i}": value})
+        # mtimes a second apart, as files written over a container's life
+        os.utime(tmp_path / f"k{i}.json", (i, i))
+    disk.get_many(["k0"])
+
+    disk.put_many({"k8": value, "k9": value, "k10": value})
+
+    files = sorted(path.stem for path in tmp_path.iterdir())
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 750
+    # Read just now, so kept; the oldest untouched ones went first
+    assert "k0" in files and "k1" not in files and "k10" in files
+    assert disk.bytes == sum(path.stat().st_size for path in tmp_path.iterdir())
+
+
+def test_backend_failures_are_misses():
+    class Broken:
+        name = "broken"
+
+        def get_many(self, keys):
+            raise RuntimeError("throttled")
+
+        def put_many(self, values):
+            raise RuntimeError("throttled")
+
+    cache = chunk_cache.ChunkCache([Broken()])
+    cache.put_many({"k": 1})
+    assert cache.get_many(["k"]) == {}
+
+
+def test_only_changed_chunks_reach_the_llm():
+    cache = chunk_cache.ChunkCache([chunk_cache.MemoryBackend()])
+    original = ["Ada Lovelace met Charles Babbage.", "Alan Turing met Alonzo Church."]
+    edited = ["Ada Lovelace met Charles Babbage.", "Alan Turing met John Neumann."]
+
+    asyncio.run(kg_extraction.extract_chunks(FakeGraphTransformer(latency=0), original, cache=cache, model_name="m"))
+    transformer = FakeGraphTransformer(latency=0)
+    stats = {}
+    results = asyncio.run(kg_extraction.extract_chunks(transformer, edited, cache=cache, model_name="m", stats=stats))
+
+    assert transformer.calls == 1
+    assert stats == {"chunks": 2, "cache_hits": 1, "cache_misses": 1, "chunks_total": 2}
+    assert [n["id"] for n in results[0][0]] == ["Ada Lovelace", "Charles Babbage"]
+    assert [n["id"] for n in results[1][0]] == ["Alan Turing", "John Neumann"]
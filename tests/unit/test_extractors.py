@@ -0,0 +1,94 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+import extractors
+
+TESTS = os.path.dirname(os.path.dirname(__file__))
+
+
+def docx(*paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+                                              f'wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>')
+    return data.getvalue()
+
+
+def read(name):
+    with open(os.path.join(TESTS, name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("content_type, file_name, expected", [
+    # The bytes win over a wrong or missing content type and name
+    (None, "upload.bin", "pdf"),
+    ("text/plain", "resume.txt", "pdf"),
+])
+def test_pdfs_are_sniffed(content_type, file_name, expected):
+    assert extractors.detect_format(read("test-resume.pdf"), content_type, file_name) == expected
+
+
+@pytest.mark.parametrize("data, content_type, file_name, expected", [
+    (b"<!DOCTYPE html><html><body>Hi</body></html>", "application/octet-stream", "page", "html"),
+    (b"# Notes", "text/markdown", "notes", "markdown"),
+    (b"# Notes", None, "notes.md", "markdown"),
+    (b"Ada met Babbage.", "text/plain", "a", "text"),
+    (b"Ada met Babbage.", None, "notes", "text"),
+    (b"Ada met Babbage.", "text/csv", "people.csv", "text"),
+])
+def test_other_formats_by_type_or_extension(data, content_type, file_name, expected):
+    assert extractors.detect_format(data, content_type, file_name) == expected
+
+
+def test_docx_is_sniffed():
+    assert extractors.detect_format(docx("x"), "application/octet-stream", "upload") == "docx"
+
+
+@pytest.mark.parametrize("data, content_type, file_name", [
+    (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", "image/png", "photo.png"),
+    (b"\x00\x01\x02binary", None, "blob"),
+])
+def test_unsupported_files_are_refused(data, content_type, file_name):
+    with pytest.raises(extractors.UnsupportedFormatError):
+        extractors.extract_text(data, content_type, file_name)
+
+
+def test_zips_that_are_not_docx_are_refused():
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("notes.txt", "hello")
+    with pytest.raises(extractors.UnsupportedFormatError):
+        extractors.extract_text(data.getvalue(), "application/zip", "notes.docx")
+
+
+def test_html_keeps_text_and_drops_scripts_and_styles():
+    text = extractors.extract_text(read("test.html"), "text/html", "test.html")
+
+    assert text.startswith("Text-to-Knowledge Graph API Tester\n")
+    assert "Test if the API is running and accessible with your API key." in text
+    assert "font-family" not in text and "function" not in text
+
+
+def test_markdown_syntax_is_removed():
+    markdown = (b"# Ada Lovelace\n\nShe worked with **Charles Babbage** on the "
+                b"[Analytical Engine](https://example.com).\n\n- first program\n- `notes`\n")
+
+    assert extractors.extract_text(markdown, None, "ada.md") == (
+        "Ada Lovelace\n\nShe worked with Charles Babbage on the Analytical Engine.\n\nfirst program\nnotes\n")
+
+
+def test_docx_paragraphs_from_bytes_or_files():
+    data = docx("Ada Lovelace met Charles Babbage.", "They corresponded for years.")
+
+    assert extractors.extract_text(data) == "Ada Lovelace met Charles Babbage.\nThey corresponded for years."
+    assert extractors.extract_text(io.BytesIO(data)) == extractors.extract_text(data)
+
+
+def test_text_encodings():
+    assert extractors.extract_text("\ufeffCafé".encode("utf-8"), "text/plain") == "Café"
+    assert extractors.extract_text("Café".encode("utf-16"), "text/plain") == "Café"
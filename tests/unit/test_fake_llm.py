@@ -0,0 +1,39 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+import fake_llm
+import kg_extraction
+
+
+def test_draws_repeat_for_a_seed():
+    first = fake_llm.FakeChatModel(seed=3, error_rate=0.3)
+    second = fake_llm.FakeChatModel(seed=3, error_rate=0.3)
+
+    assert [first.draw() for _ in range(20)] == [second.draw() for _ in range(20)]
+
+
+@pytest.mark.parametrize("distribution", ["constant", "uniform", "lognormal"])
+def test_latency_distributions_center_on_latency_ms(distribution):
+    model = fake_llm.FakeChatModel(latency_ms=100, latency_distribution=distribution)
+
+    seconds = sorted(model.draw()[0] for _ in range(2001))
+
+    assert seconds[1000] == pytest.approx(0.1, rel=0.1)
+
+
+def test_failed_calls_look_like_rate_limits():
+    model = fake_llm.FakeChatModel(latency_ms=0, error_rate=1.0)
+
+    with pytest.raises(fake_llm.FakeAPIError) as error:
+        model.invoke([HumanMessage(content="Ada Lovelace")])
+
+    assert kg_extraction.is_rate_limit_error(error.value)
+
+
+def test_graph_is_read_from_the_prompt_input():
+    prompt = "Tip: Use the given format to extract information from the following input: Ada Lovelace met Alan Turing."
+
+    graph = fake_llm.graph_from_text(prompt.rsplit(fake_llm.INPUT_MARKER, 1)[-1])
+
+    assert [n["id"] for n in graph["nodes"]] == ["Ada Lovelace", "Alan Turing"]
+    assert graph["relationships"][0]["type"] == "RELATED_TO"
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+import get_saved_graph
+import graph_store
+import response_cache
+from benchmarks.standins import GRAPH_CACHE_INDEXES, FakeTable
+
+
+@pytest.fixture()
+def table(monkeypatch):
+    table = FakeTable(name="graphs", indexes=GRAPH_CACHE_INDEXES)
+    monkeypatch.setattr(get_saved_graph, "table", table)
+    monkeypatch.setattr(response_cache, "cache", response_cache.ResponseCache())
+    return table
+
+
+@pytest.fixture()
+def sleeps(monkeypatch):
+    clock = {"now": 0.0}
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock["now"] += seconds
+    monkeypatch.setattr(get_saved_graph.time, "sleep", sleep)
+    monkeypatch.setattr(get_saved_graph.time, "monotonic", lambda: clock["now"])
+    return slept
+
+
+def save(table, graph=None):
+    graph_store.save_graph(table, {"share_id": "s1", "file_id": "f1", "status": "completed", "created_at": "now"},
+                           graph or {"nodes": [{"id": "a"}], "edges": []})
+
+
+def get(params=None, headers=None, context=None):
+    return get_saved_graph.handler({"pathParameters": {"file_id": "f1"}, "queryStringParameters": params,
+                                    "headers": headers}, context)
+
+
+def test_status_only_reads_only_the_status_index(table):
+    save(table, {"nodes": [{"id": "x" * 100_000}], "edges": []})
+    reads = table.read_units
+
+    ret = get({"status_only": "true"})
+
+    assert json.loads(ret["body"])["status"] == "completed"
+    assert table.read_units - reads == 0.5
+    assert get({"status_only": "true"}, {"If-None-Match": ret["headers"]["ETag"]})["statusCode"] == 304
+
+
+def test_unchanged_graph_is_not_sent_again(table):
+    save(table)
+    etag = get()["headers"]["ETag"]
+    reads = table.read_units
+
+    assert get(headers={"If-None-Match": etag})["statusCode"] == 304
+    assert table.read_units - reads == 0.5
+
+
+def test_long_poll_returns_when_the_graph_appears(table, sleeps, monkeypatch):
+    def sleep_then_save(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            save(table)
+    monkeypatch.setattr(get_saved_graph.time, "sleep", sleep_then_save)
+
+    ret = get({"wait": "10"})
+
+    assert ret["statusCode"] == 200
+    assert json.loads(ret["body"])["graph_data"] == {"nodes": [{"id": "a"}], "edges": []}
+    assert sleeps == [0.25, 0.5, 1.0]
+
+
+def test_long_poll_gives_up_at_the_deadline(table, sleeps):
+    ret = get({"wait": "600"})
+
+    assert ret["statusCode"] == 404
+    assert sum(sleeps) == get_saved_graph.MAX_WAIT_SECONDS
+    assert max(sleeps) == get_saved_graph.POLL_MAX_SECONDS
+
+
+def test_long_poll_waits_for_a_change_from_if_none_match(table, sleeps):
+    save(table)
+    etag = get()["headers"]["ETag"]
+
+    assert get({"wait": "3"}, {"If-None-Match": etag})["statusCode"] == 304
+    assert sum(sleeps) == 3
+
+
+def test_wait_leaves_time_before_the_function_timeout():
+    context = type("context", (), {"get_remaining_time_in_millis": lambda self: 9000})()
+
+    assert get_saved_graph.wait_seconds({"queryStringParameters": {"wait": "20"}}, context) == 4
+    assert get_saved_graph.wait_seconds({"queryStringParameters": {"wait": "soon"}}, None) == 0
+
+
+def test_progress_record_is_served_with_retry_after(table):
+    table.put_item(Item={"share_id": "s1", "file_id": "f1", "status": "processing", "stage": "build_graph",
+                         "pages_done": 12, "chunks_done": 30, "chunks_total": 40, "eta_seconds": 20,
+                         "created_at": "now"})
+
+    ret = get()
+    status = get({"status_only": "true"})
+
+    assert ret["statusCode"] == 404
+    assert ret["headers"]["Retry-After"] == "10"
+    assert json.loads(ret["body"])["progress"] == {"stage": "build_graph", "pages_done": 12, "chunks_done": 30,
+                                                  "chunks_total": 40, "eta_seconds": 20}
+    assert status["statusCode"] == 200
+    assert json.loads(status["body"])["progress"]["chunks_done"] == 30
+    assert get({"status_only": "true"}, {"If-None-Match": status["headers"]["ETag"]})["statusCode"] == 304
+
+
+def test_completed_item_wins_over_errors(table):
+    table.put_item(Item={"share_id": "e1", "file_id": "f1", "status": "error", "error_message": "boom",
+                         "created_at": "later"})
+
+    assert get()["statusCode"] == 422
+    save(table)
+    assert json.loads(get()["body"])["status"] == "completed"
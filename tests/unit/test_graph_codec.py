@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+import pytest
+
+import graph_codec
+import graph_store
+
+
+def sample_graph():
+    return {
+        "nodes": [
+            {"id": "Ada Lovelace", "type": "Person", "properties": {"born": 1815, "aliases": ["Ada"]}},
+            {"id": "Analytical Engine", "type": "Machine", "properties": {}},
+            {"id": "Ada Lovelace", "type": "Person"},
+            {"id": "London", "type": None, "properties": {"country": "UK"}, "extra": True},
+        ],
+        "edges": [
+            {"source": "Ada Lovelace", "target": "Analytical Engine", "relation": "WROTE_ABOUT", "count": 3},
+            {"source": "Ada Lovelace", "target": "London", "relation": "LIVED_IN", "count": 1,
+             "properties": {"since": "1835"}},
+            {"source": "Charles Babbage", "target": "Analytical Engine", "relation": "DESIGNED", "count": 1},
+        ],
+        "metadata": {"chunks": 2},
+    }
+
+
+@pytest.mark.parametrize("compression", [graph_codec.NONE, graph_codec.GZIP, graph_codec.ZSTD])
+def test_round_trip(compression):
+    if compression == graph_codec.ZSTD and graph_codec.zstandard is None:
+        pytest.skip("zstandard not installed")
+    encoded = graph_codec.encode(sample_graph(), compression)
+
+    assert graph_codec.is_compact(encoded)
+    assert encoded[4] == compression
+    assert graph_codec.decode(encoded) == sample_graph()
+
+
+def test_ids_are_interned_and_edges_are_int_triples():
+    document = graph_codec.to_compact(sample_graph())
+
+    assert document["ids"] == ["Ada Lovelace", "Analytical Engine", "London", "Charles Babbage"]
+    assert document["edges"] == [0, 1, 0, 0, 2, 1, 3, 1, 2]
+    assert document["edge_columns"]["count"] == [None, [3, 1, 1]]
+
+
+def test_decimals_from_dynamodb_are_encoded():
+    graph = {"nodes": [{"id": "a", "type": "T", "properties": {"score": Decimal("0.5")}}], "edges": []}
+
+    decoded = graph_codec.decode(graph_codec.encode(graph, default=graph_store.decimal_default))
+
+    assert decoded["nodes"][0]["properties"]["score"] == 0.5
+
+
+def test_rejects_other_bytes():
+    with pytest.raises(ValueError):
+        graph_codec.decode(b'{"nodes": []}')
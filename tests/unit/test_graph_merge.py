@@ -0,0 +1,61 @@
+import graph_merge
+
+
+def rel(source, target, relation, source_type="Person", target_type="Organization"):
+    return {"source": source, "source_type": source_type, "target": target,
+            "target_type": target_type, "relation": relation, "properties": {}}
+
+
+def test_normalize_name():
+    assert graph_merge.normalize_name("The  Microsoft Corp.") == "microsoft corp"
+    assert graph_merge.normalize_name("Microsoft's") == "microsoft"
+    assert graph_merge.normalize_name("AT&T") == "at and t"
+    assert graph_merge.normalize_name("Ada Lovelace") != graph_merge.normalize_name("Ada Lovelaces")
+
+
+def test_duplicate_nodes_from_overlapping_chunks_are_merged():
+    chunks = [
+        ([{"id": "John Doe", "type": "Person", "properties": {"age": 30}},
+          {"id": "Microsoft", "type": "Organization", "properties": {}}],
+         [rel("John Doe", "Microsoft", "WORKS_AT")]),
+        ([{"id": "john doe", "type": "Person", "properties": {"age": 31, "role": "engineer"}},
+          {"id": "The Microsoft", "type": "Company", "properties": {}}],
+         [rel("john doe", "The Microsoft", "works at")]),
+    ]
+
+    nodes, edges, stats = graph_merge.merge_graphs(chunks)
+
+    assert nodes == [
+        {"id": "John Doe", "type": "Person", "properties": {"age": 30, "role": "engineer"}},
+        {"id": "Microsoft", "type": "Organization", "properties": {}},
+    ]
+    assert edges == [{"source": "John Doe", "target": "Microsoft", "relation": "WORKS_AT", "count": 2}]
+    assert stats == {"nodes_in": 4, "nodes_out": 2, "relationships_in": 2, "edges_out": 1}
+
+
+def test_node_type_is_the_entity_type_not_its_id():
+    nodes, _, _ = graph_merge.merge_graphs([([{"id": "Stanford", "type": "University", "properties": {}}], [])])
+    assert nodes[0]["type"] == "University"
+
+
+def test_aliases_resolve_to_one_entity():
+    merger = graph_merge.GraphMerger(aliases={"IBM": "International Business Machines"})
+    merger.add([{"id": "International Business Machines", "type": "Organization",
+                 "properties": {"aliases": ["Big Blue"]}}], [])
+    merger.add([{"id": "IBM", "type": "Organization", "properties": {}}],
+               [rel("Ada", "Big Blue", "KNOWS"), rel("IBM", "Big Blue", "SAME_AS")])
+
+    assert [n["id"] for n in merger.nodes()] == ["International Business Machines", "Ada"]
+    assert merger.edges() == [
+        {"source": "Ada", "target": "International Business Machines", "relation": "KNOWS", "count": 1}
+    ]
+
+
+def test_add_reports_incremental_changes():
+    merger = graph_merge.GraphMerger()
+    new_nodes, edges = merger.add([], [rel("A", "B", "KNOWS")])
+    assert len(new_nodes) == 2 and len(edges) == 1
+
+    new_nodes, edges = merger.add([{"id": "a", "type": "Person", "properties": {}}], [rel("a", "b", "KNOWS")])
+    assert new_nodes == []
+    assert merger.edge(edges[0])["count"] == 2
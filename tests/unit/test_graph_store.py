@@ -0,0 +1,119 @@
+import base64
+import json
+from decimal import Decimal
+
+import pytest
+
+import generate_share_link
+import get_saved_graph
+import graph_codec
+import graph_store
+import view_shared_graph
+from benchmarks.standins import FakeS3, FakeTable
+
+
+def graph(n_nodes):
+    nodes = [{"id": f"Entity {i} é", "type": "Thing", "properties": {"weight": 0.5}} for i in range(n_nodes)]
+    edges = [{"source": f"Entity {i}", "target": f"Entity {i + 1}", "relation": "NEXT", "count": 1}
+             for i in range(n_nodes - 1)]
+    return {"nodes": nodes, "edges": edges}
+
+
+@pytest.fixture()
+def table():
+    return FakeTable(name="graphs")
+
+
+@pytest.fixture()
+def s3():
+    return FakeS3()
+
+
+@pytest.mark.parametrize("fmt", ["json", "compact"])
+@pytest.mark.parametrize("storage", ["inline", "sharded", "s3"])
+def test_round_trip(table, s3, monkeypatch, storage, fmt):
+    monkeypatch.setattr(graph_store, "SHARD_BYTES", 1000)
+    data = graph(200)
+    item = {"share_id": "s1", "file_id": "f1", "expires_at": 123}
+
+    used = graph_store.save_graph(table, item, data, s3=s3, bucket="bucket", storage=storage, fmt=fmt)
+    stored = table.get_item(Key={"share_id": "s1"})["Item"]
+
+    assert used == storage
+    assert graph_store.load_graph(table, stored, s3) == data
+    assert json.loads(graph_store.load_graph_json(table, stored, s3)) == data
+    assert graph_codec.decode(graph_store.load_graph_compact(table, stored, s3)) == data
+    if storage == "sharded":
+        assert stored["graph_shards"] > 1
+    # Only the pointer item is visible through FileIdIndex
+    assert [i["share_id"] for i in table.query(IndexName="FileIdIndex", KeyConditionExpression="file_id = :f",
+                                               ExpressionAttributeValues={":f": "f1"})["Items"]] == ["s1"]
+
+
+def test_routes_by_size(monkeypatch):
+    monkeypatch.setattr(graph_store, "INLINE_MAX_BYTES", 100)
+    monkeypatch.setattr(graph_store, "SHARDED_MAX_BYTES", 1000)
+
+    assert [graph_store.storage_for_size(n) for n in (100, 101, 1000, 1001)] == ["inline", "sharded", "sharded", "s3"]
+
+
+def test_legacy_graph_data_map_is_still_readable(table):
+    item = {"share_id": "old", "graph_data": {"nodes": [{"id": "a", "weight": Decimal("1.5")}], "edges": []}}
+
+    assert graph_store.load_graph(table, item) == {"nodes": [{"id": "a", "weight": 1.5}], "edges": []}
+
+
+def test_resave_replaces_storage_attributes(table, s3):
+    graph_store.save_graph(table, {"share_id": "s1"}, graph(5), s3=s3, bucket="bucket", storage="s3")
+    first = table.get_item(Key={"share_id": "s1"})["Item"]
+    graph_store.save_graph(table, first, graph(3))
+    second = table.get_item(Key={"share_id": "s1"})["Item"]
+
+    assert second["graph_storage"] == "inline"
+    assert "graph_s3_key" not in second
+    assert second["graph_version"] != first["graph_version"]
+    assert graph_store.load_graph(table, second) == graph(3)
+
+
+def test_large_graph_is_served_by_both_read_endpoints(table, s3, monkeypatch):
+    monkeypatch.setattr(graph_store, "INLINE_MAX_BYTES", 2000)
+    monkeypatch.setattr(graph_store, "SHARD_BYTES", 2000)
+    monkeypatch.setattr(graph_store, "SHARDED_MAX_BYTES", 10_000)
+    for module in (generate_share_link, get_saved_graph, view_shared_graph):
+        monkeypatch.setattr(module, "table", table)
+        monkeypatch.setattr(module, "s3", s3)
+    monkeypatch.setattr(generate_share_link, "GRAPH_BUCKET", "bucket")
+    data = graph(300)
+    event = {"body": json.dumps({"file_id": "f1", "graph_data": data}),
+             "requestContext": {"apiId": "api", "accountId": "1", "stage": "Prod"}}
+
+    created = json.loads(generate_share_link.handler(event, None)["body"])
+    updated = json.loads(generate_share_link.handler(event, None)["body"])
+    saved = json.loads(get_saved_graph.handler({"pathParameters": {"file_id": "f1"}}, None)["body"])
+    shared = json.loads(view_shared_graph.handler({"pathParameters": {"share_id": created["share_id"]}}, None)["body"])
+
+    # Re-sharing a file updates its item instead of minting a new link
+    assert updated["share_id"] == created["share_id"]
+    assert saved["graph_data"] == shared["graph_data"] == data
+    assert saved["file_id"] == shared["file_id"] == "f1"
+
+
+def test_compact_response_on_accept(table, monkeypatch):
+    monkeypatch.setattr(get_saved_graph, "table", table)
+    data = graph(50)
+    graph_store.save_graph(table, {"share_id": "s1", "file_id": "f1", "created_at": "now"}, data, fmt="compact")
+
+    ret = get_saved_graph.handler({"pathParameters": {"file_id": "f1"},
+                                   "headers": {"Accept": graph_codec.MEDIA_TYPE}}, None)
+
+    assert ret["isBase64Encoded"] is True
+    assert ret["headers"]["Content-Type"] == graph_codec.MEDIA_TYPE
+    assert graph_codec.decode(base64.b64decode(ret["body"])) == data
+    assert json.loads(ret["headers"]["X-Graph-Metadata"])["file_id"] == "f1"
+
+
+def test_decimal_default_decodes_compact_blobs(table):
+    graph_store.save_graph(table, {"share_id": "s1", "file_id": "f1"}, graph(3), fmt="compact")
+    item = table.get_item(Key={"share_id": "s1"})["Item"]
+
+    assert json.loads(json.dumps(item, default=graph_store.decimal_default))["graph_blob"] == graph(3)
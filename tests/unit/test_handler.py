@@ -1,8 +1,16 @@
 import json
+import os
 
 import pytest
 
-from hello_world import app
+import app
+import chunk_cache
+import fake_llm
+import healthcheck
+import knowledge_graph
+import pdf_text
+import process_uploaded
+from benchmarks.standins import FakeS3, multi_page_pdf
 
 
 @pytest.fixture()
@@ -62,11 +70,59 @@ def apigw_event():
     }
 
 
-def test_lambda_handler(apigw_event):
+@pytest.fixture()
+def fake_provider(monkeypatch):
+    """KG_LLM_PROVIDER=fake: the real LLMGraphTransformer around fake_llm.FakeChatModel."""
+    monkeypatch.setattr(knowledge_graph, "LLM_PROVIDER", "fake")
+    monkeypatch.setattr(knowledge_graph, "llm", None)
+    monkeypatch.setattr(knowledge_graph, "llm_transformer", None)
+    monkeypatch.setattr(knowledge_graph, "extraction_cache", chunk_cache.ChunkCache([]))
+    monkeypatch.setattr(fake_llm, "LATENCY_MS", 1)
+
+    def no_secret():
+        raise AssertionError("the fake provider needs no API key")
+    monkeypatch.setattr(knowledge_graph, "get_secret", no_secret)
+
+
+def test_health_check(apigw_event):
+
+    ret = healthcheck.health_check(apigw_event, "")
+    data = json.loads(ret["body"])
+
+    assert ret["statusCode"] == 200
+    assert data["message"] == "healthy server"
+
+
+def test_lambda_handler_rejects_a_body_without_text(apigw_event):
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret["statusCode"] == 400
+    assert json.loads(ret["body"])["error"] == "No text provided"
+
+
+def test_lambda_handler_extracts_a_graph(apigw_event, fake_provider):
+    apigw_event["body"] = json.dumps({"text": "Ada Lovelace worked with Charles Babbage in London."})
 
     ret = app.lambda_handler(apigw_event, "")
     data = json.loads(ret["body"])
 
     assert ret["statusCode"] == 200
-    assert "message" in ret["body"]
-    assert data["message"] == "hello world"
+    assert {"Ada Lovelace", "Charles Babbage", "London"} <= {n["id"] for n in data["nodes"]}
+    assert data["metadata"]["usage"]["prompt_tokens"] > 0
+
+
+def test_pipelined_processing_chunks_by_tokens_and_reports_usage(fake_provider, monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(process_uploaded, "s3", s3)
+    data = multi_page_pdf(3, os.path.join(os.path.dirname(os.path.dirname(__file__)), "test-resume.pdf"))
+    s3.put_object(Bucket="test-bucket", Key="uploads/f1/doc.pdf", Body=data)
+    stats = {}
+
+    graph = process_uploaded.process_pdf_pipelined("test-bucket", "uploads/f1/doc.pdf", stats)
+
+    # The same chunks as the staged mode, not 2000-character ones
+    text = pdf_text.extract_pdf_text(data, separator="\n")
+    assert stats["chunks"] == len(knowledge_graph.split_text(text)) == 1
+    assert graph["nodes"] and graph["metadata"]["chunks"] == 1
+    assert graph["metadata"]["usage"]["prompt_tokens"] > 0
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+import instrumentation
+import knowledge_graph
+
+
+def emf_lines(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{"') and '"_aws"' in line]
+
+
+@pytest.fixture(autouse=True)
+def sample_everything(monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(instrumentation, "LOG_LEVEL", "INFO")
+
+
+def test_invocation_logs_one_emf_line(capsys):
+    @instrumentation.instrument("TestFunction")
+    def handler(event, context):
+        with instrumentation.span("chunking"):
+            pass
+
+        async def call():
+            with instrumentation.span("llm_call"):
+                await asyncio.sleep(0)
+
+        async def fan_out():
+            await asyncio.gather(call(), call(), call())
+
+        asyncio.run(fan_out())
+
+        def parse():
+            with instrumentation.span("pdf_parse"):
+                pass
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            instrumentation.submit(executor, parse).result()
+        return {"statusCode": 200}
+
+    assert handler({}, None) == {"statusCode": 200}
+
+    [record] = emf_lines(capsys.readouterr().out)
+    metrics = record["_aws"]["CloudWatchMetrics"][0]
+    assert metrics["Dimensions"] == [["Function"]] and record["Function"] == "TestFunction"
+    assert {m["Name"] for m in metrics["Metrics"]} == {"handler", "chunking", "llm_call", "pdf_parse"}
+    assert len(record["llm_call"]) == 3 and isinstance(record["chunking"], float)
+
+
+def test_unsampled_invocations_record_nothing(monkeypatch, capsys):
+    monkeypatch.setattr(instrumentation, "METRICS_SAMPLE_RATE", 0.0)
+    spans = []
+
+    @instrumentation.instrument("TestFunction")
+    def handler(event, context):
+        spans.append(instrumentation.span("chunking"))
+        return "ok"
+
+    assert handler({}, None) == "ok"
+    assert spans == [instrumentation._NO_SPAN]
+    assert emf_lines(capsys.readouterr().out) == []
+
+
+def test_emf_line_is_logged_when_the_handler_raises(capsys):
+    @instrumentation.instrument("TestFunction")
+    def handler(event, context):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        handler({}, None)
+
+    assert "handler" in emf_lines(capsys.readouterr().out)[0]
+
+
+@pytest.mark.parametrize("level, logged", [("INFO", False), ("DEBUG", True)])
+def test_graph_payloads_are_only_logged_at_debug(monkeypatch, capsys, level, logged):
+    monkeypatch.setattr(instrumentation, "LOG_LEVEL", level)
+
+    async def build_graph(text, **chunking):
+        return {"nodes": [{"id": "Ada Lovelace"}], "edges": [], "metadata": {}}
+
+    monkeypatch.setattr(knowledge_graph, "build_graph", build_graph)
+
+    response = app.lambda_handler({"body": json.dumps({"text": "Ada Lovelace"})}, None)
+
+    output = capsys.readouterr().out
+    assert response["statusCode"] == 200
+    assert ("Ada Lovelace" in output.replace(response["body"], "")) is logged
+    assert "serialization" in emf_lines(output)[0]
+
+
+def test_pipelined_parse_spans_are_recorded(capsys):
+    import os
+    import pipeline
+    from benchmarks.standins import FakeGraphTransformer, FakeS3, multi_page_pdf
+
+    s3 = FakeS3()
+    resume = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test-resume.pdf")
+    s3.put_object(Bucket="b", Key="uploads/f/doc.pdf", Body=multi_page_pdf(3, resume))
+
+    @instrumentation.instrument("TestFunction")
+    def handler(event, context):
+        asyncio.run(pipeline.extract_graph_pipelined(s3, "b", "uploads/f/doc.pdf", FakeGraphTransformer(latency=0)))
+
+    handler({}, None)
+
+    [record] = emf_lines(capsys.readouterr().out)
+    # From the parser thread: one per page, then the end of the document
+    assert len(record["pdf_parse"]) == 4
@@ -0,0 +1,64 @@
+import pytest
+
+import app
+import process_uploaded
+from benchmarks.standins import FakeLambda, FakeS3
+
+# Each mode extracts the text itself, rather than hitting the cache
+pytestmark = pytest.mark.fake_llm(cache=False)
+
+
+@pytest.fixture()
+def services(monkeypatch, fake_llm):
+    s3 = FakeS3()
+    lambda_client = FakeLambda({"kg": app.lambda_handler})
+    monkeypatch.setenv("KG_FUNCTION_NAME", "kg")
+    monkeypatch.setattr(process_uploaded, "s3", s3)
+    monkeypatch.setattr(process_uploaded, "lambda_client", lambda_client)
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "BUCKET_NAME", process_uploaded.BUCKET_NAME)
+    return s3, lambda_client
+
+
+TEXT = "Ada Lovelace worked with Charles Babbage. Alan Turing admired Ada Lovelace."
+
+
+def test_modes_produce_the_same_graph(services):
+    s3, lambda_client = services
+    graphs = {mode: process_uploaded.text_to_graph("f1", TEXT, mode=mode) for mode in ("inprocess", "s3ref", "inline")}
+
+    assert graphs["inprocess"] == graphs["s3ref"] == graphs["inline"]
+    assert graphs["inprocess"]["nodes"]
+    assert [i["function"] for i in lambda_client.invocations] == ["kg", "kg"]
+    assert (process_uploaded.BUCKET_NAME, "uploads/f1/extracted.txt") in s3.objects
+    # Its own upload event is skipped
+    assert process_uploaded.is_extracted_text(process_uploaded.BUCKET_NAME, "uploads/f1/extracted.txt")
+
+
+def test_inline_falls_back_to_s3_reference_past_payload_limit(services, monkeypatch):
+    s3, lambda_client = services
+    monkeypatch.setattr(process_uploaded, "MAX_INVOKE_PAYLOAD", 50)
+
+    graph = process_uploaded.text_to_graph("f2", TEXT, mode="inline")
+
+    assert graph["nodes"]
+    assert lambda_client.invocations[0]["request_bytes"] < 100
+    assert (process_uploaded.BUCKET_NAME, "uploads/f2/extracted.txt") in s3.objects
+
+
+def test_text_reference_outside_uploads_is_rejected(services):
+    ret = app.lambda_handler({"body": '{"text_s3_key": "secrets/extracted.txt"}'}, None)
+
+    assert ret["statusCode"] == 500
+    assert "Invalid text_s3_key" in ret["body"]
+
+
+def test_text_reference_is_rejected_on_api_requests(services):
+    s3, _ = services
+    s3.put_object(Bucket=process_uploaded.BUCKET_NAME, Key="uploads/f1/extracted.txt", Body=TEXT.encode())
+    event = {"body": '{"text_s3_key": "uploads/f1/extracted.txt"}', "requestContext": {"stage": "Prod"}}
+
+    ret = app.lambda_handler(event, None)
+
+    assert ret["statusCode"] == 400
+    assert "not accepted on API requests" in ret["body"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import kg_extraction
+from benchmarks.standins import FakeGraphTransformer, FakeRateLimitError
+
+
+def test_extract_chunks_preserves_chunk_order():
+    names = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf", "Hotel", "India", "Juliet"]
+    transformer = FakeGraphTransformer(latency=0.01, jitter=0.02, seed=1)
+    chunks = [f"{name} met Alan Turing." for name in names]
+
+    results = asyncio.run(kg_extraction.extract_chunks(transformer, chunks, max_concurrency=5))
+
+    assert [nodes[0]["id"] for nodes, _ in results] == names
+
+
+def test_extract_chunks_respects_concurrency_limit():
+    transformer = FakeGraphTransformer(latency=0.01)
+    chunks = [f"Ada Lovelace {i}" for i in range(30)]
+
+    asyncio.run(kg_extraction.extract_chunks(transformer, chunks, max_concurrency=4, batch_size=2))
+
+    assert transformer.calls == 30
+    assert transformer.max_in_flight <= 8
+
+
+def test_extract_chunks_retries_rate_limits(monkeypatch):
+    monkeypatch.setattr(kg_extraction, "retry_delay", lambda attempt, error=None: 0)
+    transformer = FakeGraphTransformer(latency=0, rate_limit_rate=0.3, seed=3)
+    chunks = [f"Grace Hopper {i}" for i in range(20)]
+
+    results = asyncio.run(kg_extraction.extract_chunks(transformer, chunks, max_retries=50))
+
+    assert len(results) == 20
+    assert transformer.calls > 20
+
+
+def test_non_rate_limit_errors_are_not_retried():
+    class Broken:
+        calls = 0
+
+        async def aconvert_to_graph_documents(self, documents):
+            Broken.calls += 1
+            raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(kg_extraction.extract_chunks(Broken(), ["a"]))
+    assert Broken.calls == 1
+
+
+def test_retry_delay_honours_retry_after():
+    class Response:
+        headers = {"retry-after": "3"}
+
+    error = FakeRateLimitError()
+    error.response = Response()
+    assert kg_extraction.retry_delay(0, error) == 3.0
+    assert 0 <= kg_extraction.retry_delay(2) <= kg_extraction.RETRY_BASE_DELAY * 4
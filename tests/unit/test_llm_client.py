@@ -0,0 +1,87 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+import chunk_cache
+import knowledge_graph
+from benchmarks.standins import FakeGraphTransformer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Values the secret has had, newest last
+secrets = []
+
+
+class FakeChat:
+    def __init__(self, openai_api_key, **kwargs):
+        self.api_key = openai_api_key
+
+
+class KeyedTransformer(FakeGraphTransformer):
+    """Rejects every call made with an old key, like OpenAI after a rotation."""
+
+    def __init__(self, llm):
+        super().__init__(latency=0)
+        self.llm = llm
+
+    async def aconvert_to_graph_documents(self, documents):
+        if self.llm.api_key != secrets[-1]:
+            raise type("AuthenticationError", (Exception,), {"status_code": 401})("invalid api key")
+        return await super().aconvert_to_graph_documents(documents)
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    fetched = []
+    secrets[:] = ["key-1"]
+
+    def get_secret():
+        fetched.append(secrets[-1])
+        return secrets[-1]
+    monkeypatch.setattr(knowledge_graph, "get_secret", get_secret)
+    monkeypatch.setattr(knowledge_graph, "load_llm_classes", lambda: (FakeChat, KeyedTransformer))
+    monkeypatch.setattr(knowledge_graph, "extraction_cache", chunk_cache.ChunkCache([]))
+    for name, value in (("llm", None), ("llm_transformer", None), ("_api_key", None),
+                        ("_secret_fetched_at", None)):
+        monkeypatch.setattr(knowledge_graph, name, value)
+    return fetched
+
+
+def test_secret_is_cached_until_it_expires(client, monkeypatch):
+    llm, _ = knowledge_graph.get_llm()
+    assert knowledge_graph.get_llm()[0] is llm
+    assert client == ["key-1"]
+
+    monkeypatch.setattr(knowledge_graph, "SECRET_TTL_SECONDS", 0)
+    assert knowledge_graph.get_llm()[0] is llm
+    assert client == ["key-1", "key-1"]
+
+
+def test_rejected_key_is_re_read_and_extraction_retried(client):
+    knowledge_graph.get_llm()
+    secrets.append("key-2")
+    stats = {}
+
+    nodes, _ = asyncio.run(knowledge_graph.extract_kg_from_text("Ada Lovelace met Charles Babbage.", stats=stats))
+
+    assert knowledge_graph.llm.api_key == "key-2"
+    assert {"Ada Lovelace", "Charles Babbage"} <= {n["id"] for n in nodes}
+    assert stats["chunks"] == stats["cache_misses"] == 1
+
+
+def test_prefetch_builds_the_client_in_the_background(client):
+    knowledge_graph.prefetch().join()
+
+    assert knowledge_graph.llm.api_key == "key-1"
+
+
+def test_app_import_leaves_the_llm_stack_unloaded():
+    code = ("import sys, app; "
+            "print(any(m.startswith(('langchain_core', 'langchain_openai', 'langchain_experimental')) for m in sys.modules))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "main_app"),
+                                                      os.path.join(ROOT, "common_layer", "python")]))
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,110 @@
+import os
+from io import BytesIO
+
+import PyPDF2
+import pytest
+
+import pdf_text
+
+RESUME = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test-resume.pdf")
+
+
+@pytest.fixture(autouse=True)
+def pypdf2_backend(monkeypatch):
+    # The tests below compare against PyPDF2, which "auto" may not pick
+    monkeypatch.setattr(pdf_text, "PDF_BACKEND", "pypdf2")
+
+
+@pytest.fixture(scope="module")
+def three_page_pdf(tmp_path_factory):
+    writer = PyPDF2.PdfWriter()
+    page = PyPDF2.PdfReader(RESUME).pages[0]
+    for _ in range(3):
+        writer.add_page(page)
+    path = tmp_path_factory.mktemp("pdf") / "three.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def legacy_text(path):
+    text = ""
+    for page in PyPDF2.PdfReader(path).pages:
+        text += page.extract_text()
+    return text
+
+
+def test_matches_legacy_concatenation(three_page_pdf):
+    assert pdf_text.extract_pdf_text(three_page_pdf, use_mmap=True) == legacy_text(three_page_pdf)
+    assert pdf_text.extract_pdf_text(three_page_pdf, use_mmap=False) == legacy_text(three_page_pdf)
+
+
+def test_accepts_bytes_and_file_objects(three_page_pdf):
+    with open(three_page_pdf, "rb") as f:
+        data = f.read()
+    assert pdf_text.extract_pdf_text(data) == legacy_text(three_page_pdf)
+    assert pdf_text.extract_pdf_text(BytesIO(data)) == legacy_text(three_page_pdf)
+
+
+def test_process_pool_preserves_page_order(three_page_pdf):
+    timings = []
+    pages = list(pdf_text.iter_pdf_pages(three_page_pdf, workers=2, timings=timings))
+
+    assert pages == list(pdf_text.iter_pdf_pages(three_page_pdf, workers=1))
+    assert [t["page"] for t in timings] == [0, 1, 2]
+    assert all(t["seconds"] >= 0 and t["chars"] == len(pages[0]) for t in timings)
+
+
+def test_pages_are_yielded_lazily(three_page_pdf):
+    pages = pdf_text.iter_pdf_pages(three_page_pdf)
+    assert next(pages) == PyPDF2.PdfReader(three_page_pdf).pages[0].extract_text()
+    pages.close()
+
+
+def test_worker_errors_are_raised(tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4 not really a pdf")
+    with pytest.raises(Exception):
+        list(pdf_text.iter_pdf_pages(str(broken), workers=2))
+
+
+@pytest.mark.parametrize("backend", ["pypdfium2", "pdfminer"])
+def test_optional_backends_read_every_source(three_page_pdf, backend):
+    if backend not in pdf_text.available_backends():
+        pytest.skip(f"{backend} is not installed")
+    with open(three_page_pdf, "rb") as f:
+        data = f.read()
+    timings = []
+
+    pages = list(pdf_text.iter_pdf_pages(three_page_pdf, backend=backend, timings=timings))
+
+    assert len(pages) == 3 and "Nga" in pages[0]
+    assert [t["page"] for t in timings] == [0, 1, 2]
+    assert list(pdf_text.iter_pdf_pages(data, backend=backend)) == pages
+    assert list(pdf_text.iter_pdf_pages(BytesIO(data), backend=backend)) == pages
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setattr(pdf_text, "pypdfium2", None)
+    monkeypatch.setattr(pdf_text, "pdfminer_pages", None)
+
+    assert pdf_text.resolve_backend("auto") == "pypdf2"
+    with pytest.raises(ValueError, match="not installed"):
+        pdf_text.resolve_backend("pypdfium2")
+    with pytest.raises(ValueError, match="Unknown"):
+        pdf_text.resolve_backend("tesseract")
+
+
+def test_pypdfium2_extracts_on_several_threads_at_once(three_page_pdf):
+    if "pypdfium2" not in pdf_text.available_backends():
+        pytest.skip("pypdfium2 is not installed")
+    from concurrent.futures import ThreadPoolExecutor
+    with open(three_page_pdf, "rb") as f:
+        data = f.read()
+    expected = list(pdf_text.iter_pdf_pages(data, backend="pypdfium2"))
+
+    # PDFium is not thread-safe; PDFIUM_LOCK serializes the calls
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: list(pdf_text.iter_pdf_pages(data, backend="pypdfium2")), range(64)))
+
+    assert all(pages == expected for pages in results)
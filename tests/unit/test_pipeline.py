@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import io
+import os
+import random
+
+import pytest
+
+import chunk_cache
+import graph_merge
+import kg_extraction
+import pdf_text
+import pipeline
+import s3_stream
+import token_chunking
+from benchmarks.standins import FakeGraphTransformer, FakeS3, multi_page_pdf
+
+RESUME = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test-resume.pdf")
+
+
+def test_range_reader_matches_object_bytes():
+    data = bytes(random.Random(0).getrandbits(8) for _ in range(100_000))
+    s3 = FakeS3()
+    s3.put_object(Bucket="b", Key="k", Body=data)
+
+    reader = s3_stream.S3RangeReader(s3, "b", "k", block_size=4096, max_workers=3)
+    assert reader.size == len(data)
+    assert reader.read() == data
+    reader.seek(-10, 2)
+    assert reader.read(100) == data[-10:]
+    reader.seek(5000)
+    assert reader.read(9000) == data[5000:14000]
+    assert reader.requests == -(-len(data) // 4096)
+    reader.close()
+
+
+def test_empty_objects_are_read_as_empty_files():
+    s3 = FakeS3()
+    s3.put_object(Bucket="b", Key="uploads/f/empty.pdf", Body=b"")
+
+    reader = s3_stream.S3RangeReader(s3, "b", "uploads/f/empty.pdf")
+    assert reader.size == 0 and reader.read() == b""
+    reader.close()
+
+    # A content error for the polling endpoint, not an S3 one
+    with pytest.raises(ValueError, match="empty.pdf is empty"):
+        asyncio.run(pipeline.extract_graph_pipelined(s3, "b", "uploads/f/empty.pdf",
+                                                     FakeGraphTransformer(latency=0), split=str.split))
+
+
+def test_spool_reads_small_objects_with_one_get_and_big_ones_in_ranges():
+    data = bytes(random.Random(1).getrandbits(8) for _ in range(50_000))
+    s3 = FakeS3()
+    s3.put_object(Bucket="b", Key="k", Body=data)
+
+    with s3_stream.spool_s3_object(s3, "b", "k", part_size=64 * 1024) as spool:
+        assert s3.requests == 2 and spool.read() == data
+
+    s3.put_object(Bucket="b", Key="empty", Body=b"")
+    with s3_stream.spool_s3_object(s3, "b", "empty") as spool:
+        assert spool.read() == b""
+
+    with s3_stream.spool_s3_object(s3, "b", "k", part_size=4096, max_workers=3, spool_max_bytes=10_000) as spool:
+        assert s3.requests == 4 + -(-len(data) // 4096)
+        assert spool.read() == data
+        # Over spool_max_bytes, so it went to a temp file
+        assert not isinstance(spool._file, io.BytesIO)
+
+
+def test_spool_refuses_parts_of_a_newer_version():
+    s3 = FakeS3()
+    s3.put_object(Bucket="b", Key="k", Body=b"old" * 5000)
+    first = s3_stream.get_first_part(s3, "b", "k", 4096)
+    s3.put_object(Bucket="b", Key="k", Body=b"new" * 5000)
+
+    with pytest.raises(Exception, match="PreconditionFailed"):
+        s3_stream.spool_s3_object(s3, "b", "k", first, part_size=4096)
+
+def test_chunker_covers_streamed_pages():
+    pages = [f"Page {p}. " + " ".join(f"word{p}x{i}" for i in range(600)) for p in range(6)]
+
+    async def collect():
+        async def source():
+            for page in pages:
+                yield page
+        split = functools.partial(token_chunking.split_text, chunk_tokens=200, overlap_tokens=20)
+        return [chunk async for chunk in pipeline.iter_chunks(source(), split, buffer_chars=3200)]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 6
+    assert all(token_chunking.count_tokens(chunk) <= 200 for chunk in chunks)
+    words = set("\n".join(pages).split())
+    assert words == {w for chunk in chunks for w in chunk.split()}
+
+
+def test_async_chunk_source_uses_cache_per_batch():
+    cache = chunk_cache.ChunkCache([chunk_cache.MemoryBackend()])
+    chunks = ["Ada Lovelace met Charles Babbage.", "Alan Turing met Alonzo Church."]
+    asyncio.run(kg_extraction.extract_chunks(FakeGraphTransformer(latency=0), chunks[:1], cache=cache, model_name="m"))
+
+    async def run():
+        async def source():
+            for chunk in chunks:
+                yield chunk
+        stats = {}
+        results = [r async for r in kg_extraction.iter_chunk_graphs(
+            transformer, source(), cache=cache, model_name="m", stats=stats)]
+        return results, stats
+
+    transformer = FakeGraphTransformer(latency=0)
+    results, stats = asyncio.run(run())
+    assert sorted(i for i, _, _ in results) == [0, 1]
+    assert transformer.calls == 1
+    assert stats == {"chunks": 2, "cache_hits": 1, "cache_misses": 1, "chunks_total": 2}
+
+
+def test_pipelined_graph_matches_staged():
+    data = multi_page_pdf(4, RESUME)
+    s3 = FakeS3()
+    s3.put_object(Bucket="b", Key="uploads/f/doc.pdf", Body=data)
+
+    stats = {}
+    graph = asyncio.run(pipeline.extract_graph_pipelined(
+        s3, "b", "uploads/f/doc.pdf", FakeGraphTransformer(latency=0), stats=stats))
+
+    text = pdf_text.extract_pdf_text(data, separator="\n")
+    chunks = token_chunking.split_text(text)
+    results = asyncio.run(kg_extraction.extract_chunks(FakeGraphTransformer(latency=0), chunks))
+    nodes, _, _ = graph_merge.merge_graphs(results)
+
+    assert len(stats["page_timings"]) == 4
+    assert {n["id"] for n in graph["nodes"]} == {n["id"] for n in nodes}
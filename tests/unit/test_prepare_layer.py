@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+import prepare_layer
+
+
+def write(path, text=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture()
+def layer(tmp_path):
+    root = str(tmp_path / "python")
+    write(os.path.join(root, "used_pkg", "__init__.py"), "from used_pkg import a\n")
+    write(os.path.join(root, "used_pkg", "a.py"))
+    write(os.path.join(root, "used_pkg", "b.py"))
+    write(os.path.join(root, "used_pkg", "a.pyi"))
+    write(os.path.join(root, "used_pkg", "tests", "test_a.py"))
+    write(os.path.join(root, "used_pkg-1.0.dist-info", "METADATA"))
+    write(os.path.join(root, "pruned_pkg", "__init__.py"), "from pruned_pkg import kept\n")
+    write(os.path.join(root, "pruned_pkg", "kept.py"))
+    write(os.path.join(root, "pruned_pkg", "sub", "__init__.py"))
+    write(os.path.join(root, "pruned_pkg", "sub", "dropped.py"))
+    write(os.path.join(root, "pruned_pkg", "prompts.json"), "{}")
+    write(os.path.join(root, "unused_pkg", "__init__.py"))
+    write(os.path.join(root, "lazy_pkg", "__init__.py"))
+    write(os.path.join(root, "bin", "tool"))
+    return root
+
+
+def test_slim_keeps_what_the_trace_imports(layer):
+    removed = prepare_layer.slim_layer(layer, "import used_pkg, pruned_pkg", keep=["lazy_pkg"],
+                                       prune=["pruned_pkg"])
+    exists = lambda *parts: os.path.exists(os.path.join(layer, *parts))
+
+    assert {"unused_pkg", "bin"} <= set(removed)
+    assert exists("lazy_pkg") and exists("used_pkg-1.0.dist-info", "METADATA")
+    # Only pruned packages lose untraced modules; their data and packages stay
+    assert exists("used_pkg", "b.py")
+    assert exists("pruned_pkg", "kept.py") and exists("pruned_pkg", "prompts.json")
+    assert exists("pruned_pkg", "sub", "__init__.py") and not exists("pruned_pkg", "sub", "dropped.py")
+    assert not exists("used_pkg", "tests") and not exists("used_pkg", "a.pyi")
+    assert any(name.startswith("a.cpython") for name in os.listdir(os.path.join(layer, "used_pkg", "__pycache__")))
+
+
+def test_layer_over_budget_fails(layer):
+    sizes = prepare_layer.package_sizes(layer)
+
+    assert sizes["pruned_pkg"] == len("from pruned_pkg import kept\n") + len("{}")
+    assert prepare_layer.check_budget("ml_layer", sizes, budget_mb=1)
+    assert not prepare_layer.check_budget("ml_layer", {"big": 2_000_000}, budget_mb=1)
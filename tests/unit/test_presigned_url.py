@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import presigned_url
+from benchmarks.standins import FakeS3
+
+MB = 1024 * 1024
+
+
+@pytest.fixture()
+def s3(monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(presigned_url, "s3_client", s3)
+    monkeypatch.setattr(presigned_url, "BUCKET_NAME", "test-bucket")
+    return s3
+
+
+def get_url(**query):
+    event = {"resource": "/get_presigned_url", "httpMethod": "GET",
+             "queryStringParameters": {k: str(v) for k, v in query.items()}}
+    ret = presigned_url.handler(event, None)
+    return ret["statusCode"], json.loads(ret["body"])
+
+
+def post(resource, body):
+    ret = presigned_url.handler({"resource": resource, "httpMethod": "POST", "body": json.dumps(body)}, None)
+    return ret["statusCode"], json.loads(ret["body"])
+
+
+def test_small_files_get_a_single_put_url(s3):
+    status, body = get_url(file_name="resume.pdf", content_type="application/pdf", file_size=MB)
+
+    assert status == 200 and "multipart" not in body
+    assert f"uploads/{body['file_id']}/resume.pdf" in body["presigned_url"]
+
+
+def test_large_files_upload_in_parts_then_complete(s3):
+    data = bytes(range(256)) * (100 * MB // 256)
+    status, session = get_url(file_name="big.pdf", content_type="application/pdf", file_size=len(data))
+
+    assert status == 200 and session["multipart"] is True
+    assert session["part_size"] == presigned_url.MIN_PART_SIZE
+    assert session["part_count"] == len(session["parts"]) == 13
+    assert session["concurrency"] == presigned_url.UPLOAD_CONCURRENCY
+    key = f"uploads/{session['file_id']}/big.pdf"
+
+    # What the client does with the part URLs, in any order
+    etags = []
+    for part in reversed(session["parts"]):
+        number = part["part_number"]
+        assert f"PartNumber={number}" in part["url"]
+        chunk = data[(number - 1) * session["part_size"]:number * session["part_size"]]
+        etags.append({"part_number": number, "etag": s3.upload_part(
+            Bucket="test-bucket", Key=key, UploadId=session["upload_id"], PartNumber=number, Body=chunk)["ETag"]})
+
+    status, body = post("/complete_multipart_upload", {"file_id": session["file_id"], "file_name": "big.pdf",
+                                                       "upload_id": session["upload_id"], "parts": etags})
+
+    assert status == 200 and body["status"] == "uploaded"
+    assert s3.objects[("test-bucket", key)]["Body"] == data
+
+
+def test_abort_discards_the_upload(s3):
+    _, session = get_url(file_name="big.pdf", file_size=50 * MB)
+
+    status, body = post("/abort_multipart_upload", {"file_id": session["file_id"], "file_name": "big.pdf",
+                                                    "upload_id": session["upload_id"]})
+
+    assert status == 200 and body["status"] == "aborted"
+    assert s3.uploads == {}
+
+
+def test_complete_needs_every_part_etag(s3):
+    _, session = get_url(file_name="big.pdf", file_size=50 * MB)
+
+    status, body = post("/complete_multipart_upload", {"file_id": session["file_id"], "file_name": "big.pdf",
+                                                       "upload_id": session["upload_id"],
+                                                       "parts": [{"part_number": 1}]})
+
+    assert status == 400 and "etag" in body["error"]
+
+
+@pytest.mark.parametrize("file_size", ["-1", "big", str(6 * 1024 ** 4)])
+def test_invalid_sizes_are_rejected(s3, file_size):
+    status, _ = get_url(file_name="big.pdf", file_size=file_size)
+
+    assert status == 400
+
+
+def test_parts_grow_to_stay_within_max_parts():
+    part_size, part_count = presigned_url.part_plan(20 * 1024 * MB)
+
+    assert part_count <= presigned_url.MAX_PARTS
+    assert part_size % MB == 0 and part_size > presigned_url.MIN_PART_SIZE
@@ -0,0 +1,251 @@
+import base64
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import process_uploaded
+import s3_stream
+import upload_file
+from benchmarks.standins import FakeDynamoDB, FakeS3
+
+
+def s3_record(key, bucket="test-bucket"):
+    return {"s3": {"bucket": {"name": bucket}, "object": {"key": key}}}
+
+
+def sqs_record(message_id, *keys):
+    return {
+        "eventSource": "aws:sqs",
+        "messageId": message_id,
+        "body": json.dumps({"Records": [s3_record(key) for key in keys]})
+    }
+
+
+@pytest.fixture()
+def services(monkeypatch):
+    s3 = FakeS3()
+    dynamodb = FakeDynamoDB()
+    monkeypatch.setattr(process_uploaded, "s3", s3)
+    monkeypatch.setattr(process_uploaded, "dynamodb", dynamodb)
+    monkeypatch.setattr(process_uploaded, "PROCESS_MODE", "staged")
+    return s3, dynamodb.Table(os.environ["GRAPH_CACHE_TABLE"])
+
+
+def test_records_run_concurrently_without_touching_tmp(services, monkeypatch):
+    s3, table = services
+    for i in range(4):
+        s3.put_object(Bucket="test-bucket", Key=f"uploads/f{i}/doc.pdf", Body=f"%PDF f{i}".encode())
+    documents = []
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def extract(document, file_name, content_type=None, stats=None):
+        with lock:
+            documents.append(document)
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return document.read().decode()
+
+    monkeypatch.setattr(process_uploaded, "PROCESS_MAX_WORKERS", 4)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "1024")
+    monkeypatch.setattr(process_uploaded, "extract_text_from_file", extract)
+    monkeypatch.setattr(process_uploaded, "text_to_graph", lambda file_id, text, stats=None: {"nodes": [], "edges": []})
+    monkeypatch.setattr(s3, "download_file", lambda *args: pytest.fail("the upload was downloaded to a file"))
+    s3.requests = 0
+
+    ret = process_uploaded.handler({"Records": [s3_record(f"uploads/f{i}/doc.pdf") for i in range(4)]}, None)
+
+    assert ret["statusCode"] == 200
+    assert "batchItemFailures" not in ret
+    assert active[1] > 1
+    # Each record parsed its own in-memory copy, freed afterwards
+    assert all(document.closed and not document._rolled for document in documents)
+    assert sorted(item["file_id"] for item in table.all_items()) == ["f0", "f1", "f2", "f3"]
+    # One GET per upload and no HEAD (FakeS3 doesn't count the misses for extracted.txt)
+    assert s3.requests == 4
+
+
+@pytest.mark.parametrize("memory_mb, workers, expected_mb", [(128, 4, 0), (512, 4, 32), (512, 8, 16), (1024, 4, 32)])
+def test_spool_limit_follows_function_memory(monkeypatch, memory_mb, workers, expected_mb):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", str(memory_mb))
+    monkeypatch.setattr(process_uploaded, "PROCESS_MAX_WORKERS", workers)
+    assert process_uploaded.spool_max_bytes() == expected_mb * 1024 * 1024
+
+    monkeypatch.setattr(process_uploaded, "SPOOL_MAX_BYTES", 1000)
+    assert process_uploaded.spool_max_bytes() == 1000
+
+
+def test_sqs_batch_reports_only_retryable_failures(services, monkeypatch):
+    s3, table = services
+    s3.put_object(Bucket="test-bucket", Key="uploads/good/doc.pdf", Body=b"%PDF")
+    s3.put_object(Bucket="test-bucket", Key="uploads/bad/doc.pdf", Body=b"bad")
+
+    def extract(document, file_name, content_type=None, stats=None):
+        if document.read() == b"bad":
+            raise ValueError("not a PDF")
+        return "text"
+
+    monkeypatch.setattr(process_uploaded, "extract_text_from_file", extract)
+    monkeypatch.setattr(process_uploaded, "text_to_graph", lambda file_id, text, stats=None: {"nodes": [], "edges": []})
+
+    get_object = s3.get_object
+
+    def flaky_get(Bucket, Key, **kwargs):
+        if "flaky" in Key:
+            raise OSError("connection reset")
+        return get_object(Bucket, Key, **kwargs)
+
+    monkeypatch.setattr(s3, "get_object", flaky_get)
+    s3.put_object(Bucket="test-bucket", Key="uploads/flaky/doc.pdf", Body=b"%PDF")
+    event = {"Records": [
+        sqs_record("m-good", "uploads/good/doc.pdf"),
+        sqs_record("m-bad", "uploads/bad/doc.pdf"),
+        sqs_record("m-flaky", "uploads/flaky/doc.pdf"),
+        {"eventSource": "aws:sqs", "messageId": "m-test", "body": json.dumps({"Event": "s3:TestEvent"})},
+    ]}
+
+    ret = process_uploaded.handler(event, None)
+
+    # Content errors are saved for the polling endpoint, not redelivered;
+    # the redelivered file keeps its progress record
+    assert ret["batchItemFailures"] == [{"itemIdentifier": "m-flaky"}]
+    statuses = {item["file_id"]: item["status"] for item in table.all_items()}
+    assert statuses == {"good": "completed", "bad": "error", "flaky": "processing"}
+
+
+def test_keys_are_url_decoded(services, monkeypatch):
+    s3, table = services
+    s3.put_object(Bucket="test-bucket", Key="uploads/f1/my resume.pdf", Body=b"%PDF")
+    monkeypatch.setattr(process_uploaded, "extract_text_from_file", lambda document, file_name, content_type=None, stats=None: "text")
+    monkeypatch.setattr(process_uploaded, "text_to_graph", lambda file_id, text, stats=None: {"nodes": [], "edges": []})
+
+    process_uploaded.handler({"Records": [s3_record("uploads/f1/my+resume.pdf")]}, None)
+
+    assert [item["file_name"] for item in table.all_items()] == ["my resume.pdf"]
+
+
+@pytest.fixture()
+def graph_texts(services, monkeypatch):
+    """Texts handed to text_to_graph, and documents the PDF parser was given."""
+    texts, parsed = [], []
+
+    def extract(document, file_name, content_type=None, stats=None):
+        parsed.append(document)
+        return "parsed text"
+
+    monkeypatch.setattr(process_uploaded, "extract_text_from_file", extract)
+    monkeypatch.setattr(process_uploaded, "text_to_graph",
+                        lambda file_id, text, stats=None: texts.append(text) or {"nodes": [], "edges": []})
+    return texts, parsed
+
+
+def upload(s3, monkeypatch):
+    """Upload tests/test-resume.pdf through upload_file; returns its file_id and original key."""
+    monkeypatch.setattr(upload_file, "s3_client", s3)
+    monkeypatch.setattr(upload_file, "BUCKET_NAME", "test-bucket")
+    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), "test-resume.pdf"), "rb") as f:
+        content = base64.b64encode(f.read()).decode()
+    ret = upload_file.lambda_handler({"body": json.dumps({"file_content": content, "file_name": "resume.pdf",
+                                                          "content_type": "application/pdf"})}, None)
+    file_id = json.loads(ret["body"])["file_id"]
+    return file_id, f"uploads/{file_id}/original/resume.pdf"
+
+
+def test_text_extracted_by_upload_file_is_reused(services, graph_texts, monkeypatch):
+    s3, table = services
+    texts, parsed = graph_texts
+    file_id, key = upload(s3, monkeypatch)
+    monkeypatch.setattr(s3, "download_file", lambda *args: pytest.fail("the upload was downloaded again"))
+
+    process_uploaded.handler({"Records": [s3_record(key)]}, None)
+
+    assert parsed == []
+    assert texts == [s3.objects[("test-bucket", f"uploads/{file_id}/extracted.txt")]["Body"].decode()]
+    assert "Nga" in texts[0]
+    assert [item["status"] for item in table.all_items()] == ["completed"]
+
+
+@pytest.mark.parametrize("metadata", [{"source_etag": "from-an-older-version"}, {}])
+def test_stale_or_unlabelled_text_is_parsed_again(services, graph_texts, metadata):
+    s3, table = services
+    texts, parsed = graph_texts
+    s3.put_object(Bucket="test-bucket", Key="uploads/f1/extracted.txt", Body=b"old text", Metadata=metadata)
+    s3.put_object(Bucket="test-bucket", Key="uploads/f1/doc.pdf", Body=b"%PDF")
+
+    process_uploaded.handler({"Records": [s3_record("uploads/f1/doc.pdf")]}, None)
+
+    assert len(parsed) == 1 and texts == ["parsed text"]
+
+
+
+def test_other_formats_are_processed_and_artifacts_skipped(services, monkeypatch):
+    s3, table = services
+    texts = {}
+    monkeypatch.setattr(process_uploaded, "text_to_graph",
+                        lambda file_id, text, stats=None: texts.update({file_id: text}) or {"nodes": [], "edges": []})
+    s3.put_object(Bucket="test-bucket", Key="uploads/md/notes.md", Body=b"# Ada\n\n**Ada** met Babbage.",
+                  ContentType="text/markdown")
+    s3.put_object(Bucket="test-bucket", Key="uploads/png/photo.png", Body=b"\x89PNG\r\n\x1a\n\x00\x00",
+                  ContentType="image/png")
+    s3.put_object(Bucket="test-bucket", Key="uploads/md/extracted.txt", Body=b"Ada met Babbage.",
+                  Metadata={"source_etag": '"abc"'})
+    # A user's own file that happens to have the artifact's name
+    s3.put_object(Bucket="test-bucket", Key="uploads/txt/extracted.txt", Body=b"Grace wrote COBOL.")
+    s3.put_object(Bucket="test-bucket", Key="graphs/g1/1.json", Body=b"{}")
+    keys = ["uploads/md/notes.md", "uploads/png/photo.png", "uploads/md/extracted.txt", "uploads/txt/extracted.txt",
+            "graphs/g1/1.json"]
+
+    ret = process_uploaded.handler({"Records": [s3_record(key) for key in keys]}, None)
+
+    assert ret["statusCode"] == 200
+    assert texts == {"md": "Ada\n\nAda met Babbage.", "txt": "Grace wrote COBOL."}
+    statuses = {item["file_id"]: (item["status"], item.get("error_message", "")) for item in table.all_items()}
+    assert statuses["md"] == statuses["txt"] == ("completed", "")
+    # Unsupported files are reported to the polling endpoint, not retried
+    assert statuses["png"][0] == "error" and "Unsupported file type" in statuses["png"][1]
+    assert len(statuses) == 3
+
+
+def test_pipelined_mode_retries_s3_failures_and_saves_content_errors(services, monkeypatch):
+    s3, table = services
+    for file_id in ("good", "flaky", "midway", "bad"):
+        s3.put_object(Bucket="test-bucket", Key=f"uploads/{file_id}/doc.pdf", Body=b"%PDF" + b"x" * 20)
+    monkeypatch.setattr(process_uploaded, "PROCESS_MODE", "pipelined")
+    monkeypatch.setattr(s3_stream, "RANGE_BLOCK_SIZE", 8)
+    get_object = s3.get_object
+
+    def flaky_get(Bucket, Key, Range=None, **kwargs):
+        if "flaky" in Key or ("midway" in Key and not Range.startswith("bytes=0-")):
+            raise OSError("connection reset")
+        return get_object(Bucket, Key, Range=Range, **kwargs)
+
+    def process(bucket, key, stats=None, stream=None):
+        try:
+            data = stream.read()
+        except OSError as e:
+            # As a PDF parser would report a read that failed
+            raise ValueError("damaged PDF") from e
+        if "bad" in key:
+            raise ValueError("not a PDF")
+        return {"nodes": [{"id": data[:4].decode()}], "edges": []}
+
+    monkeypatch.setattr(s3, "get_object", flaky_get)
+    monkeypatch.setattr(process_uploaded, "process_pdf_pipelined", process)
+    keys = ["uploads/good/doc.pdf", "uploads/flaky/doc.pdf", "uploads/midway/doc.pdf", "uploads/bad/doc.pdf",
+            "uploads/gone/doc.pdf"]
+    event = {"Records": [sqs_record(f"m-{key.split('/')[1]}", key) for key in keys]}
+
+    ret = process_uploaded.handler(event, None)
+
+    # S3 failures are redelivered, a missing object is dropped, and only the
+    # content error is saved for the polling endpoint
+    assert ret["batchItemFailures"] == [{"itemIdentifier": "m-flaky"}, {"itemIdentifier": "m-midway"}]
+    statuses = {item["file_id"]: item["status"] for item in table.all_items()}
+    assert statuses == {"good": "completed", "flaky": "processing", "midway": "processing", "bad": "error"}
+
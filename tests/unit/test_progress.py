@@ -0,0 +1,94 @@
+import pytest
+
+import process_uploaded
+import progress
+from benchmarks.standins import FakeDynamoDB, FakeS3, FakeTable
+
+
+@pytest.fixture()
+def table():
+    return FakeTable(name="graphs")
+
+
+def test_tracker_writes_stages_and_eta(table, monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr(progress.time, "monotonic", lambda: clock["now"])
+    stats = {}
+    tracker = progress.ProgressTracker(table, "s1", "f1", "doc.pdf", stats=stats, interval=3600)
+    tracker.start()
+    tracker.stage("extract_text")
+    stats["page_timings"] = [{}] * 3
+    clock["now"] += 2
+    tracker.stage("build_graph")
+    stats.update(chunks=1, chunks_total=11)
+    tracker.write()
+    clock["now"] += 5
+    stats["chunks"] = 6
+    tracker.write()
+    writes = table.write_units
+    tracker.write()  # unchanged: skipped
+
+    item = table.get_item(Key={"share_id": "s1"})["Item"]
+    assert table.write_units == writes
+    assert item["status"] == "processing"
+    assert (item["stage"], item["pages_done"], item["chunks_done"], item["chunks_total"]) == ("build_graph", 3, 6, 11)
+    assert item["eta_seconds"] == 5
+    assert item["stage_seconds"] == {"extract_text": 2}
+    assert tracker.finish() == {"extract_text": 2, "build_graph": 5}
+
+
+def test_tracker_never_overwrites_a_final_item(table):
+    tracker = progress.ProgressTracker(table, "s1", "f1", "doc.pdf", interval=3600)
+    tracker.start()
+    table.put_item(Item={"share_id": "s1", "file_id": "f1", "status": "completed"})
+
+    tracker.stage("late")
+    tracker.discard()
+
+    assert table.get_item(Key={"share_id": "s1"})["Item"] == {"share_id": "s1", "file_id": "f1",
+                                                             "status": "completed"}
+
+
+def test_record_is_replaced_by_the_graph_under_the_same_share_id(monkeypatch):
+    s3 = FakeS3()
+    dynamodb = FakeDynamoDB()
+    table = dynamodb.Table("test-graph-cache")
+    monkeypatch.setattr(process_uploaded, "s3", s3)
+    monkeypatch.setattr(process_uploaded, "dynamodb", dynamodb)
+    monkeypatch.setattr(process_uploaded, "PROCESS_MODE", "staged")
+    s3.put_object(Bucket="test-bucket", Key="uploads/f1/doc.pdf", Body=b"%PDF")
+    seen = []
+
+    def extract(document, file_name, content_type=None, stats=None):
+        seen.append(table.all_items())
+        return "text"
+    monkeypatch.setattr(process_uploaded, "extract_text_from_file", extract)
+    monkeypatch.setattr(process_uploaded, "text_to_graph", lambda file_id, text, stats=None: {"nodes": [], "edges": []})
+
+    # A redelivered record picks up the share_id of the earlier attempt
+    table.put_item(Item={"share_id": "first", "file_id": "f1", "status": "processing"})
+    process_uploaded.process_record({"s3": {"bucket": {"name": "test-bucket"}, "object": {"key": "uploads/f1/doc.pdf"}}})
+
+    [during] = seen[0]
+    [final] = table.all_items()
+    assert (during["share_id"], during["status"], during["stage"]) == ("first", "processing", "extract_text")
+    assert (final["share_id"], final["status"]) == ("first", "completed")
+    assert set(final["stage_seconds"]) == {"download", "extract_text", "build_graph"}
+
+
+def test_duplicate_delivery_leaves_a_completed_graph_alone(monkeypatch):
+    s3 = FakeS3()
+    dynamodb = FakeDynamoDB()
+    table = dynamodb.Table("test-graph-cache")
+    monkeypatch.setattr(process_uploaded, "s3", s3)
+    monkeypatch.setattr(process_uploaded, "dynamodb", dynamodb)
+    monkeypatch.setattr(process_uploaded, "PROCESS_MODE", "staged")
+    s3.put_object(Bucket="test-bucket", Key="uploads/f1/doc.pdf", Body=b"%PDF")
+    monkeypatch.setattr(process_uploaded, "extract_text_from_file",
+                        lambda *args, **kwargs: pytest.fail("a processed upload was parsed again"))
+    done = {"share_id": "first", "file_id": "f1", "status": "completed", "view_count": 7, "nodes": "[]"}
+    table.put_item(Item=done)
+
+    process_uploaded.process_record({"s3": {"bucket": {"name": "test-bucket"}, "object": {"key": "uploads/f1/doc.pdf"}}})
+
+    assert table.all_items() == [done]
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+import generate_share_link
+import get_saved_graph
+import graph_store
+import response_cache
+import view_shared_graph
+from benchmarks.standins import FakeS3, FakeTable
+
+
+@pytest.fixture()
+def table(monkeypatch):
+    table = FakeTable(name="graphs")
+    s3 = FakeS3()
+    monkeypatch.setattr(response_cache, "cache", response_cache.ResponseCache())
+    for module in (generate_share_link, get_saved_graph, view_shared_graph):
+        monkeypatch.setattr(module, "table", table)
+        monkeypatch.setattr(module, "s3", s3)
+    return table
+
+
+def share(graph):
+    event = {"body": json.dumps({"file_id": "f1", "graph_data": graph}),
+             "requestContext": {"apiId": "api", "accountId": "1", "stage": "Prod"}}
+    return json.loads(generate_share_link.handler(event, None)["body"])["share_id"]
+
+
+def view(share_id, headers=None):
+    return view_shared_graph.handler({"pathParameters": {"share_id": share_id}, "headers": headers}, None)
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = response_cache.ResponseCache(max_bytes=400, ttl_seconds=60)
+    for key in "abc":
+        cache.put(key, key, 100)
+    cache.get("a")
+    cache.put("d", "d", 100)
+    cache.put("e", "e", 100)
+    cache.put("huge", "huge", 101)
+
+    assert list(cache.entries) == ["c", "a", "d", "e"]
+    assert cache.bytes == 400
+
+
+def test_entries_expire(monkeypatch):
+    cache = response_cache.ResponseCache(max_bytes=400, ttl_seconds=0)
+    cache.put("a", "a", 1)
+
+    assert cache.get("a") is None
+    assert cache.bytes == 0
+
+
+def test_repeat_views_are_served_from_cache(table):
+    share_id = share({"nodes": [{"id": "a"}], "edges": []})
+    first = view(share_id)
+    requests = table.requests
+    second = view(share_id)
+
+    assert json.loads(second["body"]) == dict(json.loads(first["body"]), view_count=2)
+    assert second["headers"]["ETag"] == first["headers"]["ETag"]
+    assert response_cache.cache.hits == 1
+    # Only the counter update touched the table
+    assert table.requests == requests + 1
+
+
+def test_if_none_match_returns_304_and_still_counts(table):
+    share_id = share({"nodes": [{"id": "a"}], "edges": []})
+    etag = view(share_id)["headers"]["ETag"]
+
+    ret = view(share_id, {"If-None-Match": etag})
+
+    assert ret["statusCode"] == 304
+    assert ret["body"] == ""
+    assert json.loads(view(share_id)["body"])["view_count"] == 3
+
+
+def test_resharing_invalidates_cached_graph(table):
+    share_id = share({"nodes": [{"id": "a"}], "edges": []})
+    first = view(share_id)
+    saved = get_saved_graph.handler({"pathParameters": {"file_id": "f1"}}, None)
+    share({"nodes": [{"id": "b"}], "edges": []})
+
+    again = view(share_id, {"If-None-Match": first["headers"]["ETag"]})
+    saved_again = get_saved_graph.handler({"pathParameters": {"file_id": "f1"},
+                                           "headers": {"If-None-Match": saved["headers"]["ETag"]}}, None)
+
+    assert again["statusCode"] == saved_again["statusCode"] == 200
+    assert json.loads(again["body"])["graph_data"] == {"nodes": [{"id": "b"}], "edges": []}
+    assert json.loads(saved_again["body"])["graph_data"] == {"nodes": [{"id": "b"}], "edges": []}
+
+
+def test_legacy_items_are_cached(table):
+    table.put_item(Item={"share_id": "old", "file_id": "f0", "created_at": "then",
+                         "graph_data": {"nodes": [], "edges": []}})
+
+    etag = view("old")["headers"]["ETag"]
+
+    assert etag == response_cache.etag(response_cache.LEGACY_VERSION, "json")
+    assert view("old", {"If-None-Match": etag})["statusCode"] == 304
+    assert graph_store.load_graph(table, table.get_item(Key={"share_id": "old"})["Item"]) == {"nodes": [], "edges": []}
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import chunk_cache
+import knowledge_graph
+import single_flight
+import token_chunking
+from benchmarks.standins import FakeGraphTransformer, FakeTable
+
+TEXT = " ".join(f"Person Number{i} knows Grace Hopper." for i in range(200))
+
+
+@pytest.fixture()
+def transformer(monkeypatch):
+    transformer = FakeGraphTransformer(latency=0.05)
+    monkeypatch.setattr(knowledge_graph, "get_llm", lambda: (None, transformer))
+    monkeypatch.setattr(knowledge_graph, "extraction_cache", chunk_cache.ChunkCache([chunk_cache.MemoryBackend()]))
+    monkeypatch.setattr(knowledge_graph, "extraction_flights", single_flight.SingleFlight())
+    monkeypatch.setattr(token_chunking, "CHUNK_TOKENS", 200)
+    return transformer
+
+
+def test_concurrent_identical_requests_share_one_extraction(transformer):
+    async def burst():
+        return await asyncio.gather(*(knowledge_graph.build_graph(TEXT) for _ in range(5)))
+
+    leader, *followers = asyncio.run(burst())
+
+    assert transformer.calls == leader["metadata"]["chunks"] > 1
+    assert "coalesced" not in leader["metadata"]
+    for graph in followers:
+        assert graph["nodes"] == leader["nodes"]
+        assert graph["metadata"]["coalesced"] is True
+        assert graph["metadata"]["cache"]["hits"] == leader["metadata"]["chunks"]
+        assert graph["metadata"]["usage"]["prompt_tokens"] == 0
+    assert knowledge_graph.extraction_flights.in_flight() == 0
+
+
+def test_requests_on_separate_threads_share_one_extraction(transformer):
+    # ProcessUploadedFunction runs each record in its own thread and event loop
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        graphs = list(executor.map(lambda _: asyncio.run(knowledge_graph.build_graph(TEXT)), range(3)))
+
+    assert transformer.calls == graphs[0]["metadata"]["chunks"]
+    assert sum(1 for graph in graphs if graph["metadata"].get("coalesced")) == 2
+
+
+def test_different_chunking_is_not_coalesced(transformer):
+    async def burst():
+        return await asyncio.gather(knowledge_graph.build_graph(TEXT),
+                                    knowledge_graph.build_graph(TEXT, chunk_tokens=300))
+
+    first, second = asyncio.run(burst())
+
+    assert "coalesced" not in first["metadata"] and "coalesced" not in second["metadata"]
+
+
+def test_followers_get_the_leaders_error():
+    flights = single_flight.SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("LLM down")
+
+    async def burst():
+        return await asyncio.gather(flights.run("key", fail), flights.run("key", fail), return_exceptions=True)
+
+    results = asyncio.run(burst())
+
+    assert [str(r) for r in results] == ["LLM down", "LLM down"]
+    assert flights.in_flight() == 0
+
+
+def test_a_cancelled_follower_leaves_the_leader_alone():
+    flights = single_flight.SingleFlight()
+    started = threading.Event()
+    results = []
+
+    async def work():
+        started.set()
+        await asyncio.sleep(0.2)
+        return "graph"
+
+    async def follow():
+        return await asyncio.wait_for(flights.run("key", work), 0.05)
+
+    leader = threading.Thread(target=lambda: results.append(asyncio.run(flights.run("key", work))))
+    leader.start()
+    started.wait()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(follow())
+    leader.join()
+
+    assert results == [("graph", single_flight.LEADER)]
+    assert flights.in_flight() == 0
+
+
+def lease(table):
+    return single_flight.DynamoDBLease(table, lease_seconds=60, wait_seconds=5, poll_seconds=0.01)
+
+
+def run_in_thread(flights, key, work):
+    """A request in its own thread, like one in another container."""
+    result = {}
+
+    def run():
+        try:
+            result["value"] = asyncio.run(flights.run(key, work))
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def test_other_containers_wait_for_the_leader():
+    table = FakeTable(key="cache_key")
+    containers = [single_flight.SingleFlight(lease(table)) for _ in range(3)]
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.1)
+        finished.append(time.monotonic())
+        return "graph"
+
+    leader = run_in_thread(containers[0], "key", work)
+    time.sleep(0.03)
+    waiters = [run_in_thread(flights, "key", work) for flights in containers[1:]]
+    for thread, _ in [leader, *waiters]:
+        thread.join()
+
+    assert leader[1]["value"] == ("graph", single_flight.LEADER)
+    assert [result["value"][1] for _, result in waiters] == [single_flight.WAITED] * 2
+    # Waiters only started once the leader had finished
+    assert finished[0] + 0.1 <= finished[1]
+    assert table.all_items()[0]["lease_state"] == "done"
+
+
+def test_a_failed_leader_hands_the_lease_on():
+    table = FakeTable(key="cache_key")
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("LLM down")
+
+    async def work():
+        return "graph"
+
+    leader = run_in_thread(single_flight.SingleFlight(lease(table)), "key", fail)
+    time.sleep(0.02)
+    waiter = run_in_thread(single_flight.SingleFlight(lease(table)), "key", work)
+    leader[0].join()
+    waiter[0].join()
+
+    assert str(leader[1]["error"]) == "LLM down"
+    assert waiter[1]["value"] == ("graph", single_flight.LEADER)
+
+
+def test_expired_leases_are_taken_over():
+    table = FakeTable(key="cache_key")
+    table.put_item(Item={"cache_key": "lease#key", "owner": "gone", "lease_state": "running",
+                         "expires_at": int(time.time()) - 1})
+
+    assert lease(table).try_acquire("key")
+    assert not lease(table).try_acquire("key")
+
+
+def test_waiting_stops_halfway_to_the_callers_deadline():
+    table = FakeTable(key="cache_key")
+    assert lease(table).try_acquire("key")
+    waiter = lease(table)
+
+    started = time.monotonic()
+    assert not waiter.acquire("key", deadline=started + 0.2)
+
+    # Half of the 0.2 s left, not the lease's 5 s wait
+    assert 0.1 <= time.monotonic() - started < 1
+
+
+def test_cancelling_a_waiter_stops_its_polling():
+    table = FakeTable(key="cache_key")
+    assert lease(table).try_acquire("key")
+    flights = single_flight.SingleFlight(lease(table))
+    polls = []
+    get_item = table.get_item
+    table.get_item = lambda **kwargs: polls.append(kwargs) or get_item(**kwargs)
+
+    async def request():
+        await asyncio.wait_for(flights.run("key", lambda: asyncio.sleep(0)), 0.05)
+
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(request())
+    polled = len(polls)
+    time.sleep(0.1)
+
+    # asyncio.run waits for the polling thread, which would otherwise run
+    # for the lease's whole 5 s wait
+    assert time.monotonic() - started < 1
+    assert len(polls) == polled
+
+
+def test_leases_are_opt_in(monkeypatch):
+    monkeypatch.setenv("CHUNK_CACHE_TABLE", "chunks")
+
+    assert knowledge_graph.flights_from_environment().lease is None
+    monkeypatch.setattr(knowledge_graph, "COALESCE_ACROSS_CONTAINERS", True)
+    assert isinstance(knowledge_graph.flights_from_environment().lease, single_flight.DynamoDBLease)
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import app
+import chunk_cache
+import knowledge_graph
+import token_chunking
+
+# Chunks finish out of order, and every request extracts them again
+pytestmark = pytest.mark.fake_llm(latency=0.01, jitter=0.01, cache=False)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Short texts still stream several chunks
+    monkeypatch.setattr(token_chunking, "CHUNK_TOKENS", 200)
+
+
+def post(body, headers=None):
+    return {"body": json.dumps(body), "headers": headers or {}}
+
+
+def test_stream_emits_one_event_per_chunk_then_done(fake_llm):
+    text = "Ada Lovelace met Charles Babbage. " * 200
+    ret = app.lambda_handler(post({"text": text, "stream": True}), None)
+    events = [json.loads(line) for line in ret["body"].splitlines()]
+
+    assert ret["statusCode"] == 200 and ret["headers"]["Content-Type"] == "application/x-ndjson"
+    chunk_events = [e for e in events if e["type"] == "chunk"]
+    assert len(chunk_events) == chunk_events[0]["total"] > 1
+    assert [e["completed"] for e in chunk_events] == list(range(1, len(chunk_events) + 1))
+    assert events[-1]["type"] == "done"
+
+    # Running dedup: each node is only announced once across the stream
+    announced = [n["id"] for e in chunk_events for n in e["nodes"]]
+    assert len(announced) == len(set(announced))
+    assert {"Ada Lovelace", "Charles Babbage"} <= set(announced)
+
+
+def test_stream_matches_buffered_graph(fake_llm):
+    text = " ".join(f"Person Number{i} knows Grace Hopper." for i in range(300))
+    buffered = json.loads(app.lambda_handler(post({"text": text}), None)["body"])
+    streamed = app.lambda_handler(post({"text": text}, {"Accept": "application/x-ndjson"}), None)
+
+    nodes, edges = {}, {}
+    for line in streamed["body"].splitlines():
+        event = json.loads(line)
+        for node in event.get("nodes", []):
+            nodes[node["id"]] = node
+        for edge in event.get("edges", []):
+            edges[(edge["source"], edge["target"], edge["relation"])] = edge
+
+    assert sorted(nodes) == sorted(n["id"] for n in buffered["nodes"])
+    assert sorted(edges.values(), key=str) == sorted(buffered["edges"], key=str)
+
+
+def test_stream_reports_errors_in_band(monkeypatch):
+    class Broken:
+        async def aconvert_to_graph_documents(self, documents):
+            raise ValueError("model unavailable")
+
+    monkeypatch.setattr(knowledge_graph, "get_llm", lambda: (None, Broken()))
+    monkeypatch.setattr(knowledge_graph, "extraction_cache", chunk_cache.ChunkCache([]))
+    ret = app.lambda_handler(post({"text": "Ada Lovelace", "stream": True}), None)
+
+    assert ret["statusCode"] == 500
+    assert json.loads(ret["body"].splitlines()[-1]) == {"type": "error", "error": "model unavailable"}
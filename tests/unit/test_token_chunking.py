@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import app
+import token_chunking
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Deterministic counts without tiktoken's encoding files: 4 chars a token
+    monkeypatch.setattr(token_chunking, "tiktoken", None)
+    monkeypatch.setattr(token_chunking, "_encodings", {})
+    monkeypatch.setattr(token_chunking, "CHUNK_TOKENS", None)
+
+
+def sentences(count, prefix="Sentence"):
+    return [f"{prefix} number {i} is here." for i in range(count)]
+
+
+def test_chunks_stay_within_budget_and_end_on_sentences():
+    text = " ".join(sentences(200))
+
+    chunks = token_chunking.split_text(text, chunk_tokens=60, overlap_tokens=0)
+
+    assert len(chunks) > 1
+    assert all(token_chunking.count_tokens(c) <= 60 for c in chunks)
+    assert all(c.endswith(".") for c in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_overlap_repeats_the_last_sentences():
+    text = " ".join(sentences(50))
+
+    chunks = token_chunking.split_text(text, chunk_tokens=60, overlap_tokens=15)
+
+    # Sentences are 7 tokens, so two of them fit in the overlap
+    for previous, chunk in zip(chunks, chunks[1:]):
+        previous, chunk = previous.split(". "), chunk.split(". ")
+        assert previous[-2] == chunk[0]
+        assert previous[-1].rstrip(".") == chunk[1]
+
+
+def test_paragraph_break_is_preferred_near_the_end():
+    first = " ".join(sentences(9, "First"))
+    text = first + "\n\n" + " ".join(sentences(9, "Second"))
+
+    chunks = token_chunking.split_text(text, chunk_tokens=70, overlap_tokens=0)
+
+    assert chunks[0] == first
+
+
+def test_long_sentence_is_cut_between_words():
+    text = "word " * 500
+
+    chunks = token_chunking.split_text(text, chunk_tokens=50, overlap_tokens=0)
+
+    assert all(token_chunking.count_tokens(c) <= 50 for c in chunks)
+    assert sum(len(c.split()) for c in chunks) == 500
+
+
+def test_budget_is_a_fraction_of_the_model_context():
+    assert token_chunking.chunk_budget("gpt-4-turbo", 0.025) == 3200
+    assert token_chunking.chunk_budget("unknown-model", 0.5) == token_chunking.DEFAULT_CONTEXT_TOKENS // 2
+
+
+@pytest.mark.parametrize("body", [{"chunk_tokens": 0}, {"chunk_tokens": "500"},
+                                  {"chunk_tokens": True}, {"chunk_overlap_tokens": -1}])
+def test_invalid_chunking_options_are_rejected(body):
+    ret = app.lambda_handler({"body": json.dumps(dict(body, text="Ada Lovelace."))}, None)
+
+    assert ret["statusCode"] == 400
+    assert "chunk" in json.loads(ret["body"])["error"]
+
+
+def test_chunking_options_map_to_build_graph_arguments():
+    assert app.chunking_options({"chunk_tokens": 500, "chunk_overlap_tokens": 0}) == \
+        {"chunk_tokens": 500, "overlap_tokens": 0}
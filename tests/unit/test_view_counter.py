@@ -0,0 +1,93 @@
+import json
+import threading
+
+import pytest
+
+import graph_store
+import view_counter
+import view_shared_graph
+from benchmarks.standins import FakeTable
+
+
+@pytest.fixture()
+def table():
+    table = FakeTable(name="graphs")
+    graph_store.save_graph(table, {"share_id": "s1", "file_id": "f1", "created_at": "now", "view_count": 0,
+                                   "expires_at": 99}, {"nodes": [], "edges": []})
+    return table
+
+
+def views_stored(table):
+    total = int(table.get_item(Key={"share_id": "s1"})["Item"]["view_count"])
+    for shard in range(view_counter.SHARDS):
+        item = table.get_item(Key={"share_id": view_counter.counter_key("s1", shard)}).get("Item")
+        total += int(item["view_count"]) if item else 0
+    return total
+
+
+def test_atomic_counts_every_concurrent_view_once(table):
+    counts = []
+    threads = [threading.Thread(target=lambda: counts.append(int(view_counter.record_view_atomic(table, "s1")["view_count"])))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(counts) == list(range(1, 21))
+    assert table.requests == 21  # the save, then one round trip per view
+
+
+def test_atomic_missing_share_is_none_and_not_created(table):
+    assert view_counter.record_view_atomic(table, "nope") is None
+    assert "nope" not in table.items
+
+
+def test_buffered_counter_flushes_aggregated_views(table):
+    counter = view_counter.BufferedCounter(table, flush_seconds=3600, flush_threshold=5)
+
+    counts = [int(counter.record_view("s1")["view_count"]) for _ in range(7)]
+
+    assert counts == [1, 2, 3, 4, 5, 1 + 5, 2 + 5]
+    assert views_stored(table) == 5
+    counter.flush()
+    assert views_stored(table) == 7
+
+
+def test_sharded_counter_spreads_writes_and_sums_them(table):
+    counter = view_counter.ShardedCounter(table, shards=view_counter.SHARDS, flush_seconds=0)
+
+    counts = [int(counter.record_view("s1")["view_count"]) for _ in range(30)]
+
+    assert counts == list(range(1, 31))
+    assert views_stored(table) == 30
+    shard_items = [key for key in table.items if "#views#" in key]
+    assert len(shard_items) > 1
+    assert all("file_id" not in table.items[key] for key in shard_items)
+
+
+@pytest.mark.parametrize("counter_class", [view_counter.BufferedCounter, view_counter.ShardedCounter])
+def test_buffered_modes_read_the_item_once_per_interval(table, counter_class):
+    counter = counter_class(table, flush_seconds=3600, flush_threshold=10 ** 9)
+    table.requests = 0
+
+    counts = [int(counter.record_view("s1")["view_count"]) for _ in range(50)]
+
+    assert counts == list(range(1, 51))
+    # The header, plus the shard total for sharded
+    assert table.requests == (1 if counter_class is view_counter.BufferedCounter else 2)
+    counter.flush()
+    assert views_stored(table) == 50
+    assert int(counter.record_view("s1")["view_count"]) == 51
+
+
+def test_handler_reports_count_including_this_view(table, monkeypatch):
+    monkeypatch.setattr(view_shared_graph, "table", table)
+    event = {"pathParameters": {"share_id": "s1"}}
+
+    first = json.loads(view_shared_graph.handler(event, None)["body"])
+    second = json.loads(view_shared_graph.handler(event, None)["body"])
+    missing = view_shared_graph.handler({"pathParameters": {"share_id": "s1#views#0"}}, None)
+
+    assert (first["view_count"], second["view_count"]) == (1, 2)
+    assert missing["statusCode"] == 404